@@ -0,0 +1,5 @@
+import os
+
+# Pixeltable reports insert progress with tqdm on stdout. Memory is persisted from a background
+# thread, so the bars would interleave with streamed agent responses. tqdm reads this on import.
+os.environ.setdefault("TQDM_DISABLE", "1")
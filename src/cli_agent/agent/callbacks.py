@@ -0,0 +1,89 @@
+import time
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from cli_agent.tracing import Span, Tracer
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Record the LLM and tool calls of a graph run as spans of the current turn.
+
+    Calls made by subagents are nested under the span of the `task` tool call that started them.
+
+    Args:
+        tracer (Tracer): Tracer recording the spans
+        parent (Span): Span of the turn, parent of the top-level calls
+    """
+    run_inline = True # Spans are started and ended in order on the event loop
+
+    def __init__(self, tracer: Tracer, parent: Span):
+        self.tracer = tracer
+        self.parent = parent
+        self._spans: dict[UUID, Span] = {}
+        self._parents: dict[UUID, Optional[UUID]] = {} # Parent run of the graph nodes and chains
+        self._first_token_seen: set[UUID] = set()
+
+    def _parent_span(self, parent_run_id: Optional[UUID]) -> Span:
+        """Get the span of the closest traced ancestor run, graph nodes and chains are not traced."""
+        while parent_run_id is not None:
+            if parent_run_id in self._spans:
+                return self._spans[parent_run_id]
+            parent_run_id = self._parents.get(parent_run_id)
+        return self.parent
+
+    def _start(self, name: str, run_id: UUID, parent_run_id: Optional[UUID], **attributes: Any):
+        self._spans[run_id] = self.tracer.start_span(name, parent=self._parent_span(parent_run_id), **attributes)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None):
+        self._first_token_seen.discard(run_id)
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            self.tracer.end_span(span, error=error)
+
+    def on_chain_start(self, serialized: dict[str, Any], inputs: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        self._parents[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any):
+        self._parents.pop(run_id, None)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._parents.pop(run_id, None)
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list, *, run_id: UUID, parent_run_id: Optional[UUID] = None, metadata: Optional[dict[str, Any]] = None, **kwargs: Any):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name") or "unknown"
+        self._start("llm.call", run_id, parent_run_id, model=model)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.get(run_id)
+        if span is not None and token and run_id not in self._first_token_seen:
+            self._first_token_seen.add(run_id)
+            span.set_attribute("time_to_first_token_ms", (time.time_ns() - span.start_ns) / 1e6)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.get(run_id)
+        if span is not None:
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    for key in ("input_tokens", "output_tokens"):
+                        if key in usage:
+                            for tokens_span in (span, self.parent): # The turn sums the tokens of all its calls
+                                tokens_span.set_attribute(f"llm.{key}", tokens_span.attributes.get(f"llm.{key}", 0) + usage[key])
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error=error)
+
+    def on_tool_start(self, serialized: dict[str, Any], input_str: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        tool_name = (serialized or {}).get("name") or "unknown"
+        self._start(f"tool.{tool_name}", run_id, parent_run_id, tool=tool_name)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error=error)
@@ -0,0 +1,165 @@
+import os
+from contextlib import redirect_stdout, redirect_stderr
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import pixeltable as pxt
+from pydantic import BaseModel
+from loguru import logger
+
+from cli_agent.agent.registry import get_registry
+
+logger = logger.bind(name="Conversation Catalog")
+
+PREVIEW_LENGTH = 200
+
+
+class ConversationEntry(BaseModel):
+    memory_id: str
+    created_at: datetime
+    last_modified: datetime
+    latest_prompt: Optional[str] = None
+    message_count: int = 0
+
+
+class ConversationCatalog:
+    """
+    Single Pixeltable table summarizing every saved conversation.
+
+    It is updated incrementally whenever a memory record is inserted, so listing past
+    conversations is one indexed query instead of a scan over every memory table. The conversations
+    themselves are the ones of the registry: a new catalog is filled from it, and the registry check
+    run when the CLI starts backfills or removes the conversations it repaired.
+    """
+    TABLE_PATH = "conversation_catalog"
+
+    def __init__(self):
+        if self.TABLE_PATH in pxt.list_tables():
+            self._table = pxt.get_table(self.TABLE_PATH)
+        else:
+            self._table = self._setup_table()
+            self.backfill(get_registry().list())
+
+    def _setup_table(self):
+        table_schema = {
+            "memory_id": pxt.Required[pxt.String],
+            "created_at": pxt.Timestamp,
+            "last_modified": pxt.Timestamp,
+            "latest_prompt": pxt.String,
+            "message_count": pxt.Int,
+        }
+        table = pxt.create_table(
+            self.TABLE_PATH,
+            schema=table_schema,
+            primary_key="memory_id",
+            if_exists="ignore",
+        )
+
+        logger.info("Conversation catalog setup successfully")
+        return table
+
+    def backfill(self, memory_ids: Iterable[str]):
+        """Add the saved conversations missing from the catalog, scanning their memory tables."""
+        catalogued = {row["memory_id"] for row in self._table.select(self._table.memory_id).collect()}
+        rows = [self._scan_directory(memory_id) for memory_id in memory_ids if memory_id not in catalogued]
+        rows = [row for row in rows if row is not None]
+        if rows:
+            with open(os.devnull, 'w') as devnull:
+                with redirect_stdout(devnull), redirect_stderr(devnull):
+                    self._table.insert(rows)
+            logger.info(f"Added {len(rows)} conversation(s) to the catalog")
+
+    def _scan_directory(self, memory_id: str) -> Optional[dict]:
+        """Build a catalog row from an existing memory table. Only used when backfilling."""
+        try:
+            memory_table = pxt.get_table(f"{memory_id}.memory")
+        except Exception as e:
+            logger.warning(f"Skipping directory {memory_id} without a memory table: {e}")
+            return None
+
+        created_at = memory_table.history()["created_at"].iloc[-1].to_pydatetime().astimezone()
+        latest = memory_table.order_by(memory_table.timestamp, asc=False).limit(1).collect()
+        user_messages = memory_table.where(memory_table.role == "user")
+        latest_prompt = user_messages.order_by(memory_table.timestamp, asc=False).limit(1).collect()
+
+        return {
+            "memory_id": memory_id,
+            "created_at": created_at,
+            "last_modified": latest[0]["timestamp"] if len(latest) > 0 else created_at,
+            "latest_prompt": latest_prompt[0]["content"][:PREVIEW_LENGTH] if len(latest_prompt) > 0 else None,
+            "message_count": memory_table.where(memory_table.role.isin(["user", "assistant"])).count(),
+        }
+
+    def register(self, memory_id: str):
+        """Add a newly created conversation to the catalog."""
+        now = datetime.now().astimezone()
+        with open(os.devnull, 'w') as devnull:
+            with redirect_stdout(devnull), redirect_stderr(devnull):
+                self._table.batch_update(
+                    [{
+                        "memory_id": memory_id,
+                        "created_at": now,
+                        "last_modified": now,
+                        "latest_prompt": None,
+                        "message_count": 0,
+                    }],
+                    if_not_exists="insert",
+                )
+
+    def record_messages(self, memory_id: str, memory_records: list):
+        """Update the conversation's summary after a batch of memory records was inserted."""
+        table = self._table
+        values = {"last_modified": memory_records[-1].timestamp}
+
+        message_count = sum(record.role in ["user", "assistant"] for record in memory_records)
+        if message_count:
+            values["message_count"] = table.message_count + message_count
+
+        user_records = [record for record in memory_records if record.role == "user"]
+        if user_records:
+            values["latest_prompt"] = user_records[-1].content[:PREVIEW_LENGTH]
+
+        # Called from the memory writer thread, so stdout must not be redirected here
+        table.update(values, where=table.memory_id == memory_id)
+
+    def remove(self, memory_id: str):
+        """Remove a conversation from the catalog."""
+        with open(os.devnull, 'w') as devnull:
+            with redirect_stdout(devnull), redirect_stderr(devnull):
+                self._table.delete(where=self._table.memory_id == memory_id)
+
+    def list_conversations(
+        self,
+        limit: Optional[int] = None,
+        before: Optional[tuple[datetime, str]] = None
+    ) -> list[ConversationEntry]:
+        """
+        List conversations from the most recently modified one.
+
+        Args:
+            limit (int): Maximum number of conversations to return, all of them if not provided
+            before (tuple[datetime, str]): Last modified time and memory ID of the last conversation of the previous page
+
+        Returns:
+            Catalog entries sorted by last modified time then memory ID, newest first.
+        """
+        table = self._table
+        query = table
+        if before is not None:
+            # Conversations modified at the same time as the last one of the page are ordered by their ID
+            last_modified, memory_id = before
+            query = table.where(
+                (table.last_modified < last_modified) | ((table.last_modified == last_modified) & (table.memory_id < memory_id))
+            )
+        query = query.order_by(table.last_modified, table.memory_id, asc=False)
+        if limit is not None:
+            query = query.limit(limit)
+
+        return [ConversationEntry(**row) for row in query.collect()]
+
+
+@lru_cache(maxsize=1)
+def get_catalog() -> ConversationCatalog:
+    """Get the process-wide conversation catalog."""
+    return ConversationCatalog()
@@ -0,0 +1,186 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import pixeltable as pxt
+from loguru import logger
+
+logger = logger.bind(name="File State")
+
+# Contents diffed on the event loop but not written by the memory writer yet, keyed by conversation and
+# digest. Shared by the stores of a conversation, as the writer persists the changes of every Memory
+# object of a conversation, like a resumed one and the agent still holding it, with one of them.
+_unwritten_blobs: dict[tuple[str, str], str] = {}
+_unwritten_lock = threading.Lock()
+
+
+class FileStateStore:
+    """
+    Content-addressed storage for the DeepAgents `files` state of one conversation.
+
+    File contents are stored once per distinct content in `{directory}.file_blobs`, keyed by their
+    SHA-256 digest, and `{directory}.files` maps every path to the digest of its latest content.
+    Each turn only records the paths that changed. Restoring the state only reads the paths and their
+    digests, a content is read when a file is opened and the latest ones read or written are kept in
+    memory, so memory use depends on the files the agent works on rather than on every file it wrote.
+    The tables are created on the first write so empty conversations don't pay for them.
+
+    Args:
+        directory (str): Pixeltable directory of the conversation
+        cache_size (int): Number of file contents kept in memory
+    """
+    def __init__(self, directory: str, cache_size: int = 64):
+        self.directory = directory
+        self._files_path = f"{directory}.files"
+        self._blobs_path = f"{directory}.file_blobs"
+
+        self._manifest: Optional[dict[str, str]] = None # Path to digest of the latest content, restored on first use
+        self._contents: OrderedDict[str, str] = OrderedDict() # Digest to content of the latest files used
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._manifest is not None
+
+    @property
+    def manifest(self) -> dict[str, str]:
+        """Paths of the files mapped to the digest of their content."""
+        with self._lock:
+            return dict(self._manifest or {})
+
+    @staticmethod
+    def digest(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _tables_exist(self) -> bool:
+        return self._files_path in pxt.list_tables(self.directory)
+
+    def _setup_tables(self):
+        pxt.create_table(
+            self._files_path,
+            schema={"path": pxt.Required[pxt.String], "digest": pxt.String},
+            primary_key="path",
+            if_exists="ignore",
+        )
+        pxt.create_table(
+            self._blobs_path,
+            schema={"digest": pxt.Required[pxt.String], "content": pxt.String},
+            primary_key="digest",
+            if_exists="ignore",
+        )
+
+    def restore(self):
+        """Read the paths of the latest files state and their digests. Must be called on the Pixeltable thread."""
+        manifest = {}
+        if self._tables_exist():
+            files_table = pxt.get_table(self._files_path)
+            manifest = {row["path"]: row["digest"] for row in files_table.select(files_table.path, files_table.digest).collect()}
+        with self._lock:
+            self._manifest = manifest
+            self._contents.clear()
+
+    def cached_content(self, path: str) -> tuple[Optional[str], Optional[str]]:
+        """
+        Get the content of a file if it is in memory.
+
+        Returns:
+            Digest of the file, None if there is no such file, and its content, None if it must be read with `read_blob`
+        """
+        with self._lock:
+            digest = (self._manifest or {}).get(path)
+            if digest is None:
+                return None, None
+            with _unwritten_lock:
+                content = _unwritten_blobs.get((self.directory, digest), self._contents.get(digest))
+            if content is not None and digest in self._contents:
+                self._contents.move_to_end(digest)
+            return digest, content
+
+    def read_blob(self, digest: str) -> Optional[str]:
+        """Read a content from the blobs table and keep it in memory. Must be called on the Pixeltable thread."""
+        if not self._tables_exist():
+            return None
+        blobs_table = pxt.get_table(self._blobs_path)
+        rows = blobs_table.where(blobs_table.digest == digest).select(blobs_table.content).collect()
+        if len(rows) == 0:
+            return None
+
+        content = rows[0]["content"]
+        self._cache(digest, content)
+        return content
+
+    def _cache(self, digest: str, content: str):
+        with self._lock:
+            self._contents[digest] = content
+            self._contents.move_to_end(digest)
+            while len(self._contents) > self._cache_size:
+                self._contents.popitem(last=False)
+
+    def diff(self, files: dict[str, str]) -> dict[str, str]:
+        """
+        Apply a files update and keep the changed contents until they are written.
+
+        Args:
+            files (dict): Updated files, merged into the current state like the DeepAgents reducer does
+
+        Returns:
+            Mapping of the changed paths to the digest of their new content, empty if nothing changed.
+        """
+        changes = {}
+        for path, content in files.items():
+            digest = self.digest(content)
+            with self._lock:
+                if self._manifest.get(path) == digest:
+                    continue
+                changes[path] = digest
+                self._manifest[path] = digest
+                with _unwritten_lock:
+                    _unwritten_blobs[(self.directory, digest)] = content
+            self._cache(digest, content)
+
+        return changes
+
+    def write(self, changes: list[dict[str, str]]):
+        """Persist a batch of changes returned by `diff`. Called by the memory writer."""
+        manifest = {}
+        for change in changes:
+            manifest.update(change)
+        if not manifest:
+            return
+
+        self._setup_tables()
+        files_table, blobs_table = pxt.get_table(self._files_path), pxt.get_table(self._blobs_path)
+
+        digests = {digest for change in changes for digest in change.values()}
+        with _unwritten_lock:
+            contents = {digest: _unwritten_blobs[(self.directory, digest)] for digest in digests if (self.directory, digest) in _unwritten_blobs}
+        blobs = {digest: contents[digest] for digest in set(manifest.values()) if digest in contents}
+
+        # Identical contents are only stored once, even across paths and turns
+        if blobs:
+            stored = blobs_table.where(blobs_table.digest.isin(list(blobs))).select(blobs_table.digest).collect()
+            for row in stored:
+                blobs.pop(row["digest"], None)
+        if blobs:
+            blobs_table.insert([{"digest": digest, "content": content} for digest, content in blobs.items()])
+
+        files_table.batch_update(
+            [{"path": path, "digest": digest} for path, digest in manifest.items()],
+            if_not_exists="insert",
+        )
+
+        # Released only once stored, so a failed write leaves them readable. Contents replaced within the
+        # batch are released without being stored
+        with _unwritten_lock:
+            for digest in contents:
+                _unwritten_blobs.pop((self.directory, digest), None)
+
+    def reset(self):
+        with self._lock:
+            self._manifest = None
+            self._contents.clear()
+        with _unwritten_lock:
+            for key in [key for key in _unwritten_blobs if key[0] == self.directory]:
+                del _unwritten_blobs[key]
@@ -0,0 +1,64 @@
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.tools import tool
+from langgraph.types import Command
+from deepagents import tools as deepagents_tools
+from deepagents.prompts import EDIT_DESCRIPTION, TOOL_DESCRIPTION
+
+from cli_agent.agent.memory import Memory
+
+# Memory of the conversation whose turn is running, set by the agent. The compiled graph is shared by
+# every conversation, so the file tools find the files of the current one here instead of in the graph state
+current_memory: ContextVar[Optional[Memory]] = ContextVar("current_memory", default=None)
+
+
+def _memory() -> Memory:
+    memory = current_memory.get()
+    if memory is None:
+        raise RuntimeError("The file tools can only be used during an agent turn")
+    return memory
+
+
+# The DeepAgents file tools read and write the whole `files` dict of the graph state. These ones have the
+# same names, arguments and outputs, but open the files of the conversation memory one by one, so a turn
+# only loads the files it uses and only the changed ones are saved
+
+@tool
+def ls() -> list[str]:
+    """List all files"""
+    return _memory().list_files()
+
+
+@tool(description=TOOL_DESCRIPTION)
+def read_file(file_path: str, offset: int = 0, limit: int = 2000) -> str:
+    content = _memory().read_file(file_path)
+    if content is None:
+        return f"Error: File '{file_path}' not found"
+    return deepagents_tools.read_file.func(file_path, state={"files": {file_path: content}}, offset=offset, limit=limit)
+
+
+@tool
+def write_file(file_path: str, content: str) -> str:
+    """Write to a file."""
+    _memory().save_files({file_path: content})
+    return f"Updated file {file_path}"
+
+
+@tool(description=EDIT_DESCRIPTION)
+def edit_file(file_path: str, old_string: str, new_string: str, replace_all: bool = False) -> str:
+    memory = _memory()
+    content = memory.read_file(file_path)
+    if content is None:
+        return f"Error: File '{file_path}' not found"
+
+    result = deepagents_tools.edit_file.func(
+        file_path, old_string, new_string, state={"files": {file_path: content}}, tool_call_id="", replace_all=replace_all
+    )
+    if not isinstance(result, Command):
+        return result # Error message
+    memory.save_files({file_path: result.update["files"][file_path]})
+    return result.update["messages"][0].content
+
+
+FILE_TOOLS = [ls, read_file, write_file, edit_file]
@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import re
+import time
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from pydantic import BaseModel
+from loguru import logger
+
+from cli_agent.config import get_settings
+from cli_agent.agent.knowledge import KnowledgeBase, KnowledgeDocument, get_knowledge_base
+from cli_agent.agent.memory import to_pixeltable_thread
+
+logger = logger.bind(name="Knowledge Ingestion")
+settings = get_settings()
+
+TEXT_SUFFIXES = {".txt", ".md", ".markdown", ".rst", ".html", ".htm", ".csv", ".json", ".py"}
+HTML_SUFFIXES = {".html", ".htm"}
+QUEUE_SIZE = 32 # Items buffered between two stages, a slow stage slows down the ones before it
+
+
+class RawDocument(BaseModel):
+    source: str
+    content: str
+    is_html: bool
+
+
+class IngestionStats(BaseModel):
+    documents: int = 0 # New or changed documents written
+    unchanged: int = 0
+    failed: int = 0
+    chunks: int = 0 # Chunks of the written documents
+    duplicate_chunks: int = 0 # Chunks that were already stored
+    elapsed: float = 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        return (self.documents + self.unchanged) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.documents} document(s) ingested, {self.unchanged} unchanged, {self.failed} failed, "
+            f"{self.chunks} chunk(s) ({self.duplicate_chunks} already stored) in {self.elapsed:.2f}s: "
+            f"{self.documents_per_second:.1f} documents/s, {self.chunks_per_second:.1f} chunks/s"
+        )
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the visible text of an HTML page, one line per block element."""
+    SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "head", "nav", "footer"}
+    BLOCK_TAGS = {"p", "div", "section", "article", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "table"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title: Optional[str] = None
+        self._parts: list[str] = []
+        self._skipped_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skipped_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append("\n\n")
+        if tag == "title":
+            self._in_title = True
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skipped_depth > 0:
+            self._skipped_depth -= 1
+        elif tag in self.BLOCK_TAGS:
+            self._parts.append("\n\n")
+        if tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title and self.title is None:
+            self.title = data.strip() or None
+        elif self._skipped_depth == 0:
+            self._parts.append(data)
+
+    def text(self) -> str:
+        return "".join(self._parts)
+
+
+def extract_text(content: str, is_html: bool) -> tuple[Optional[str], str]:
+    """
+    Get the title and the plain text of a document.
+
+    Args:
+        content (str): Raw content of the document
+        is_html (bool): Extract the visible text of an HTML page, plain text is only normalized
+
+    Returns:
+        The title of the page or the first line of the text, and the text with its paragraphs separated by blank lines
+    """
+    title = None
+    if is_html:
+        extractor = _TextExtractor()
+        extractor.feed(content)
+        extractor.close()
+        title, content = extractor.title, extractor.text()
+
+    lines = [" ".join(line.split()) for line in content.splitlines()]
+    text = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+    if title is None and text:
+        title = text.split("\n", 1)[0][:200]
+    return title, text
+
+
+def chunk_text(text: str, chunk_size: int, overlap: int) -> list[str]:
+    """
+    Split a text into chunks of at most `chunk_size` characters, on paragraph boundaries when possible.
+
+    Consecutive chunks share up to `overlap` characters, so a passage cut between two chunks is still
+    found whole in one of them.
+    """
+    pieces = []
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        # Paragraphs longer than a chunk are cut on word boundaries
+        while len(paragraph) > chunk_size:
+            cut = paragraph.rfind(" ", 0, chunk_size)
+            cut = cut if cut > 0 else chunk_size
+            pieces.append(paragraph[:cut])
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            pieces.append(paragraph)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > chunk_size:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap > 0 else ""
+            tail = tail[tail.find(" ") + 1:] if " " in tail else tail # Start the overlap on a word
+            current = f"{tail}\n\n{piece}" if tail and len(tail) + len(piece) + 2 <= chunk_size else piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def expand_sources(sources: list[str]) -> list[str]:
+    """Replace the local directories by the text files they contain, recursively. URLs and files are kept as is."""
+    expanded = []
+    for source in sources:
+        path = Path(source).expanduser()
+        if not source.startswith(("http://", "https://")) and path.is_dir():
+            expanded += sorted(str(file) for file in path.rglob("*") if file.is_file() and file.suffix.lower() in TEXT_SUFFIXES)
+        else:
+            expanded.append(source)
+    return expanded
+
+
+class IngestionPipeline:
+    """
+    Streaming ingestion of web pages and local files into the knowledge base.
+
+    Documents flow through stages connected by bounded queues, so fetching, extraction and writing
+    overlap: fetch or read (concurrent), extract the text, chunk and hash it, then write the chunks in
+    batches, their embeddings being computed by Pixeltable on each bulk insert. Sources whose content
+    hash did not change since their last ingestion are skipped.
+
+    Args:
+        knowledge_base (KnowledgeBase): Tables the documents are written to, the shared knowledge base if not provided
+        fetch_concurrency (int): Documents fetched or read at the same time
+        batch_size (int): Chunks written per insert
+        chunk_size (int): Maximum size of a chunk, in characters
+        chunk_overlap (int): Characters shared by consecutive chunks
+    """
+    def __init__(
+        self,
+        knowledge_base: Optional[KnowledgeBase] = None,
+        fetch_concurrency: int = settings.INGEST_FETCH_CONCURRENCY,
+        batch_size: int = settings.INGEST_BATCH_SIZE,
+        chunk_size: int = settings.INGEST_CHUNK_SIZE,
+        chunk_overlap: int = settings.INGEST_CHUNK_OVERLAP,
+    ):
+        self.knowledge_base = knowledge_base
+        self.fetch_concurrency = fetch_concurrency
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.stats = IngestionStats()
+
+    async def run(self, sources: list[str]) -> IngestionStats:
+        """
+        Ingest web pages (http or https URLs), text files and directories of text files.
+
+        Returns:
+            Counts and throughput of the run, a failed source is logged and counted without stopping the others
+        """
+        start = time.perf_counter()
+        self.stats = IngestionStats()
+        if self.knowledge_base is None:
+            self.knowledge_base = await to_pixeltable_thread(get_knowledge_base)
+
+        source_queue: asyncio.Queue[str] = asyncio.Queue()
+        for source in expand_sources(sources):
+            source_queue.put_nowait(source)
+        raw_queue: asyncio.Queue[Optional[RawDocument]] = asyncio.Queue(maxsize=QUEUE_SIZE)
+        document_queue: asyncio.Queue[Optional[KnowledgeDocument]] = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+        async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+            fetchers = [asyncio.create_task(self._fetch_stage(client, source_queue, raw_queue)) for _ in range(self.fetch_concurrency)]
+            processor = asyncio.create_task(self._process_stage(raw_queue, document_queue, len(fetchers)))
+            writer = asyncio.create_task(self._write_stage(document_queue))
+            try:
+                await asyncio.gather(*fetchers, processor, writer)
+            finally:
+                for task in [*fetchers, processor, writer]:
+                    task.cancel()
+
+        self.stats.elapsed = time.perf_counter() - start
+        logger.info(self.stats.summary())
+        return self.stats
+
+    async def _fetch_stage(self, client: httpx.AsyncClient, sources: asyncio.Queue, output: asyncio.Queue):
+        while not sources.empty():
+            source = sources.get_nowait()
+            try:
+                output_document = await self._fetch(client, source)
+            except Exception as e:
+                logger.error(f"Could not read {source}: {e}")
+                self.stats.failed += 1
+                continue
+            await output.put(output_document)
+        await output.put(None) # This fetcher is done
+
+    async def _fetch(self, client: httpx.AsyncClient, source: str) -> RawDocument:
+        if source.startswith(("http://", "https://")):
+            response = await client.get(source)
+            response.raise_for_status()
+            is_html = "html" in response.headers.get("content-type", "")
+            return RawDocument(source=source, content=response.text, is_html=is_html)
+
+        path = Path(source).expanduser()
+        content = await asyncio.to_thread(path.read_text, errors="replace")
+        return RawDocument(source=str(path.resolve()), content=content, is_html=path.suffix.lower() in HTML_SUFFIXES)
+
+    async def _process_stage(self, raw_documents: asyncio.Queue, output: asyncio.Queue, fetchers: int):
+        while fetchers:
+            raw_document = await raw_documents.get()
+            if raw_document is None:
+                fetchers -= 1
+                continue
+
+            try:
+                document = await asyncio.to_thread(self._process, raw_document) # Parsing and hashing are CPU bound
+            except Exception as e:
+                logger.error(f"Could not process {raw_document.source}: {e}")
+                self.stats.failed += 1
+                continue
+            known_hashes = await to_pixeltable_thread(self.knowledge_base.content_hashes, [document.source])
+            if known_hashes.get(document.source) == document.content_hash:
+                self.stats.unchanged += 1
+                continue
+            await output.put(document)
+        await output.put(None)
+
+    def _process(self, raw_document: RawDocument) -> KnowledgeDocument:
+        title, text = extract_text(raw_document.content, raw_document.is_html)
+        chunks = chunk_text(text, self.chunk_size, self.chunk_overlap)
+        return KnowledgeDocument(
+            source=raw_document.source,
+            title=title,
+            content_hash=content_hash(text),
+            chunks=chunks,
+            chunk_hashes=[content_hash(chunk) for chunk in chunks],
+        )
+
+    async def _write_stage(self, documents: asyncio.Queue):
+        batch: list[KnowledgeDocument] = []
+        while True:
+            document = await documents.get()
+            if document is not None:
+                batch.append(document)
+            if batch and (document is None or sum(len(document.chunks) for document in batch) >= self.batch_size):
+                await self._write(batch)
+                batch = []
+            if document is None:
+                return
+
+    async def _write(self, batch: list[KnowledgeDocument]):
+        try:
+            duplicates = await to_pixeltable_thread(self.knowledge_base.write, batch)
+        except Exception as e:
+            logger.error(f"Could not write {len(batch)} document(s) to the knowledge base: {e}")
+            self.stats.failed += len(batch)
+            return
+        self.stats.documents += len(batch)
+        self.stats.chunks += sum(len(document.chunks) for document in batch)
+        self.stats.duplicate_chunks += duplicates
@@ -0,0 +1,166 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+import pixeltable as pxt
+from pydantic import BaseModel
+from loguru import logger
+
+from cli_agent.config import get_settings
+from cli_agent.agent.recall import embedding_function, model_table_path
+
+logger = logger.bind(name="Knowledge Base")
+
+
+class KnowledgeDocument(BaseModel):
+    """A document split into chunks, ready to be written to the knowledge base."""
+    source: str
+    title: Optional[str] = None
+    content_hash: str
+    chunks: list[str]
+    chunk_hashes: list[str]
+
+
+class KnowledgeChunk(BaseModel):
+    source: str
+    title: Optional[str] = None
+    chunk_index: int
+    content: str
+    score: float
+
+
+class KnowledgeBase:
+    """
+    Pixeltable tables of the ingested documents.
+
+    `knowledge_sources` keeps one row per source with the hash of its content, so a source whose content
+    did not change is skipped on re-ingestion. `knowledge_chunks` holds the chunks with an embedding index,
+    computed by Pixeltable when a batch of chunks is inserted. A chunk is stored once per source, so an
+    unchanged chunk of a changed source keeps its embedding, and the chunks a source shares with another
+    one are not deleted when it changes. Like the recall index, each embedding model has its own tables.
+
+    The methods query Pixeltable, they are called on the Pixeltable thread (see `on_pixeltable_thread`).
+
+    Args:
+        embedding_model (str): Sentence Transformers model id, the local hashing embedding if empty
+        table_prefix (str): Prefix of the table paths
+    """
+    def __init__(self, embedding_model: str = "", table_prefix: str = "knowledge"):
+        self.embedding_model = embedding_model
+        self.sources_path = model_table_path(f"{table_prefix}_sources", embedding_model)
+        self.chunks_path = model_table_path(f"{table_prefix}_chunks", embedding_model)
+
+        tables = pxt.list_tables()
+        if self.sources_path in tables and self.chunks_path in tables:
+            self._sources = pxt.get_table(self.sources_path)
+            self._chunks = pxt.get_table(self.chunks_path)
+        else:
+            self._sources, self._chunks = self._setup_tables()
+
+    def _setup_tables(self):
+        sources = pxt.create_table(
+            self.sources_path,
+            schema={
+                "source": pxt.Required[pxt.String],
+                "title": pxt.String,
+                "content_hash": pxt.String,
+                "chunk_count": pxt.Int,
+                "ingested_at": pxt.Timestamp,
+            },
+            primary_key="source",
+            if_exists="ignore",
+        )
+        chunks = pxt.create_table(
+            self.chunks_path,
+            schema={
+                "source": pxt.Required[pxt.String],
+                "chunk_index": pxt.Int,
+                "content": pxt.String,
+                "chunk_hash": pxt.String,
+            },
+            if_exists="ignore",
+        )
+        chunks.add_embedding_index("content", embedding=embedding_function(self.embedding_model), if_exists="ignore")
+
+        logger.info("Knowledge base setup successfully")
+        return sources, chunks
+
+    def content_hashes(self, sources: list[str]) -> dict[str, str]:
+        """Get the content hash of the sources already ingested."""
+        table = self._sources
+        rows = table.where(table.source.isin(sources)).select(table.source, table.content_hash).collect()
+        return {row["source"]: row["content_hash"] for row in rows}
+
+    def write(self, documents: list[KnowledgeDocument]) -> int:
+        """
+        Write a batch of new or changed documents.
+
+        The chunks a changed source no longer contains are deleted, and only the chunks not stored yet are
+        inserted, so unchanged chunks keep their embedding.
+
+        Returns:
+            Number of chunks skipped because they were already stored
+        """
+        chunks = self._chunks
+        for document in documents:
+            chunks.delete(where=(chunks.source == document.source) & ~chunks.chunk_hash.isin(document.chunk_hashes))
+
+        sources = [document.source for document in documents]
+        stored = {
+            (row["source"], row["chunk_hash"])
+            for row in chunks.where(chunks.source.isin(sources)).select(chunks.source, chunks.chunk_hash).collect()
+        }
+        rows = []
+        duplicates = 0
+        for document in documents:
+            for chunk_index, (content, chunk_hash) in enumerate(zip(document.chunks, document.chunk_hashes)):
+                if (document.source, chunk_hash) in stored:
+                    duplicates += 1
+                    continue
+                stored.add((document.source, chunk_hash))
+                rows.append({"source": document.source, "chunk_index": chunk_index, "content": content, "chunk_hash": chunk_hash})
+
+        if rows:
+            chunks.insert(rows) # The embeddings of the batch are computed here
+        now = datetime.now().astimezone()
+        self._sources.batch_update(
+            [
+                {
+                    "source": document.source,
+                    "title": document.title,
+                    "content_hash": document.content_hash,
+                    "chunk_count": len(document.chunks),
+                    "ingested_at": now,
+                }
+                for document in documents
+            ],
+            if_not_exists="insert",
+        )
+        return duplicates
+
+    def remove(self, source: str):
+        """Remove a source and its chunks."""
+        self._chunks.delete(where=self._chunks.source == source)
+        self._sources.delete(where=self._sources.source == source)
+
+    def search(self, query: str, k: int, min_score: float = 0.0) -> list[KnowledgeChunk]:
+        """Find the chunks most similar to a query, from the most to the least similar."""
+        chunks, sources = self._chunks, self._sources
+        similarity = chunks.content.similarity(query)
+        rows = chunks.order_by(similarity, asc=False).limit(k).select(
+            chunks.source, chunks.chunk_index, chunks.content, score=similarity
+        ).collect()
+
+        titles = self.titles([row["source"] for row in rows]) if len(rows) > 0 else {}
+        return [KnowledgeChunk(**row, title=titles.get(row["source"])) for row in rows if row["score"] >= min_score]
+
+    def titles(self, sources: list[str]) -> dict[str, Optional[str]]:
+        table = self._sources
+        rows = table.where(table.source.isin(sources)).select(table.source, table.title).collect()
+        return {row["source"]: row["title"] for row in rows}
+
+
+@lru_cache(maxsize=1)
+def get_knowledge_base() -> KnowledgeBase:
+    """Get the process-wide knowledge base."""
+    return KnowledgeBase(get_settings().EMBEDDING_MODEL)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import warnings
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional
+
+from loguru import logger
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+from cli_agent.config import get_settings
+
+logger = logger.bind(name="LLM Cache")
+warnings.filterwarnings("ignore", message="The function `loads` is in beta", category=LangChainBetaWarning)
+
+# Hash of the files state the turn started with, set by the agent. The files a turn writes show up
+# in its messages, so the starting files and the messages determine every model call of the turn
+files_state_hash: ContextVar[str] = ContextVar("files_state_hash", default="")
+
+# Message fields that change between identical calls: ids, provider metadata and token usage
+_VOLATILE_FIELDS = ("id", "response_metadata", "usage_metadata")
+
+
+def hash_files_state(files: Optional[dict[str, str]]) -> str:
+    return hashlib.sha256(json.dumps(files or {}, sort_keys=True).encode()).hexdigest()
+
+
+def normalize_messages(prompt: str) -> str:
+    """
+    Normalize the serialized messages of a model call, so replayed conversations map to the same key.
+
+    Message ids and metadata are dropped, tool call ids are replaced by their order of appearance and
+    the text contents are stripped.
+
+    Args:
+        prompt (str): Messages serialized by LangChain, as passed to the cache
+
+    Returns:
+        Canonical JSON of the messages
+    """
+    messages = json.loads(prompt)
+    tool_call_ids: dict[str, str] = {}
+
+    def normalize_id(tool_call_id: Optional[str]) -> Optional[str]:
+        if tool_call_id is None:
+            return None
+        return tool_call_ids.setdefault(tool_call_id, f"call_{len(tool_call_ids)}")
+
+    for message in messages:
+        kwargs = message.get("kwargs", {})
+        for field in _VOLATILE_FIELDS:
+            kwargs.pop(field, None)
+        if isinstance(kwargs.get("content"), str):
+            kwargs["content"] = kwargs["content"].strip()
+        if "tool_call_id" in kwargs:
+            kwargs["tool_call_id"] = normalize_id(kwargs["tool_call_id"])
+        for tool_call in kwargs.get("tool_calls", []) + kwargs.get("invalid_tool_calls", []):
+            tool_call["id"] = normalize_id(tool_call.get("id"))
+        kwargs.get("additional_kwargs", {}).pop("tool_calls", None) # Provider copy of `tool_calls`
+
+    return json.dumps(messages, sort_keys=True)
+
+
+class ResponseCache(BaseCache):
+    """
+    Model responses cache in a local SQLite database, with TTL and LRU eviction.
+
+    Entries are keyed on the model and its parameters, including the bound tool schemas, the normalized
+    messages and the files state of the turn. Installed as the LangChain cache, it is checked by every
+    chat model call before the provider is called.
+
+    Args:
+        path (Path): SQLite database file
+        ttl (float): Seconds a response stays valid
+        max_entries (int): Number of responses kept, the least recently used ones are evicted first
+    """
+    def __init__(self, path: Path, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Lookups run in the default executor, the connection is shared behind a lock
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL") # The CLI, the daemon and batch runs can share the file
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, created_at REAL, accessed_at REAL, generations TEXT)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        key = "\n".join([llm_string, normalize_messages(prompt), files_state_hash.get()])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT generations FROM responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+
+        try:
+            return loads(row[0])
+        except Exception as e:
+            logger.error(f"Could not load a cached response, it is ignored: {e}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        generations = []
+        for generation in return_val:
+            message = getattr(generation, "message", None)
+            if message is not None and message.id is not None:
+                # A replayed message with the same id would replace the original one in the graph state
+                generation = generation.model_copy(update={"message": message.model_copy(update={"id": None})})
+            generations.append(generation)
+
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, llm_string[:200], now, now, dumps(generations)),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self._connection.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+        self._connection.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self, **kwargs: Any):
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+
+    def __bool__(self) -> bool:
+        return True # LangChain only checks a cache that is truthy, even when it is empty
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> dict[str, Any]:
+        """Get the hits and misses of this process, and the hit rate."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+    """Get the response cache shared by every model of the process."""
+    settings = get_settings()
+    return ResponseCache(Path(settings.LLM_CACHE_PATH), ttl=settings.LLM_CACHE_TTL, max_entries=settings.LLM_CACHE_SIZE)
@@ -1,20 +1,56 @@
+import asyncio
+import contextvars
+import threading
+import time
 import uuid
 import json
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, Sequence, Union, Any, Callable
 
 from loguru import logger
-from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_core.tools import BaseTool
+from langchain_core.globals import get_llm_cache, set_llm_cache
+from langchain_core.messages import AIMessageChunk
+from langchain_core.language_models import BaseChatModel
 from deepagents import SubAgent, async_create_deep_agent, create_deep_agent
-from deepagents.tools import write_todos, ls, write_file, read_file, edit_file
+from deepagents.tools import write_todos
 
 from cli_agent.config import get_settings
-from cli_agent.agent.memory import Memory, MemoryRecord
+from cli_agent.agent.memory import Memory, MemoryRecord, CHAT_ROLES, get_memory_writer, to_pixeltable_thread
+from cli_agent.agent.filesystem import FILE_TOOLS, current_memory
+from cli_agent.agent.recall import RecalledMessage
+from cli_agent.agent.prompts import SUMMARY_PROMPT
+from cli_agent.agent.tokens import count_tokens
+from cli_agent.agent.mcp_manager import get_mcp_manager
+from cli_agent.agent.callbacks import TracingCallbackHandler
+from cli_agent.agent.tool_executor import OrderedToolUpdates, get_tool_executor
+from cli_agent.agent.llm_cache import files_state_hash, get_response_cache, hash_files_state
+from cli_agent.agent.router import get_model_router
+from cli_agent.tracing import get_tracer, traced
 
 logger = logger.bind(name="Agent Implementation")
 settings = get_settings()
 
+# Compiled deep agent graphs and their MCP tools, keyed by the agent configuration. Conversations
+# only differ by their Memory, so switching conversation reuses the graph and its model client.
+_compiled_agents: dict[tuple, tuple[list, Any]] = {}
+
+# Semantic recall search on the Pixeltable thread. A search still running once its latency budget is spent
+# is abandoned, and the next turns skip recall until it finished instead of queueing behind it
+_recall_search: Optional[Future] = None
+_recall_search_lock = threading.Lock()
+RECALLED_MESSAGE_LENGTH = 1000 # Characters kept of each recalled message
+
+
+@lru_cache(maxsize=None)
+def get_summary_model(model_name: str) -> BaseChatModel:
+    """Get the chat model used to update conversation summaries, shared by every agent."""
+    from langchain.chat_models import init_chat_model
+
+    return init_chat_model(model_name)
+
 
 class Agent:
     """Main agent class."""
@@ -22,11 +58,12 @@ class Agent:
         self,
         tools: Sequence[Union[BaseTool, Callable, dict[str, Any]]],
         system_prompt: str,
-        model_name: str = None,
+        model_name: Union[str, BaseChatModel] = None,
         subagents: list[SubAgent] = None,
         mcp_servers_config: Optional[str] = None,
         # disable_tools: Optional[list] = None,
-        memory: Memory = None
+        memory: Memory = None,
+        summary_model: Optional[BaseChatModel] = None
     ):
         self._id = str(uuid.uuid4())
         
@@ -38,37 +75,67 @@ class Agent:
         # self.disable_tools = disable_tools if disable_tools else []
         self.memory = memory if memory else Memory(memory_id=self._id)
 
-        self.built_in_tools = [write_todos, ls, write_file, read_file, edit_file]
+        self.built_in_tools = [write_todos, *FILE_TOOLS]
         self.mcp_tools: list = None
 
         self.main_agent = None
 
+        self.summary_model = summary_model # Defaults to settings.SUMMARY_MODEL on first summarization
+        self._summary_task: Optional[asyncio.Task] = None
+        self._summary_stale = False # Messages were added while the summary task was running
+
     async def setup(self):
-        """Create the deep agent."""
+        """Create the deep agent, or reuse the one compiled for the same configuration."""
+        if settings.LLM_CACHE_ENABLED and get_llm_cache() is None:
+            set_llm_cache(get_response_cache())
+
+        config_key = self._config_key()
+        if config_key in _compiled_agents:
+            self.mcp_tools, self.main_agent = _compiled_agents[config_key]
+            return
+
         try:
             self.mcp_tools = await self._get_mcp_tools()
-            all_tools = self.tools + self.mcp_tools
+            # Sync tools run in the shared thread pool, every tool call is limited and can time out
+            all_tools = get_tool_executor().wrap_tools(FILE_TOOLS + self.tools + self.mcp_tools)
             self.main_agent = async_create_deep_agent(
-                model=self.model_name,
+                model=self._get_model(),
                 tools=all_tools,
                 instructions=self.system_prompt,
                 subagents=self.subagents,
+                builtin_tools=["write_todos"], # The file tools open the conversation files lazily instead of keeping them in the graph state
             )
         except Exception:
             logger.critical("Encountered error during agent creation!")
             raise
 
+        # Don't keep a graph built without the MCP tools because the servers were unavailable
+        if self.mcp_config is None or self.mcp_tools:
+            _compiled_agents[config_key] = (self.mcp_tools, self.main_agent)
+
+    def _get_model(self) -> Union[str, BaseChatModel]:
+        """Get the model of the graph: a router trying the cheaper `ROUTER_TIERS` first, then the agent's model, if any are configured."""
+        if settings.ROUTER_TIERS and isinstance(self.model_name, str):
+            return get_model_router((*settings.ROUTER_TIERS, self.model_name))
+        return self.model_name
+
+    def _config_key(self) -> tuple:
+        """Key of everything the compiled graph depends on. Tools and model instances are long-lived objects so their identity is stable."""
+        return (
+            self.model_name if isinstance(self.model_name, str) else id(self.model_name),
+            tuple(settings.ROUTER_TIERS),
+            self.system_prompt,
+            tuple(id(tool) for tool in self.tools),
+            json.dumps(self.subagents, sort_keys=True, default=str),
+            self.mcp_config,
+        )
+
+    @traced("mcp.get_tools")
     async def _get_mcp_tools(self):
-        """Get MCP tools if MCP Servers are available."""
+        """Get MCP tools if MCP Servers are available. Connections are pooled and shared across agents."""
         if self.mcp_config is not None:
             try:
-                with open(self.mcp_config, "r") as f:
-                    config = json.load(f)
-                
-                client = MultiServerMCPClient(config)
-                mcp_tools = await client.get_tools()
-                
-                return mcp_tools
+                return await get_mcp_manager(self.mcp_config).get_tools()
             except Exception as e:
                 logger.error(
                     f"Some errors occured during MCP connection, make sure the config file is correct: {e}"
@@ -77,65 +144,178 @@ class Agent:
         else:
             return []
         
+    @traced("memory.build_history")
     def _build_chat_history(
         self,
         user_message: str,
-        memory_size: int = settings.MEMORY_SIZE
-    ) -> tuple[list[dict[str, Any]], Optional[dict[str, str]]]:
-        latest_records = self.memory.get_latest_memory(memory_size)
+        token_budget: int = settings.MEMORY_TOKEN_BUDGET
+    ) -> list[dict[str, Any]]:
+        summary = self.memory.get_latest_summary()
+        window = self._select_context_window(token_budget, summary)
 
         history = [{"role": "system", "content": self.system_prompt}]
-        for record in latest_records:
-            if record.role in ["user", "assistant"]:
-                # If no memory saved yet then this will simply return an empty list []
-                history += [{"role": record.role, "content": record.content}]
+        if summary is not None:
+            summary_text, _ = self._parse_summary(summary)
+            history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary_text}"})
 
-                # Summarization logic (not implemented)
+        recalled = self._recall(user_message, window)
+        if recalled:
+            history.append({"role": "system", "content": self._format_recalled(recalled)})
 
+        # If no memory saved yet then the window is simply an empty list []
+        history += [{"role": record.role, "content": record.content} for record in window]
         history.append({"role": "user", "content": user_message})
-        
-        files = None
-        for record in reversed(latest_records):
-            if record.role == "state_files":
-                files = json.loads(record.content)
-                break # Only get the latest state
 
-        return history, files
-    
-    def _add_to_memory(self, role: str, message: str):
-        """Add a message to the memory."""
+        return history
+
+    def _recall(self, user_message: str, window: list[MemoryRecord]) -> list[RecalledMessage]:
+        """Find the past messages relevant to the user message that are not in the context window, within the recall latency budget."""
+        global _recall_search
+        if settings.RECALL_TOP_K <= 0:
+            return []
+
+        with _recall_search_lock:
+            if _recall_search is not None and not _recall_search.done():
+                logger.debug("Semantic recall skipped, an abandoned search is still running")
+                return []
+            future = _recall_search = get_memory_writer().submit(
+                self.memory.recall,
+                user_message,
+                settings.RECALL_TOP_K,
+                min_score=settings.RECALL_MIN_SCORE,
+                all_conversations=settings.RECALL_SCOPE == "all",
+                exclude_from=window[0].timestamp if window else None,
+            )
         try:
+            return future.result(timeout=settings.RECALL_TIMEOUT_MS / 1000)
+        except FuturesTimeoutError:
+            future.cancel() # Never run if it is still queued, e.g. behind a batch of writes
+            logger.debug(f"Semantic recall skipped, the search took more than {settings.RECALL_TIMEOUT_MS}ms")
+        except Exception as e:
+            logger.error(f"Semantic recall failed: {e}")
+        return []
+
+    def _format_recalled(self, recalled: list[RecalledMessage]) -> str:
+        lines = ["Earlier messages that may be relevant to the user's message:"]
+        for message in recalled:
+            source = "" if message.memory_id == self.memory.directory else ", another conversation"
+            content = message.content[:RECALLED_MESSAGE_LENGTH]
+            lines.append(f"- [{message.role}, {message.timestamp:%Y-%m-%d %H:%M}{source}] {content}")
+        return "\n".join(lines)
+
+    def _select_context_window(self, token_budget: int, summary: Optional[MemoryRecord]) -> list[MemoryRecord]:
+        """Select the latest messages that fit in the token budget and are not covered by the summary yet."""
+        _, covered_until = self._parse_summary(summary)
+        budget = token_budget - ((summary.tokens or 0) if summary is not None else 0)
+
+        window = []
+        for record in reversed(self.memory.get_latest_memory(settings.MEMORY_CACHE_SIZE)):
+            if record.role not in CHAT_ROLES:
+                continue
+            if covered_until is not None and record.timestamp <= covered_until:
+                break
+
+            tokens = record.tokens if record.tokens is not None else count_tokens(record.content)
+            if tokens > budget:
+                break
+            budget -= tokens
+            window.append(record)
+        window.reverse()
+
+        # Start on a user message so the model never sees an answer without its question
+        while window and window[0].role != "user":
+            window.pop(0)
+
+        return window
+
+    @staticmethod
+    def _parse_summary(summary: Optional[MemoryRecord]) -> tuple[str, Optional[datetime]]:
+        """Get the summary text and the timestamp of the last message it covers."""
+        if summary is None:
+            return "", None
+        data = json.loads(summary.content)
+        return data["summary"], datetime.fromisoformat(data["covered_until"])
+
+    @traced("memory.update_summary")
+    async def _update_summary(self, token_budget: int = settings.MEMORY_TOKEN_BUDGET):
+        """
+        Fold the messages that fell out of the context window into the rolling summary.
+
+        Only the messages after the ones covered by the latest summary are sent with it to the summary
+        model, so the summary is updated incrementally and never recomputed from scratch.
+        """
+        try:
+            summary = await to_pixeltable_thread(self.memory.get_latest_summary)
+            window = await to_pixeltable_thread(self._select_context_window, token_budget, summary)
+            summary_text, covered_until = self._parse_summary(summary)
+
+            window_start = window[0].timestamp if window else datetime.now().astimezone()
+            dropped = await to_pixeltable_thread(self.memory.get_memory_between, covered_until, window_start)
+            if not dropped:
+                return
+
+            if self.summary_model is None:
+                self.summary_model = get_summary_model(settings.SUMMARY_MODEL)
+            response = await self.summary_model.ainvoke(
+                SUMMARY_PROMPT.format(
+                    summary=summary_text or "(empty)",
+                    messages="\n\n".join(f"{record.role}: {record.content}" for record in dropped),
+                )
+            )
+
             self.memory.insert_memory(
                 MemoryRecord(
                     message_id=str(uuid.uuid4()),
-                    role=role,
-                    content=message,
+                    role="summary",
+                    content=json.dumps({"summary": response.content, "covered_until": dropped[-1].timestamp.isoformat()}),
                     timestamp=datetime.now()
                 )
             )
         except Exception as e:
-            logger.error(f"Errors occurred when adding message to memory: {e}")
+            logger.error(f"Errors occurred when updating the conversation summary: {e}")
 
-    # def _add_memory_pair(self, user_message: str, assistant_message: str):
-    #     """Add both the user messageg and the agent's last response to memory."""
-    #     self._add_to_memory(role="user", message=user_message)
-    #     self._add_to_memory(role="assistant", message=assistant_message)
+    async def wait_for_summary(self):
+        """Wait for the summary update running in the background after the last turn, if any."""
+        if self._summary_task is not None:
+            await self._summary_task
 
-    def _add_state_attribute_to_memory(self, state_files: dict[str, str]):
-        """Add state attribute to memory. Only the files state attribute is added at the moment."""
-        try:
-            state_files_string = json.dumps(state_files)
+    def _schedule_summary(self):
+        """
+        Update the summary in the background, the user reads the answer meanwhile.
+
+        A summary still running when the turn ends folds the newer messages in another pass once it is
+        done, so the summaries of a conversation never run concurrently nor hold back the next turn.
+        """
+        if self._summary_task is not None and not self._summary_task.done():
+            self._summary_stale = True
+            return
+        # The summary is traced on its own instead of in the turn that scheduled it
+        self._summary_task = asyncio.create_task(self._roll_up_summary(), context=contextvars.Context())
 
+    async def _roll_up_summary(self):
+        self._summary_stale = True
+        while self._summary_stale:
+            self._summary_stale = False
+            await self._update_summary()
+
+    def _add_to_memory(self, role: str, message: str):
+        """Add a message to the memory."""
+        try:
             self.memory.insert_memory(
                 MemoryRecord(
                     message_id=str(uuid.uuid4()),
-                    role="state_files",
-                    content=state_files_string,
+                    role=role,
+                    content=message,
                     timestamp=datetime.now()
                 )
             )
         except Exception as e:
-            logger.error(f"Errors occurred when adding state attribute to memory: {e}")
+            logger.error(f"Errors occurred when adding message to memory: {e}")
+
+    # def _add_memory_pair(self, user_message: str, assistant_message: str):
+    #     """Add both the user messageg and the agent's last response to memory."""
+    #     self._add_to_memory(role="user", message=user_message)
+    #     self._add_to_memory(role="assistant", message=assistant_message)
 
 
     def reset_memory(self):
@@ -175,12 +355,13 @@ class Agent:
         return built_in_tools_name, tools_name, mcp_servers
 
 
-    async def chat(self, user_message: str):
+    async def chat(self, user_message: str, stream_tokens: bool = False):
         """
         Main entry point for processing user message.
         
         Args:
             user_message (str): A new user input message
+            stream_tokens (bool): Also yield the main agent's model tokens as `{"token": text}` chunks as soon as they are generated
         
         Returns:
             Output streams of the agent.
@@ -188,26 +369,68 @@ class Agent:
         if self.main_agent is None:
             raise ValueError("Run setup() for the agent first before calling chat()!")
         
-        try:
-            chat_history, state_files = self._build_chat_history(user_message)
-            all_files = state_files or {}
-
-            self._add_to_memory(role="user", message=user_message)
-
-            async for chunk in self.main_agent.astream({"messages": chat_history, "files": all_files}):
-                if chunk.get("tools"):
-                    files = chunk["tools"].get("files")
-                    if files:
-                        self._add_state_attribute_to_memory(files)
-                yield chunk # When ever a chunk is streamed, it is passed to the main chat function and the function can resume here
-            
-            # Add the last streamed output (which belongs to the agent) and the user message to memory
-            self._add_to_memory(role="assistant", message=chunk["agent"]["messages"][0].content)
-            # self._add_memory_pair(
-            #     user_message=user_message,
-            #     assistant_message=chunk["agent"]["messages"][0].content
-            # )
-        except Exception as e:
-            logger.error(f"Unexpected error: {e}")
+        # The context is built from the last written summary, the summary of the previous turns may still
+        # be running: the messages it is folding are left out of this turn instead of delaying it
+        tracer = get_tracer()
+        with tracer.span("agent.chat", memory_id=self.memory.directory) as turn_span:
+            try:
+                start = time.perf_counter()
+                # On a worker thread, not the Pixeltable one: the history waits for the recall search, which runs there
+                chat_history = await asyncio.to_thread(self._build_chat_history, user_message)
+                # Only the paths and digests of the files are loaded, the file tools read the contents they need
+                file_manifest = await to_pixeltable_thread(self.memory.load_file_manifest)
+                files_state_hash.set(hash_files_state(file_manifest)) # Part of the response cache keys
+                current_memory.set(self.memory)
+                turn_span.set_attribute("history.messages", len(chat_history))
+
+                self._add_to_memory(role="user", message=user_message)
+
+                # Message-level streaming comes from the chat model callbacks, subagent tokens are not included
+                stream_mode = ["updates", "messages"] if stream_tokens else ["updates"]
+                config = {"callbacks": [TracingCallbackHandler(tracer, parent=turn_span)]}
+                tool_updates = OrderedToolUpdates() # The tool calls of a step run concurrently and finish in any order
+                async for mode, chunk in self.main_agent.astream({"messages": chat_history}, config=config, stream_mode=stream_mode):
+                    if mode == "messages":
+                        text = self._get_token_text(chunk[0])
+                        if text:
+                            if "time_to_first_token_ms" not in turn_span.attributes:
+                                first_token_latency = time.perf_counter() - start
+                                turn_span.set_attribute("time_to_first_token_ms", first_token_latency * 1000)
+                                tracer.observe("time_to_first_token", first_token_latency)
+                            yield {"token": text}
+                        continue
+
+                    if chunk.get("tools"):
+                        updates = tool_updates.add(chunk)
+                    else:
+                        updates = tool_updates.flush() + [chunk]
+                        if chunk.get("agent"):
+                            tool_updates.expect(chunk["agent"]["messages"][0].tool_calls)
+
+                    for update in updates:
+                        last_update = update
+                        yield update # When ever a chunk is streamed, it is passed to the main chat function and the function can resume here
+                
+                # Add the last streamed output (which belongs to the agent) and the user message to memory
+                self._add_to_memory(role="assistant", message=last_update["agent"]["messages"][0].content)
+
+                self._schedule_summary()
+                # self._add_memory_pair(
+                #     user_message=user_message,
+                #     assistant_message=chunk["agent"]["messages"][0].content
+                # )
+            except Exception as e:
+                turn_span.error = f"{type(e).__name__}: {e}"
+                logger.error(f"Unexpected error: {e}")
 
-        
\ No newline at end of file
+    @staticmethod
+    def _get_token_text(message: Any) -> str:
+        """Get the text of a streamed model message chunk. Tool messages and tool call arguments are skipped."""
+        if not isinstance(message, AIMessageChunk):
+            return ""
+        if isinstance(message.content, str):
+            return message.content
+        return "".join(
+            block.get("text", "") for block in message.content
+            if isinstance(block, dict) and block.get("type") == "text"
+        )
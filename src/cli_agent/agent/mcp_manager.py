@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional
+
+from loguru import logger
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp import ClientSession
+from mcp.types import Tool as MCPTool
+
+from cli_agent.config import get_settings
+from cli_agent.tracing import get_tracer
+
+logger = logger.bind(name="MCP Session Manager")
+
+
+class _LazySession:
+    """Stand-in for a ClientSession that waits for the pooled session of a server when a tool is called."""
+    def __init__(self, manager: "MCPSessionManager", server_name: str):
+        self._manager = manager
+        self._server_name = server_name
+
+    async def call_tool(self, name: str, arguments: dict[str, Any]):
+        with get_tracer().span("mcp.call_tool", server=self._server_name, tool=name):
+            session = await self._manager.get_session(self._server_name)
+            return await session.call_tool(name, arguments)
+
+
+class MCPSessionManager:
+    """
+    Process-wide pool of MCP server sessions shared by every Agent.
+
+    Each server is connected once by a long-lived task that keeps its session open, so creating a new
+    Agent does not spawn the servers and redo the handshakes again. Tool schemas are cached on disk
+    keyed by the config hash, which lets the tools be created before the servers finish connecting.
+    """
+    def __init__(self, config_path: str, timeout: Optional[float] = None, cache_dir: Path = Path(".cache")):
+        with open(config_path, "r") as f:
+            self.config: dict[str, dict] = json.load(f)
+
+        self.config_hash = hashlib.sha256(json.dumps(self.config, sort_keys=True).encode()).hexdigest()
+        self.timeout = timeout or get_settings().MCP_TIMEOUT
+        self.cache_file_path = cache_dir / "mcp_tools.json"
+
+        self._client = MultiServerMCPClient(self.config)
+        self._sessions: dict[str, ClientSession] = {}
+        self._schemas: dict[str, list[MCPTool]] = {}
+        self._ready: dict[str, asyncio.Event] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._closing: Optional[asyncio.Event] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def servers(self) -> list[str]:
+        return list(self.config.keys())
+
+    def connect(self):
+        """Start connecting to every server in the background. Calling it again is a no-op."""
+        if self._closing is None:
+            self._closing = asyncio.Event()
+
+        for server_name in self.servers:
+            if server_name not in self._tasks:
+                self._ready[server_name] = asyncio.Event()
+                self._tasks[server_name] = asyncio.create_task(self._serve(server_name), name=f"mcp-{server_name}")
+
+    async def _serve(self, server_name: str):
+        """Hold the session of a server open until the manager is closed."""
+        try:
+            async with self._client.session(server_name) as session:
+                self._schemas[server_name] = await self._list_tools(session)
+                self._sessions[server_name] = session
+                self._ready[server_name].set()
+                await self._closing.wait()
+        except Exception as e:
+            logger.error(f"Could not connect to MCP server '{server_name}': {e}")
+        finally:
+            self._sessions.pop(server_name, None)
+            self._ready[server_name].set() # Unblock waiters, they will see the server is unavailable
+            self._tasks.pop(server_name, None)
+
+    @staticmethod
+    async def _list_tools(session: ClientSession) -> list[MCPTool]:
+        tools, cursor = [], None
+        while True:
+            result = await session.list_tools(cursor=cursor)
+            tools += result.tools
+            cursor = result.nextCursor
+            if not cursor:
+                return tools
+
+    async def get_session(self, server_name: str) -> ClientSession:
+        """Get the open session of a server, reconnecting it if the previous connection was lost."""
+        self.connect()
+        try:
+            await asyncio.wait_for(self._ready[server_name].wait(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"MCP server '{server_name}' did not connect within {self.timeout}s")
+
+        if server_name not in self._sessions:
+            raise RuntimeError(f"MCP server '{server_name}' is not available")
+        return self._sessions[server_name]
+
+    async def get_tools(self) -> list[BaseTool]:
+        """
+        Get the tools of every MCP server.
+
+        Returns the tools from the on-disk schema cache right away if the config did not change, the
+        connections keep warming up in the background. Otherwise waits for the servers in parallel, each
+        one with its own timeout.
+        """
+        self.connect()
+
+        schemas = self._load_cached_schemas()
+        if schemas is None:
+            await asyncio.gather(*(self._wait_ready(server_name) for server_name in self.servers))
+            schemas = dict(self._schemas)
+            if set(schemas) == set(self.servers): # Don't cache a partial tool list
+                self._save_cached_schemas(schemas)
+        elif self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_cached_schemas())
+
+        return [
+            convert_mcp_tool_to_langchain_tool(_LazySession(self, server_name), tool)
+            for server_name, server_tools in schemas.items()
+            for tool in server_tools
+        ]
+
+    async def _wait_ready(self, server_name: str):
+        try:
+            await asyncio.wait_for(self._ready[server_name].wait(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"MCP server '{server_name}' did not connect within {self.timeout}s, its tools are skipped")
+
+    async def _refresh_cached_schemas(self):
+        """Update the cache once the servers are connected, the tools will be up to date on next startup."""
+        await asyncio.gather(*(self._wait_ready(server_name) for server_name in self.servers))
+        if set(self._schemas) == set(self.servers):
+            self._save_cached_schemas(dict(self._schemas))
+
+    def _load_cached_schemas(self) -> Optional[dict[str, list[MCPTool]]]:
+        if not self.cache_file_path.exists():
+            return None
+
+        try:
+            with open(self.cache_file_path, "r") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Could not read MCP tools cache {self.cache_file_path}: {e}")
+            return None
+
+        if data.get("config_hash") != self.config_hash:
+            return None
+        return {
+            server_name: [MCPTool.model_validate(tool) for tool in server_tools]
+            for server_name, server_tools in data["servers"].items()
+        }
+
+    def _save_cached_schemas(self, schemas: dict[str, list[MCPTool]]):
+        data = {
+            "config_hash": self.config_hash,
+            "servers": {
+                server_name: [tool.model_dump(mode="json", exclude_none=True) for tool in server_tools]
+                for server_name, server_tools in schemas.items()
+            },
+        }
+        try:
+            self.cache_file_path.parent.mkdir(exist_ok=True)
+            with open(self.cache_file_path, "w") as f:
+                json.dump(data, f, indent=2)
+        except IOError as e:
+            logger.error(f"Could not write MCP tools cache {self.cache_file_path}: {e}")
+
+    async def close(self):
+        """Close every server session. The servers are connected again by the next call, in this event loop or another."""
+        if self._closing is None:
+            return
+
+        self._closing.set()
+        for server_name, task in self._tasks.items():
+            if not self._ready[server_name].is_set(): # Still connecting, it would never see the manager closing
+                task.cancel()
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        await asyncio.gather(*self._tasks.values(), *filter(None, [self._refresh_task]), return_exceptions=True)
+
+        # The events belong to the event loop that is closing
+        self._closing = None
+        self._ready.clear()
+        self._refresh_task = None
+
+
+@lru_cache(maxsize=None)
+def get_mcp_manager(config_path: str) -> MCPSessionManager:
+    """Get the process-wide session manager of an MCP config file."""
+    return MCPSessionManager(config_path)
@@ -1,51 +1,113 @@
+import asyncio
+import atexit
+import contextvars
+import functools
 import json
-import os
-from contextlib import redirect_stdout, redirect_stderr
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
 from datetime import datetime
-from pathlib import Path
+from functools import lru_cache
+from typing import Any, Callable, Optional
 
 import pixeltable as pxt
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from loguru import logger
 
+from cli_agent.config import get_settings
+from cli_agent.agent.catalog import get_catalog
+from cli_agent.agent.file_state import FileStateStore
+from cli_agent.agent.recall import RecalledMessage, get_recall_index
+from cli_agent.agent.message_search import get_message_search_index
+from cli_agent.agent.registry import get_registry, remove_conversation
+from cli_agent.agent.tokens import count_tokens
+from cli_agent.tracing import traced
+
 logger = logger.bind(name="Memory Management")
 
+# Pixeltable keeps its connection state globally and runs its queries on a process-wide event loop,
+# created by the first thread that queries it. Every call runs on the thread of the memory writer, which
+# owns that loop, and holds the lock so a query and the records still queued are read in one critical section.
+pixeltable_lock = threading.RLock()
+
+# Roles whose content is sent to the model, their token counts are stored with the record
+CHAT_ROLES = ["user", "assistant"]
+COUNTED_ROLES = CHAT_ROLES + ["summary"]
+
+
+def on_pixeltable_thread(fn: Callable) -> Callable:
+    """Decorator running every call of a function querying Pixeltable on the Pixeltable thread."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return get_memory_writer().call(fn, *args, **kwargs)
+    return wrapper
+
+
+async def to_pixeltable_thread(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Await a function querying Pixeltable, run on the Pixeltable thread instead of a worker thread like `asyncio.to_thread`."""
+    return await get_memory_writer().run(fn, *args, **kwargs)
+
 
 class MemoryRecord(BaseModel):
     message_id: str
     role: str
     content: str
     timestamp: datetime
+    tokens: Optional[int] = None
+
+    @field_validator("timestamp")
+    @classmethod
+    def _make_timezone_aware(cls, timestamp: datetime) -> datetime:
+        # Pixeltable returns aware timestamps, queued records must be comparable with them
+        return timestamp if timestamp.tzinfo is not None else timestamp.astimezone()
 
 
 class Memory:
-    def __init__(self, memory_id: str):
-        self._cache_dir = Path(".cache")
-        self.cache_file_path = self._cache_dir / "conversation_history.json"
-
-        # Check if the directory/table already exists
-        if memory_id in pxt.list_dirs():
-            self.directory = memory_id
-        else:
-            if memory_id.startswith("id_"):
+    def __init__(self, memory_id: str, cache_size: Optional[int] = None):
+        # Bounded cache of the latest records, filled by the first tail query and kept up to date on insert
+        self._tail_cache: deque[MemoryRecord] = deque(maxlen=cache_size or get_settings().MEMORY_CACHE_SIZE)
+        self._tail_loaded = False
+
+        self._latest_summary: Optional[MemoryRecord] = None
+        self._summary_loaded = False
+
+        self._open(memory_id)
+        self.file_state = FileStateStore(self.directory, cache_size=get_settings().FILES_CACHE_SIZE)
+        if get_registry().register(self.directory):
+            logger.info("Conversation history will be saved\n")
+
+    @on_pixeltable_thread
+    def _open(self, memory_id: str):
+        with pixeltable_lock:
+            # Check if the directory/table already exists
+            if memory_id in pxt.list_dirs():
                 self.directory = memory_id
-            # Use a valid directory name format for Pixeltable
             else:
-                self.directory = f"id_{memory_id.replace('-', '')}"
+                if memory_id.startswith("id_"):
+                    self.directory = memory_id
+                # Use a valid directory name format for Pixeltable
+                else:
+                    self.directory = f"id_{memory_id.replace('-', '')}"
 
-            pxt.create_dir(self.directory, if_exists="replace_force")
+                pxt.create_dir(self.directory, if_exists="replace_force")
 
-            self._setup_table()
+                self._setup_table()
+                get_catalog().register(self.directory)
 
-        self._memory_table = pxt.get_table(f"{self.directory}.memory")
-        self._track_directory_in_json()
+            self._memory_table = pxt.get_table(f"{self.directory}.memory")
+            if "tokens" not in self._memory_table.columns():
+                # Tables created by older versions don't store token counts
+                self._memory_table.add_column(tokens=pxt.Int, if_exists="ignore")
 
     def _setup_table(self):
         table_schema = {
             "message_id": pxt.String,
             "role": pxt.String,
             "content": pxt.String,
-            "timestamp": pxt.Timestamp
+            "timestamp": pxt.Timestamp,
+            "tokens": pxt.Int,
         }
         pxt.create_table(
             f"{self.directory}.memory",
@@ -55,73 +117,354 @@ class Memory:
 
         logger.info("New memory table setup successfully")
 
-    def _track_directory_in_json(self):
-        """Use a JSON file to track saved Pixeltable directories."""
-        self._cache_dir.mkdir(exist_ok=True)
+    @traced("memory.insert")
+    def insert_memory(self, memory_record: MemoryRecord):
+        """Queue a record to be written by the background memory writer."""
+        if memory_record.tokens is None and memory_record.role in COUNTED_ROLES:
+            memory_record.tokens = count_tokens(memory_record.content)
+        get_memory_writer().enqueue(self, memory_record)
 
-        data = {}
-        if self.cache_file_path.exists(): # Load the existing json file
-            try:
-                with open(self.cache_file_path, "r") as f:
-                    data = json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
-                logger.error(f"Could not read existing JSON file {self.cache_file_path}: {e}")
-                data = {}
-        
-        # Intialize the list if key doesn't exist
-        json_key = "memory_tables"
-        if json_key not in data:
-            data[json_key] = []
-        
-        # Append the Pixeltable directory if not present
-        if self.directory not in data[json_key]:
-            data[json_key].append(self.directory)
-
-            # Write back to file
-            try:
-                with open(self.cache_file_path, "w") as f:
-                    json.dump(data, f, indent=2)
-                logger.info("Conversation history will be saved\n")
-            except IOError:
-                logger.error(f"Could not write to JSON file {self.cache_file_path}: {e}")
-    
-    def _remove_directory_from_json(self):
-        """Remove the Pixeltable directory from cache."""
-        if not self.cache_file_path.exists():
-            logger.warning("No conversation history file to update")
-            return
+        if memory_record.role == "summary":
+            self._latest_summary = memory_record
+            self._summary_loaded = True
+
+        # Only keep the cache in sync once it has been filled, otherwise the first tail query would duplicate records
+        if self._tail_loaded:
+            self._tail_cache.append(memory_record)
+
+    def _write_records(self, memory_records: list["MemoryRecord"]):
+        """Insert a batch of records and update the catalog. Called by the memory writer."""
+        file_changes = [json.loads(record.content) for record in memory_records if record.role == "file_changes"]
+        if file_changes:
+            self.file_state.write(file_changes)
+
+        self._memory_table.insert([record.model_dump() for record in memory_records])
+        get_catalog().record_messages(self.directory, memory_records)
 
         try:
-            with open(self.cache_file_path, "r") as f:
-                data = json.load(f)
-            
-            json_key = "memory_tables"
-            if json_key in data and self.directory in data[json_key]:
-                data[json_key].remove(self.directory) # Remove the directory from list of directories
-
-                with open(self.cache_file_path, "w") as f:
-                    json.dump(data, f, indent=2) # Write back to file
-                logger.info(f"Removed chat conversation from history")
-            else:
-                logger.warning("Conversation not found in history")
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"Could not update JSON file {self.cache_file_path}: {e}")
-    
-    def insert_memory(self, memory_record: MemoryRecord):
-      # Disable logging messages to avoid it printing with agent responses
-      with open(os.devnull, 'w') as devnull:
-          with redirect_stdout(devnull), redirect_stderr(devnull):
-            self._memory_table.insert([memory_record.model_dump()])
+            get_message_search_index().add(self.directory, memory_records)
+        except Exception as e:
+            logger.error(f"Could not index {len(memory_records)} record(s) for full-text search: {e}")
+
+        if get_settings().RECALL_TOP_K > 0:
+            try:
+                get_recall_index().add(self.directory, memory_records)
+            except Exception as e:
+                logger.error(f"Could not index {len(memory_records)} record(s) for semantic recall: {e}")
+
+    def _merge_pending(self, records: list[MemoryRecord]) -> list[MemoryRecord]:
+        """
+        Append the records still waiting in the writer queue, they are always newer than the stored ones.
+
+        Called with `pixeltable_lock` held since the query of `records`, otherwise the writer could store
+        and dequeue records in between, which would then be in neither list.
+        """
+        stored_ids = {record.message_id for record in records}
+        pending = get_memory_writer().pending_records(self.directory)
+        return records + [record for record in pending if record.message_id not in stored_ids]
+
+    @traced("memory.load_files")
+    @on_pixeltable_thread
+    def load_file_manifest(self) -> dict[str, str]:
+        """Get the paths of the DeepAgents files of the conversation, mapped to the digest of their content. Contents are read by `read_file`."""
+        if not self.file_state.loaded:
+            with pixeltable_lock:
+                self.file_state.restore()
+                legacy_files = None if self.file_state.manifest else self._latest_legacy_files()
+
+            # Conversations saved before file state was content-addressed are migrated on first load
+            if legacy_files:
+                self.save_files(legacy_files)
+
+        return self.file_state.manifest
+
+    def list_files(self) -> list[str]:
+        return list(self.load_file_manifest())
 
+    @traced("memory.read_file")
+    def read_file(self, path: str) -> Optional[str]:
+        """Get the content of a file, None if the conversation has no such file."""
+        if not self.file_state.loaded:
+            self.load_file_manifest()
+        digest, content = self.file_state.cached_content(path)
+        if digest is None or content is not None:
+            return content
+
+        return get_memory_writer().call(self.file_state.read_blob, digest)
+
+    def _latest_legacy_files(self) -> Optional[dict[str, str]]:
+        """Get the latest full files snapshot stored as a `state_files` record by older versions."""
+        table = self._memory_table
+        records = table.where(table.role == "state_files").order_by(table.timestamp, asc=False).limit(1).collect()
+        return json.loads(records[0]["content"]) if len(records) > 0 else None
+
+    @traced("memory.save_files")
+    def save_files(self, files: dict[str, str]):
+        """Record the files that changed in a files state update. Only their paths and content digests are queued."""
+        if not self.file_state.loaded:
+            self.load_file_manifest()
+        changes = self.file_state.diff(files)
+        if changes:
+            self.insert_memory(
+                MemoryRecord(
+                    message_id=str(uuid.uuid4()),
+                    role="file_changes",
+                    content=json.dumps(changes),
+                    timestamp=datetime.now()
+                )
+            )
+
+    def flush(self):
+        """Block until every queued record has been written to the database."""
+        get_memory_writer().flush()
+
+    @on_pixeltable_thread
     def get_all_memory(self) -> list[MemoryRecord]:
         """Get all memory record of the table."""
-        return [MemoryRecord(**record) for record in self._memory_table.collect()]
-    
+        with pixeltable_lock:
+            records = [MemoryRecord(**record) for record in self._memory_table.collect()]
+            return self._merge_pending(records)
+
+    @on_pixeltable_thread
+    def _query_latest_memory(self, n: int) -> list[MemoryRecord]:
+        """Query the n latest memory records in the database, ordered from oldest to newest."""
+        table = self._memory_table
+        with pixeltable_lock:
+            records = table.order_by(table.timestamp, asc=False).limit(n).collect()
+            return self._merge_pending([MemoryRecord(**record) for record in reversed(records)])[-n:]
+
+    @traced("memory.get_between")
+    @on_pixeltable_thread
+    def get_memory_between(
+        self,
+        after: Optional[datetime],
+        before: datetime,
+        roles: list[str] = CHAT_ROLES
+    ) -> list[MemoryRecord]:
+        """Get the records of the given roles strictly between two timestamps, from oldest to newest."""
+        table = self._memory_table
+        condition = table.role.isin(roles) & (table.timestamp < before)
+        if after is not None:
+            condition = condition & (table.timestamp > after)
+
+        with pixeltable_lock:
+            records = table.where(condition).order_by(table.timestamp).collect()
+            records = self._merge_pending([MemoryRecord(**record) for record in records])
+
+        return [
+            record for record in records
+            if record.role in roles and record.timestamp < before and (after is None or record.timestamp > after)
+        ]
+
+    @traced("memory.get_summary")
+    def get_latest_summary(self) -> Optional[MemoryRecord]:
+        """Get the latest rolling summary of the conversation, if any."""
+        if not self._summary_loaded:
+            self._latest_summary = self._query_latest_summary()
+            self._summary_loaded = True
+
+        return self._latest_summary
+
+    @on_pixeltable_thread
+    def _query_latest_summary(self) -> Optional[MemoryRecord]:
+        table = self._memory_table
+        with pixeltable_lock:
+            records = table.where(table.role == "summary").order_by(table.timestamp, asc=False).limit(1).collect()
+        return MemoryRecord(**records[0]) if len(records) > 0 else None
+
+    @traced("memory.recall")
+    @on_pixeltable_thread
+    def recall(
+        self,
+        query: str,
+        k: int,
+        min_score: float = 0.0,
+        all_conversations: bool = True,
+        exclude_from: Optional[datetime] = None
+    ) -> list[RecalledMessage]:
+        """
+        Find the past messages most relevant to a query with the semantic recall index.
+
+        Args:
+            query (str): Text the messages are compared to
+            k (int): Maximum number of messages returned
+            min_score (float): Minimum similarity of the returned messages
+            all_conversations (bool): Search every conversation instead of this one only
+            exclude_from (datetime): Skip the messages of this conversation from this time, like the ones in the context window
+
+        Returns:
+            Messages from the most to the least similar, records not written yet are not indexed
+        """
+        return get_recall_index().search(
+            query,
+            k,
+            min_score=min_score,
+            memory_id=None if all_conversations else self.directory,
+            exclude=(self.directory, exclude_from) if exclude_from is not None else None,
+        )
+
+    @traced("memory.get_latest")
     def get_latest_memory(self, n: int) -> list[MemoryRecord]:
         """Get the n latest memory record."""
-        return self.get_all_memory()[-n:]
+        if n <= 0:
+            return []
+
+        # Requests larger than the cache go straight to the database
+        if n > self._tail_cache.maxlen:
+            return self._query_latest_memory(n)
+
+        # The cache holds either the latest `maxlen` records or the whole table when it is smaller than that
+        if not self._tail_loaded:
+            self._tail_cache.extend(self._query_latest_memory(self._tail_cache.maxlen))
+            self._tail_loaded = True
+
+        return list(self._tail_cache)[-n:]
     
+    @on_pixeltable_thread
     def reset_current_memory(self):
         logger.info("Resetting memory in current conversation")
-        pxt.drop_dir(self.directory, if_not_exists="ignore", force=True)
-        self._remove_directory_from_json()
\ No newline at end of file
+        self.flush()
+        with pixeltable_lock:
+            pxt.drop_dir(self.directory, if_not_exists="ignore", force=True)
+            remove_conversation(self.directory)
+
+        self._tail_cache.clear()
+        self._tail_loaded = False
+        self._latest_summary = None
+        self._summary_loaded = False
+        self.file_state.reset()
+
+
+class MemoryWriter:
+    """
+    Write-behind queue for memory records, run by the thread every Pixeltable call runs on.
+
+    Records are persisted in batches by a background thread so inserting a record never blocks
+    the event loop while the agent is streaming. Records stay visible through `pending_records`
+    until they have been written.
+
+    Pixeltable runs its queries on an event loop it creates on the first thread querying it, which
+    breaks once that loop is the application's one or is run from another thread. The writer thread
+    is the only one calling Pixeltable: the other threads hand their calls over with `call`, `run`
+    or `on_pixeltable_thread`, and each call or batch runs with `pixeltable_lock` held.
+    """
+    def __init__(self, flush_interval: float = 0.5):
+        self._flush_interval = flush_interval
+        self._pending: list[tuple[Memory, MemoryRecord]] = []
+        self._calls: deque[tuple[Future, Callable[[], Any]]] = deque()
+        self._condition = threading.Condition()
+        self._flush_requested = False
+        self._write_at = 0.0 # Time the queued records are written at if they are not flushed before
+
+        self._thread = threading.Thread(target=self._run, name="pixeltable", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, memory: Memory, memory_record: MemoryRecord):
+        with self._condition:
+            if not self._pending:
+                # Wait a little so records produced by the same turn are written in one batch
+                self._write_at = time.monotonic() + self._flush_interval
+            self._pending.append((memory, memory_record))
+            self._condition.notify_all()
+
+    def pending_records(self, directory: str) -> list[MemoryRecord]:
+        """Get the records of a conversation that have not been written yet."""
+        with self._condition:
+            return [record for memory, record in self._pending if memory.directory == directory]
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        """Queue a call to the Pixeltable thread, run in a copy of the current context like `asyncio.to_thread` does."""
+        future = Future()
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        with self._condition:
+            self._calls.append((future, call))
+            self._condition.notify_all()
+        return future
+
+    def call(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run a call on the Pixeltable thread and return its result, right away if already on it."""
+        if threading.current_thread() is self._thread:
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Await a call run on the Pixeltable thread, it is dropped if cancelled before it started."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    @traced("memory.flush")
+    def flush(self):
+        """Block until every queued record has been written."""
+        if threading.current_thread() is self._thread:
+            self._write_pending() # A call flushing the queue first, like a deletion
+            return
+
+        with self._condition:
+            if not self._pending:
+                return
+            self._flush_requested = True
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: not self._pending)
+
+    def _next_call(self) -> Optional[tuple[Future, Callable[[], Any]]]:
+        """Wait for a call to run, None once the queued records are due."""
+        with self._condition:
+            while True:
+                if self._pending and (self._flush_requested or time.monotonic() >= self._write_at):
+                    return None
+                if self._calls:
+                    return self._calls.popleft()
+                self._condition.wait(self._write_at - time.monotonic() if self._pending else None)
+
+    def _run(self):
+        while True:
+            call = self._next_call()
+            if call is None:
+                self._write_pending()
+                continue
+
+            future, fn = call
+            if not future.set_running_or_notify_cancel():
+                continue # Cancelled while it was queued
+            try:
+                with pixeltable_lock:
+                    result = fn()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def _write_pending(self):
+        with self._condition:
+            batch = list(self._pending)
+            self._flush_requested = False
+        if not batch:
+            return
+
+        # Dequeued in the same critical section, readers holding the lock see the records in the table or in the queue
+        with pixeltable_lock:
+            self._write(batch)
+            with self._condition:
+                del self._pending[:len(batch)]
+                self._condition.notify_all()
+
+    @traced("memory.write_batch")
+    def _write(self, batch: list[tuple[Memory, MemoryRecord]]):
+        # Group the records by conversation, keeping their order. They are written with the first Memory object
+        # of the group, the unwritten file contents of the others are shared through their conversation
+        groups: dict[str, tuple[Memory, list[MemoryRecord]]] = {}
+        for memory, record in batch:
+            groups.setdefault(memory.directory, (memory, []))[1].append(record)
+
+        for memory, records in groups.values():
+            try:
+                memory._write_records(records)
+            except Exception as e:
+                logger.error(f"Could not write {len(records)} record(s) to {memory.directory}: {e}")
+
+
+@lru_cache(maxsize=1)
+def get_memory_writer() -> MemoryWriter:
+    """Get the process-wide memory writer, it is flushed when the interpreter exits."""
+    writer = MemoryWriter()
+    atexit.register(writer.flush)
+    return writer
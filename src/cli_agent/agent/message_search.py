@@ -0,0 +1,203 @@
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+import pixeltable as pxt
+from pydantic import BaseModel
+from loguru import logger
+
+from cli_agent.config import get_settings
+from cli_agent.agent.registry import get_registry
+
+logger = logger.bind(name="Message Search")
+
+SEARCHED_ROLES = ["user", "assistant"]
+# Delimiters of the matched terms in the snippets, control characters that never occur in a message
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+RANKED_CANDIDATES = 1000 # Newest matching messages ranked by a search
+
+_TERM_PATTERN = re.compile(r"\w+")
+
+
+class SearchHit(BaseModel):
+    memory_id: str
+    role: str
+    snippet: str
+    timestamp: datetime
+    score: float
+
+
+def build_match_query(terms: str) -> str:
+    """
+    Turn free text into an FTS5 query matching the messages that contain every term.
+
+    Terms are quoted so FTS5 operators typed by the user are searched as words, and the last one is
+    matched as a prefix, so a partially typed word still finds results.
+    """
+    words = _TERM_PATTERN.findall(terms)
+    if not words:
+        return ""
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+class MessageSearchIndex:
+    """
+    Full-text index of the user and assistant messages of every conversation, in SQLite FTS5.
+
+    Messages are added by the memory writer as they are persisted, so the index stays up to date
+    without rescanning the memory tables. A new index is filled from the conversations of the registry,
+    and the registry check run when the CLI starts backfills or removes the conversations it repaired.
+    Searches only query SQLite.
+
+    Args:
+        path (Path): SQLite database file
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not self.path.exists()
+
+        # Written by the memory writer thread and searched from the CLI, the connection is shared behind a lock
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL") # The CLI, the daemon and batch runs can share the file
+        self._connection.execute("PRAGMA synchronous=NORMAL") # Rebuilt from the memory tables if lost
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                rowid INTEGER PRIMARY KEY, message_id TEXT UNIQUE, memory_id TEXT, role TEXT, content TEXT, timestamp TEXT
+            );
+            CREATE INDEX IF NOT EXISTS messages_memory_id ON messages (memory_id);
+            DROP TABLE IF EXISTS conversations; -- Kept by older versions, the registry lists the conversations
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                content, content='messages', content_rowid='rowid', tokenize='porter unicode61', prefix='2 3 4'
+            );
+            CREATE TRIGGER IF NOT EXISTS messages_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+            END;
+            """
+        )
+        self._lock = threading.Lock()
+
+        if is_new:
+            self.backfill(get_registry().list())
+
+    def backfill(self, memory_ids: Iterable[str]):
+        """Index the messages of saved conversations. Queries Pixeltable, called on the Pixeltable thread."""
+        count = 0
+        for memory_id in memory_ids:
+            try:
+                memory_table = pxt.get_table(f"{memory_id}.memory")
+            except Exception:
+                continue
+            records = memory_table.where(memory_table.role.isin(SEARCHED_ROLES)).select(
+                memory_table.message_id, memory_table.role, memory_table.content, memory_table.timestamp
+            ).collect()
+            self._insert(memory_id, list(records))
+            count += len(records)
+
+        if count:
+            logger.info(f"Indexed {count} message(s) for full-text search")
+
+    def add(self, memory_id: str, memory_records: list):
+        """Index the chat messages of a batch of persisted memory records."""
+        self._insert(memory_id, [
+            {
+                "message_id": record.message_id,
+                "role": record.role,
+                "content": record.content,
+                "timestamp": record.timestamp,
+            }
+            for record in memory_records if record.role in SEARCHED_ROLES
+        ])
+
+    def _insert(self, memory_id: str, rows: list[dict]):
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            # Messages already indexed, like the ones written while the index was being filled, are skipped
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO messages (message_id, memory_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                [(row["message_id"], memory_id, row["role"], row["content"], row["timestamp"].isoformat()) for row in rows],
+            )
+
+    def remove(self, memory_id: str):
+        """Remove the messages of a deleted conversation."""
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute("DELETE FROM messages WHERE memory_id = ?", (memory_id,))
+
+    def search(self, terms: str, limit: int, snippet_tokens: int = 16) -> list[SearchHit]:
+        """
+        Find the conversations whose messages best match the search terms.
+
+        Matches are ranked with BM25. When more than `RANKED_CANDIDATES` messages match, only the newest
+        ones are ranked so the search stays fast on large histories.
+
+        Args:
+            terms (str): Words the messages must all contain, the last one can be the beginning of a word
+            limit (int): Maximum number of conversations returned
+            snippet_tokens (int): Length of the snippets, in words
+
+        Returns:
+            Best matching message of each conversation, from the best to the worst match. The matched terms of
+            the snippets are enclosed in `HIGHLIGHT_START` and `HIGHLIGHT_END`.
+        """
+        match_query = build_match_query(terms)
+        if not match_query:
+            return []
+
+        with self._lock:
+            # Ranking is the costly part of a query matching most messages, only the newest matches are ranked.
+            # FTS5 filters on a rowid range without reading the matches outside of it
+            oldest_candidate = self._connection.execute(
+                "SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                (match_query, RANKED_CANDIDATES - 1),
+            ).fetchone()
+            matches = self._connection.execute(
+                "SELECT rowid, rank FROM messages_fts WHERE messages_fts MATCH ? AND rowid >= ? ORDER BY rank LIMIT ?",
+                (match_query, oldest_candidate[0] if oldest_candidate else 0, limit * 10), # Several hits per conversation
+            ).fetchall()
+            metadata = self._select_rows("SELECT rowid, memory_id, role, timestamp FROM messages", [rowid for rowid, _ in matches])
+
+            best_matches: dict[str, tuple[int, float]] = {}
+            for rowid, rank in matches:
+                best_matches.setdefault(metadata[rowid][0], (rowid, rank))
+            best_matches = dict(list(best_matches.items())[:limit])
+
+            # Snippets are only built for the returned messages
+            snippets = self._select_rows(
+                "SELECT rowid, snippet(messages_fts, 0, ?, ?, '…', ?) FROM messages_fts WHERE messages_fts MATCH ?",
+                [rowid for rowid, _ in best_matches.values()],
+                (HIGHLIGHT_START, HIGHLIGHT_END, snippet_tokens, match_query),
+            )
+
+        return [
+            SearchHit(memory_id=memory_id, role=metadata[rowid][1], snippet=snippets[rowid][0], timestamp=metadata[rowid][2], score=-rank)
+            for memory_id, (rowid, rank) in best_matches.items()
+        ]
+
+    def _select_rows(self, query: str, rowids: list[int], parameters: tuple = ()) -> dict[int, tuple]:
+        """Run a query on the rows of the given rowids, its first column being the rowid."""
+        condition = "AND" if "WHERE" in query else "WHERE"
+        placeholders = ", ".join("?" * len(rowids))
+        rows = self._connection.execute(f"{query} {condition} rowid IN ({placeholders})", (*parameters, *rowids))
+        return {row[0]: row[1:] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+@lru_cache(maxsize=1)
+def get_message_search_index() -> MessageSearchIndex:
+    """Get the process-wide full-text search index."""
+    return MessageSearchIndex(Path(get_settings().SEARCH_INDEX_PATH))
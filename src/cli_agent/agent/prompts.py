@@ -1 +1,12 @@
-INSTRUCTIONS="You are a helpful assistant."
\ No newline at end of file
+INSTRUCTIONS="You are a helpful assistant."
+
+SUMMARY_PROMPT="""You maintain a running summary of a conversation between a user and an AI assistant.
+Update the current summary with the new messages below. Keep the facts, decisions, names, files and open questions that may matter later, drop small talk, and write the result as concise bullet points.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
@@ -0,0 +1,204 @@
+import re
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import numpy as np
+import pixeltable as pxt
+from pydantic import BaseModel
+from loguru import logger
+
+from cli_agent.config import get_settings
+from cli_agent.agent.registry import get_registry
+
+logger = logger.bind(name="Semantic Recall")
+
+EMBEDDING_DIM = 512
+RECALLED_ROLES = ["user", "assistant"]
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a about an and are as at be but by can did do does for from had has have how i if in is it its me my no not "
+    "of on or our said say so that the their them then there these they this to us was we were what when where "
+    "which who why will with would you your".split()
+)
+
+
+def hash_embed(text: str) -> np.ndarray:
+    """
+    Embed a text by feature hashing its words and word pairs, a local embedding without any model to download.
+
+    Texts sharing rare words and phrases get close vectors, so the matches are lexical: a message about the
+    same topic in other words is not found. Set `EMBEDDING_MODEL` to a Sentence Transformers model for
+    semantic matches.
+
+    Args:
+        text (str): Text to embed
+
+    Returns:
+        L2-normalized vector of `EMBEDDING_DIM` dimensions
+    """
+    words = [word for word in _TOKEN_PATTERN.findall(text.lower()) if word not in _STOPWORDS]
+    features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for feature in features:
+        digest = zlib.crc32(feature.encode())
+        vector[digest % EMBEDDING_DIM] += 1.0 if digest & 0x80000000 else -1.0 # Signed, collisions cancel out on average
+
+    vector = np.sign(vector) * np.log1p(np.abs(vector)) # Repeated words don't dominate long messages
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+@pxt.udf
+def hashing_embedding(text: str) -> pxt.Array[(EMBEDDING_DIM,), pxt.Float]:
+    return hash_embed(text)
+
+
+def embedding_function(embedding_model: str) -> pxt.Function:
+    """Get the embedding UDF of a Sentence Transformers model id, or the local hashing embedding if empty."""
+    if not embedding_model:
+        return hashing_embedding
+
+    try:
+        import sentence_transformers # noqa: F401, only imported by Pixeltable when the first text is embedded
+    except ImportError as e:
+        raise ImportError(f"EMBEDDING_MODEL={embedding_model} needs sentence-transformers, install it with `uv sync --extra recall`") from e
+    from pixeltable.functions.huggingface import sentence_transformer
+    return sentence_transformer.using(model_id=embedding_model)
+
+
+def model_table_path(table_path: str, embedding_model: str) -> str:
+    """Get the path of the table indexed with an embedding model, each model has its own tables."""
+    if not embedding_model:
+        return table_path
+    return f"{table_path}_{re.sub(r'[^0-9a-zA-Z]+', '_', embedding_model).strip('_').lower()}"
+
+
+class RecalledMessage(BaseModel):
+    memory_id: str
+    role: str
+    content: str
+    timestamp: datetime
+    score: float
+
+
+class RecallIndex:
+    """
+    Embedding index over the messages of every conversation, for semantic recall.
+
+    Messages are added by the memory writer when they are persisted, Pixeltable computes their embedding
+    on insert, so the index is always up to date without any batch job. Each embedding model has its own
+    table, switching model builds a new index from the existing conversations.
+
+    Args:
+        embedding_model (str): Sentence Transformers model id, the local hashing embedding if empty
+        table_path (str): Pixeltable path of the table, derived from the embedding model if not provided
+    """
+    TABLE_PATH = "memory_recall"
+
+    def __init__(self, embedding_model: str = "", table_path: Optional[str] = None):
+        self.embedding_model = embedding_model
+        self.table_path = table_path or model_table_path(self.TABLE_PATH, embedding_model)
+
+        if self.table_path in pxt.list_tables():
+            self._table = pxt.get_table(self.table_path)
+        else:
+            self._table = self._setup_table()
+            self.backfill(get_registry().list())
+
+    def _setup_table(self):
+        table_schema = {
+            "memory_id": pxt.Required[pxt.String],
+            "message_id": pxt.String,
+            "role": pxt.String,
+            "content": pxt.String,
+            "timestamp": pxt.Timestamp,
+        }
+        table = pxt.create_table(self.table_path, schema=table_schema, if_exists="ignore")
+        table.add_embedding_index("content", embedding=embedding_function(self.embedding_model), if_exists="ignore")
+
+        logger.info("Semantic recall index setup successfully")
+        return table
+
+    def backfill(self, memory_ids: Iterable[str]):
+        """Index the messages of saved conversations, like the ones saved before the index existed."""
+        rows = []
+        for memory_id in memory_ids:
+            try:
+                memory_table = pxt.get_table(f"{memory_id}.memory")
+            except Exception:
+                continue
+            records = memory_table.where(memory_table.role.isin(RECALLED_ROLES)).select(
+                memory_table.message_id, memory_table.role, memory_table.content, memory_table.timestamp
+            ).collect()
+            rows += [{"memory_id": memory_id, **record} for record in records]
+
+        if rows:
+            self._table.insert(rows)
+            logger.info(f"Indexed {len(rows)} message(s) for semantic recall")
+
+    def add(self, memory_id: str, memory_records: list):
+        """Index the chat messages of a batch of persisted memory records."""
+        rows = [
+            {
+                "memory_id": memory_id,
+                "message_id": record.message_id,
+                "role": record.role,
+                "content": record.content,
+                "timestamp": record.timestamp,
+            }
+            for record in memory_records if record.role in RECALLED_ROLES and record.content.strip()
+        ]
+        if rows:
+            self._table.insert(rows)
+
+    def remove(self, memory_id: str):
+        """Remove the messages of a deleted conversation."""
+        self._table.delete(where=self._table.memory_id == memory_id)
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        min_score: float = 0.0,
+        memory_id: Optional[str] = None,
+        exclude: Optional[tuple[str, datetime]] = None,
+    ) -> list[RecalledMessage]:
+        """
+        Find the messages most similar to a query.
+
+        Args:
+            query (str): Text the messages are compared to, usually the new user message
+            k (int): Maximum number of messages returned
+            min_score (float): Minimum similarity of the returned messages
+            memory_id (str): Only search this conversation, every conversation if not provided
+            exclude (tuple[str, datetime]): Conversation and time from which its messages are skipped, like the ones already in the context window
+
+        Returns:
+            Messages from the most to the least similar
+        """
+        table = self._table
+        condition = None
+        if memory_id is not None:
+            condition = table.memory_id == memory_id
+        if exclude is not None:
+            excluded_memory_id, excluded_from = exclude
+            kept = (table.memory_id != excluded_memory_id) | (table.timestamp < excluded_from)
+            condition = kept if condition is None else condition & kept
+
+        similarity = table.content.similarity(query)
+        query_set = table.where(condition) if condition is not None else table
+        rows = query_set.order_by(similarity, asc=False).limit(k).select(
+            table.memory_id, table.role, table.content, table.timestamp, score=similarity
+        ).collect()
+
+        return [RecalledMessage(**row) for row in rows if row["score"] >= min_score]
+
+
+@lru_cache(maxsize=1)
+def get_recall_index() -> RecallIndex:
+    """Get the process-wide semantic recall index."""
+    return RecallIndex(get_settings().EMBEDDING_MODEL)
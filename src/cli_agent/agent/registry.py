@@ -0,0 +1,193 @@
+import json
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel
+from loguru import logger
+
+from cli_agent.config import get_settings
+
+logger = logger.bind(name="Conversation Registry")
+
+LEGACY_JSON_PATH = Path(".cache/conversation_history.json")
+
+
+class ConsistencyReport(BaseModel):
+    stale: list[str] = [] # Registered conversations without a Pixeltable directory
+    unregistered: list[str] = [] # Pixeltable directories missing from the registry
+
+    @property
+    def consistent(self) -> bool:
+        return not self.stale and not self.unregistered
+
+
+class ConversationRegistry:
+    """
+    Registry of the saved conversations in a SQLite database.
+
+    Each change is a single indexed statement in its own transaction, so concurrent CLI, daemon and batch
+    processes can register and remove conversations without losing each other's updates, and a crash
+    never leaves a half written registry. It replaces the `conversation_history.json` file, whose
+    conversations are imported once when the registry is created.
+
+    Args:
+        path (Path): SQLite database file
+        legacy_json_path (Path): JSON file of the older versions to import, skipped if it doesn't exist
+    """
+    def __init__(self, path: Path, legacy_json_path: Optional[Path] = LEGACY_JSON_PATH):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL") # Readers never wait for another process writing
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS conversations (memory_id TEXT PRIMARY KEY, registered_at REAL);
+            CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+        self._lock = threading.Lock()
+
+        if legacy_json_path is not None:
+            self._migrate_json(legacy_json_path)
+
+    def _migrate_json(self, json_path: Path):
+        """Import the conversations of the JSON file once, then keep the file as a backup."""
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE") # Only one process imports the file
+            if self._connection.execute("SELECT 1 FROM metadata WHERE key = 'json_migrated'").fetchone():
+                return
+
+            memory_ids = []
+            if json_path.exists():
+                try:
+                    with open(json_path, "r") as f:
+                        memory_ids = json.load(f).get("memory_tables", [])
+                except (json.JSONDecodeError, IOError) as e:
+                    logger.error(f"Could not read {json_path}, its conversations are recovered by the consistency check: {e}")
+
+            now = time.time()
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO conversations VALUES (?, ?)", [(memory_id, now) for memory_id in memory_ids]
+            )
+            self._connection.execute("INSERT INTO metadata VALUES ('json_migrated', ?)", (str(json_path),))
+
+        if json_path.exists():
+            json_path.replace(json_path.with_name(f"{json_path.name}.migrated"))
+            logger.info(f"Imported {len(memory_ids)} conversation(s) from {json_path}")
+
+    def register(self, memory_id: str) -> bool:
+        """
+        Add a conversation to the registry.
+
+        Returns:
+            Whether the conversation was not registered yet
+        """
+        with self._lock:
+            cursor = self._connection.execute("INSERT OR IGNORE INTO conversations VALUES (?, ?)", (memory_id, time.time()))
+        return cursor.rowcount > 0
+
+    def remove(self, memory_id: str) -> bool:
+        """
+        Remove a conversation from the registry.
+
+        Returns:
+            Whether the conversation was registered
+        """
+        with self._lock:
+            cursor = self._connection.execute("DELETE FROM conversations WHERE memory_id = ?", (memory_id,))
+        return cursor.rowcount > 0
+
+    def contains(self, memory_id: str) -> bool:
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM conversations WHERE memory_id = ?", (memory_id,)).fetchone() is not None
+
+    def list(self) -> list[str]:
+        """List the registered conversations, the oldest first."""
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT memory_id FROM conversations ORDER BY registered_at, memory_id")]
+
+    def check_consistency(self, directories: Optional[set[str]] = None, repair: bool = True) -> ConsistencyReport:
+        """
+        Compare the registry with the Pixeltable directories.
+
+        Args:
+            directories (set[str]): Pixeltable directories listed after this call, with `pxt.list_dirs()` on the Pixeltable thread if not provided
+            repair (bool): Remove the stale conversations and register the missing ones
+
+        Returns:
+            The conversations that differed, before the repair
+        """
+        # Read before the directories are listed: a conversation is registered once its directory exists,
+        # so one registered by another process in between is never taken for a stale one
+        registered = set(self.list())
+        if directories is None:
+            import pixeltable as pxt
+            directories = set(pxt.list_dirs())
+
+        report = ConsistencyReport(stale=sorted(registered - directories), unregistered=sorted(directories - registered))
+        if repair and not report.consistent:
+            now = time.time()
+            with self._lock, self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+                self._connection.executemany("DELETE FROM conversations WHERE memory_id = ?", [(memory_id,) for memory_id in report.stale])
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO conversations VALUES (?, ?)", [(memory_id, now) for memory_id in report.unregistered]
+                )
+            logger.warning(
+                f"Repaired the conversation registry: {len(report.stale)} stale, {len(report.unregistered)} unregistered conversation(s)"
+            )
+        return report
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+@lru_cache(maxsize=1)
+def get_registry() -> ConversationRegistry:
+    """Get the process-wide conversation registry."""
+    return ConversationRegistry(Path(get_settings().REGISTRY_PATH))
+
+
+def _conversation_views() -> list:
+    """The stores keeping data per registered conversation: the catalog, the full-text index and the recall index."""
+    from cli_agent.agent.catalog import get_catalog
+    from cli_agent.agent.message_search import get_message_search_index
+
+    views = [get_catalog(), get_message_search_index()]
+    if get_settings().RECALL_TOP_K > 0:
+        from cli_agent.agent.recall import get_recall_index
+        views.append(get_recall_index())
+    return views
+
+
+def reconcile_conversations() -> ConsistencyReport:
+    """
+    Check the registry against the Pixeltable directories, then backfill the conversations it registered into
+    the catalog and the indexes and drop the ones it removed. The registry is the only list of the saved
+    conversations, the other stores never list the directories. Called on the Pixeltable thread.
+
+    Returns:
+        The conversations that differed, before the repair
+    """
+    views = _conversation_views() # A new store is filled from the registry before its repair, then follows it
+    report = get_registry().check_consistency()
+    for memory_id in report.stale:
+        for view in views:
+            view.remove(memory_id)
+    if report.unregistered:
+        for view in views:
+            view.backfill(report.unregistered)
+    return report
+
+
+def remove_conversation(memory_id: str):
+    """Remove a deleted conversation from the catalog, the indexes and the registry. Called on the Pixeltable thread."""
+    for view in _conversation_views():
+        view.remove(memory_id)
+    get_registry().remove(memory_id)
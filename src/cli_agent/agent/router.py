@@ -0,0 +1,307 @@
+import re
+import threading
+import time
+from collections import deque
+from contextlib import aclosing
+from functools import lru_cache
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from pydantic import BaseModel
+from loguru import logger
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from cli_agent.config import get_settings
+from cli_agent.agent.tokens import count_tokens
+from cli_agent.tracing import STAGE_HISTORY_SIZE, get_tracer
+
+logger = logger.bind(name="Model Router")
+
+# Words of a request that usually needs tools: searching, reading or writing files, planning
+_TOOL_HINTS = re.compile(
+    r"\b(search|find|look up|research|latest|news|today|current|compare|report|write|file|read|edit|create|"
+    r"save|list|plan|todo|steps|investigate|analy[sz]e|summari[sz]e|sources?)\b|https?://",
+    re.IGNORECASE,
+)
+# Openings of an answer the model is not confident about
+_HEDGES = re.compile(
+    r"^\W*(i'?m not sure|i am not sure|i don'?t know|i do not know|i can'?t|i cannot|i'?m unable|i am unable|"
+    r"sorry, (i|but)|as an ai)",
+    re.IGNORECASE,
+)
+# The tiers are called without the callbacks of the graph run: their rejected tokens must not be streamed,
+# and the router's own run already reports the output and tokens of the accepted call
+TIER_CONFIG = {"callbacks": []}
+
+
+class RouteFeatures(BaseModel):
+    """Cheap features of a model request, computed without calling a model."""
+    prompt_tokens: int # Tokens of the latest user message
+    depth: int # Model calls already made since the latest user message, the steps of the tool loop
+    tool_likelihood: float # From 0 (chit-chat) to 1 (the request names tools, or a tool result is waiting)
+
+    def complexity(self, long_prompt_tokens: int, deep_steps: int) -> float:
+        """Weighted score from 0 to 1, the tier of a request is picked from it."""
+        return (
+            0.3 * min(self.prompt_tokens / long_prompt_tokens, 1.0)
+            + 0.5 * self.tool_likelihood
+            + 0.2 * min(self.depth / deep_steps, 1.0)
+        )
+
+
+def extract_features(messages: Sequence[BaseMessage]) -> RouteFeatures:
+    """Compute the routing features of the messages sent to the model."""
+    last_user = next((i for i in range(len(messages) - 1, -1, -1) if isinstance(messages[i], HumanMessage)), None)
+    prompt = messages[last_user].text() if last_user is not None else ""
+    after_prompt = messages[last_user + 1:] if last_user is not None else messages
+
+    if after_prompt and isinstance(after_prompt[-1], ToolMessage):
+        tool_likelihood = 1.0 # Mid tool loop, the next step reads tool results and often calls more tools
+    else:
+        tool_likelihood = min(len(_TOOL_HINTS.findall(prompt)) / 2, 1.0)
+
+    return RouteFeatures(
+        prompt_tokens=count_tokens(prompt),
+        depth=sum(isinstance(message, AIMessage) for message in after_prompt),
+        tool_likelihood=tool_likelihood,
+    )
+
+
+class TierStats(BaseModel):
+    calls: int = 0
+    escalations: int = 0 # Calls whose output was rejected and retried on the next tier
+    errors: int = 0 # Calls that raised, escalated if a tier was left
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class RouterMetrics:
+    """Calls, escalations, tokens and latency of each tier, shared by the tool-bound copies of a router."""
+    def __init__(self, tier_names: list[str]):
+        self.tiers = {name: TierStats() for name in tier_names}
+        self._latencies = {name: deque(maxlen=STAGE_HISTORY_SIZE) for name in tier_names}
+        self._lock = threading.Lock()
+
+    def record(self, tier_name: str, latency: float, message: Optional[BaseMessage] = None, escalated: bool = False, error: bool = False):
+        usage = getattr(message, "usage_metadata", None) or {}
+        with self._lock:
+            stats = self.tiers[tier_name]
+            stats.calls += 1
+            stats.escalations += escalated
+            stats.errors += error
+            stats.input_tokens += usage.get("input_tokens", 0)
+            stats.output_tokens += usage.get("output_tokens", 0)
+            self._latencies[tier_name].append(latency)
+        get_tracer().observe(f"llm.tier.{tier_name}", latency)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Get the counters of every tier, with the p50 and p95 latency in milliseconds."""
+        with self._lock:
+            stats = {}
+            for name, tier_stats in self.tiers.items():
+                latencies = sorted(self._latencies[name])
+                stats[name] = {
+                    **tier_stats.model_dump(),
+                    "p50": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+                    "p95": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000 if latencies else 0.0,
+                }
+        return stats
+
+
+class ModelRouter(BaseChatModel):
+    """
+    Chat model sending each request to one of several models, from the cheapest and fastest to the most capable.
+
+    The first tier tried is picked from the features of the request: a short message with no sign of tool
+    use goes to the cheapest model, a research request or a deep tool loop to the stronger ones. An
+    output is escalated to the next tier when the model failed, called a tool that doesn't exist, returned
+    nothing, or opened its answer by hedging. When streaming, the first `holdback_chars` characters of a
+    tier that can still escalate are held until they are checked, so rejected tokens never reach the user.
+
+    Args:
+        tiers (list): Chat models, the cheapest first
+        tier_names (list[str]): Names of the tiers in the metrics
+        long_prompt_tokens (int): Prompt length counted as the most complex
+        deep_steps (int): Tool loop depth counted as the most complex
+        holdback_chars (int): Streamed characters checked before they are released
+    """
+    tiers: list[Runnable]
+    tier_names: list[str]
+    tool_names: Optional[set[str]] = None # Tools bound to the tiers, None until `bind_tools`
+    long_prompt_tokens: int = 400
+    deep_steps: int = 4
+    holdback_chars: int = 80
+    metrics: Optional[RouterMetrics] = None
+
+    def model_post_init(self, __context: Any):
+        if len(self.tiers) != len(self.tier_names):
+            raise ValueError("Every tier needs a name")
+        if self.metrics is None:
+            self.metrics = RouterMetrics(self.tier_names)
+
+    @property
+    def _llm_type(self) -> str:
+        return "router"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"tiers": self.tier_names} # Part of the response cache keys
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ModelRouter":
+        """Bind the tools to every tier, the copies share the metrics."""
+        return self.model_copy(update={
+            "tiers": [tier.bind_tools(tools, **kwargs) for tier in self.tiers],
+            "tool_names": {convert_to_openai_tool(tool)["function"]["name"] for tool in tools},
+        })
+
+    def select_tier(self, messages: Sequence[BaseMessage]) -> int:
+        """Index of the first tier to try for the messages."""
+        features = extract_features(messages)
+        complexity = features.complexity(self.long_prompt_tokens, self.deep_steps)
+        return min(int(complexity * len(self.tiers)), len(self.tiers) - 1)
+
+    def check_output(self, message: AIMessage, final: bool = True) -> Optional[str]:
+        """
+        Get the reason to escalate an output, None if it is accepted.
+
+        Args:
+            message (AIMessage): Output of a tier, or the beginning of it
+            final (bool): The message is complete, otherwise only its text so far is checked
+        """
+        if _HEDGES.match(message.text()):
+            return "low_confidence"
+        if not final:
+            return None
+        if message.invalid_tool_calls:
+            return "invalid_tool_call"
+        if self.tool_names is not None and any(call["name"] not in self.tool_names for call in message.tool_calls):
+            return "unknown_tool"
+        if not message.text().strip() and not message.tool_calls:
+            return "empty"
+        return None
+
+    def _escalate(self, tier: int, reason: Optional[str], error: Optional[BaseException] = None) -> bool:
+        """Tell if an output rejected for `reason` (None if accepted) is retried on the next tier."""
+        if reason is None or tier == len(self.tiers) - 1:
+            return False
+        details = f": {error}" if error is not None else ""
+        logger.debug(f"Escalating from {self.tier_names[tier]} to {self.tier_names[tier + 1]} ({reason}{details})")
+        return True
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        tier = self.select_tier(messages)
+        while True:
+            start = time.perf_counter()
+            try:
+                message = self.tiers[tier].invoke(messages, TIER_CONFIG, stop=stop, **kwargs)
+            except Exception as e:
+                escalate = self._escalate(tier, "error", e)
+                self.metrics.record(self.tier_names[tier], time.perf_counter() - start, escalated=escalate, error=True)
+                if not escalate:
+                    raise
+                tier += 1
+                continue
+
+            escalate = self._escalate(tier, self.check_output(message))
+            self.metrics.record(self.tier_names[tier], time.perf_counter() - start, message, escalated=escalate)
+            if not escalate:
+                return self._result(tier, message)
+            tier += 1
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        tier = self.select_tier(messages)
+        while True:
+            start = time.perf_counter()
+            try:
+                message = await self.tiers[tier].ainvoke(messages, TIER_CONFIG, stop=stop, **kwargs)
+            except Exception as e:
+                escalate = self._escalate(tier, "error", e)
+                self.metrics.record(self.tier_names[tier], time.perf_counter() - start, escalated=escalate, error=True)
+                if not escalate:
+                    raise
+                tier += 1
+                continue
+
+            escalate = self._escalate(tier, self.check_output(message))
+            self.metrics.record(self.tier_names[tier], time.perf_counter() - start, message, escalated=escalate)
+            if not escalate:
+                return self._result(tier, message)
+            tier += 1
+
+    def _result(self, tier: int, message: AIMessage) -> ChatResult:
+        message.response_metadata["model_tier"] = self.tier_names[tier]
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tier = self.select_tier(messages)
+        while True:
+            can_escalate = tier < len(self.tiers) - 1
+            start = time.perf_counter()
+            held: list[AIMessageChunk] = [] # Chunks not released yet
+            message = AIMessageChunk(content="") # Everything streamed by the tier so far
+            released = False
+            reason = None
+            try:
+                # Closed right away when the output is rejected midway, the tier stops generating
+                async with aclosing(self.tiers[tier].astream(messages, TIER_CONFIG, stop=stop, **kwargs)) as stream:
+                    async for chunk in stream:
+                        message += chunk
+                        if released:
+                            yield ChatGenerationChunk(message=chunk)
+                            continue
+
+                        held.append(chunk)
+                        # Tool calls are never shown, they are checked once complete
+                        if message.tool_call_chunks or (can_escalate and len(message.text()) < self.holdback_chars):
+                            continue
+                        reason = self.check_output(message, final=False) if can_escalate else None
+                        if reason is not None:
+                            break
+                        released = True
+                        for held_chunk in held:
+                            yield ChatGenerationChunk(message=held_chunk)
+                        held = []
+            except Exception as e:
+                escalate = not released and self._escalate(tier, "error", e)
+                self.metrics.record(self.tier_names[tier], time.perf_counter() - start, escalated=escalate, error=True)
+                if not escalate:
+                    raise
+                tier += 1
+                continue
+
+            if reason is None and not released:
+                reason = self.check_output(message)
+            escalate = not released and self._escalate(tier, reason)
+            self.metrics.record(self.tier_names[tier], time.perf_counter() - start, message, escalated=escalate)
+            if escalate:
+                tier += 1
+                continue
+
+            # The output is final: release the held chunks, the last one tells which tier answered
+            held.append(AIMessageChunk(content="", response_metadata={"model_tier": self.tier_names[tier]}))
+            for held_chunk in held:
+                yield ChatGenerationChunk(message=held_chunk)
+            return
+
+
+@lru_cache(maxsize=None)
+def get_model_router(model_names: tuple[str, ...]) -> ModelRouter:
+    """
+    Get the router of the given models, the cheapest first, shared by every agent.
+
+    Args:
+        model_names (tuple[str, ...]): `init_chat_model` names of the tiers
+    """
+    from langchain.chat_models import init_chat_model
+
+    settings = get_settings()
+    return ModelRouter(
+        tiers=[init_chat_model(model_name) for model_name in model_names],
+        tier_names=list(model_names),
+        long_prompt_tokens=settings.ROUTER_LONG_PROMPT_TOKENS,
+        deep_steps=settings.ROUTER_DEEP_STEPS,
+        holdback_chars=settings.ROUTER_HOLDBACK_CHARS,
+    )
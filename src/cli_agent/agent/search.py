@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+from loguru import logger
+
+from cli_agent.config import get_settings
+
+logger = logger.bind(name="Search Cache")
+
+SearchBackend = Callable[..., Awaitable[dict[str, Any]]]
+
+
+class SearchCache:
+    """
+    Search results cache with TTL and LRU eviction, kept in memory and persisted to a JSON file.
+
+    Args:
+        ttl (float): Seconds a result stays valid
+        max_entries (int): Number of results kept, the least recently used ones are evicted first
+        path (Path): JSON file the cache is loaded from and saved to, memory only if not provided
+    """
+    def __init__(self, ttl: float, max_entries: int, path: Optional[Path] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict() # Key: (expiry time, result)
+        self._write_lock = threading.Lock() # Saves run on worker threads and share the temporary file
+
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, result = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: dict):
+        self._entries[key] = (time.time() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Could not read search cache {self.path}: {e}")
+            return
+
+        now = time.time()
+        for key, (expires_at, result) in data.items():
+            if expires_at > now:
+                self._entries[key] = (expires_at, result)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def snapshot(self) -> dict[str, tuple[float, dict]]:
+        return dict(self._entries)
+
+    def save(self, data: Optional[dict[str, tuple[float, dict]]] = None):
+        """Write the cache, or a snapshot of it, to disk. The file is replaced atomically so a crash never leaves it half written."""
+        if self.path is None:
+            return
+
+        data = data if data is not None else self.snapshot()
+        try:
+            self.path.parent.mkdir(exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with self._write_lock:
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+        except IOError as e:
+            logger.error(f"Could not write search cache {self.path}: {e}")
+
+
+class CachedSearch:
+    """
+    Cache search results and coalesce identical requests that are already in flight.
+
+    Each backend call runs in a task owned by the cache, so a caller cancelled while waiting for it neither
+    cancels the other callers nor loses the result. The cache is saved to disk in the background, at most
+    once every `save_delay` seconds.
+    """
+    def __init__(self, backend: SearchBackend, cache: SearchCache, save_delay: float = 1.0):
+        self.backend = backend
+        self.cache = cache
+        self.save_delay = save_delay
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._save_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def cache_key(query: str, max_results: int, topic: str, include_raw_content: bool) -> str:
+        normalized_query = " ".join(query.split()).casefold()
+        return json.dumps([normalized_query, topic, max_results, include_raw_content])
+
+    async def search(
+        self,
+        query: str,
+        max_results: int = 5,
+        topic: str = "general",
+        include_raw_content: bool = False,
+    ) -> dict:
+        key = self.cache_key(query, max_results, topic, include_raw_content)
+
+        result = self.cache.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch(key, query, max_results, topic, include_raw_content))
+            task.add_done_callback(lambda task: task.cancelled() or task.exception()) # Retrieved even if every caller left
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, query: str, max_results: int, topic: str, include_raw_content: bool) -> dict:
+        try:
+            result = await self.backend(
+                query,
+                max_results=max_results,
+                topic=topic,
+                include_raw_content=include_raw_content,
+            )
+        finally:
+            del self._inflight[key]
+
+        self.cache.put(key, result)
+        if self._save_task is None and self.cache.path is not None:
+            self._save_task = asyncio.create_task(self._save_later())
+        return result
+
+    async def _save_later(self):
+        await asyncio.sleep(self.save_delay)
+        self._save_task = None # Results cached from now on schedule the next save
+        # Snapshot on the event loop, the file is written on a worker thread
+        await asyncio.to_thread(self.cache.save, self.cache.snapshot())
+
+    async def flush(self):
+        """Save the results cached since the last save now instead of after the delay."""
+        if self._save_task is None:
+            return
+        self._save_task.cancel()
+        self._save_task = None
+        await asyncio.to_thread(self.cache.save, self.cache.snapshot())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self.cache),
+        }
+
+
+class TavilySearchBackend:
+    """Tavily search API client sharing one HTTP connection pool across all requests."""
+    def __init__(self, api_key: str, base_url: str = "https://api.tavily.com", timeout: float = 60):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=timeout,
+        )
+
+    async def __call__(self, query: str, max_results: int, topic: str, include_raw_content: bool) -> dict:
+        response = await self._client.post(
+            "/search",
+            json={
+                "query": query,
+                "max_results": max_results,
+                "topic": topic,
+                "include_raw_content": include_raw_content,
+            },
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+@lru_cache(maxsize=1)
+def get_search() -> CachedSearch:
+    """Get the process-wide cached web search."""
+    settings = get_settings()
+    return CachedSearch(
+        backend=TavilySearchBackend(api_key=settings.TAVILY_API_KEY),
+        cache=SearchCache(
+            ttl=settings.SEARCH_CACHE_TTL,
+            max_entries=settings.SEARCH_CACHE_SIZE,
+            path=Path(".cache") / "search_cache.json",
+        ),
+    )
+
+
+async def close_search():
+    """Save the search cache if the search was used in this process."""
+    if get_search.cache_info().currsize:
+        await get_search().flush()
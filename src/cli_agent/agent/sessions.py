@@ -0,0 +1,172 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+
+from cli_agent.config import get_settings
+from cli_agent.agent.main_agent import Agent
+from cli_agent.agent.memory import Memory, get_memory_writer, to_pixeltable_thread
+from cli_agent.agent.registry import get_registry
+from cli_agent.agent.prompts import INSTRUCTIONS
+from cli_agent.agent.tools import TOOLS
+
+logger = logger.bind(name="Session Manager")
+settings = get_settings()
+
+
+async def create_agent(memory: Optional[Memory] = None) -> Agent:
+    """
+    Setup an agent off the event loop where it blocks, so the other conversations keep streaming.
+
+    Every agent shares the compiled graph, the model clients, the search HTTP pool and the MCP
+    session pool, only its Memory and files state are its own.
+
+    Args:
+        memory (Memory): Memory of the conversation to resume, a new conversation is created otherwise
+    """
+    if memory is None:
+        memory = await to_pixeltable_thread(Memory, str(uuid.uuid4()))
+
+    agent = Agent(
+        model_name=settings.MODEL,
+        tools=TOOLS,
+        system_prompt=INSTRUCTIONS,
+        mcp_servers_config=settings.MCP_CONFIG,
+        memory=memory,
+    )
+    await agent.setup()
+    return agent
+
+
+class Session:
+    """One conversation driven by the session manager."""
+    def __init__(self, agent: Agent):
+        self.agent = agent
+        self.turn_lock = asyncio.Lock()
+        self.queued_turns = 0 # Turns running or waiting for their turn
+        self.clients = 0 # Clients attached to the conversation
+
+    @property
+    def memory_id(self) -> str:
+        return self.agent.memory.directory
+
+    @property
+    def idle(self) -> bool:
+        """No client is attached and no turn is queued, the session can be unloaded."""
+        return self.queued_turns == 0 and self.clients == 0
+
+
+class SessionManager:
+    """
+    Drive many conversations concurrently on one event loop.
+
+    The turns of one session run one at a time, in order. At most `max_concurrent_turns` turns run at
+    once across all sessions, and since a session only has one turn waiting for a slot at a time, the
+    slots go to the sessions in turn instead of to the one that sent the most messages. Sessions stay
+    loaded while a client is attached to them, so every client of a conversation shares its turn order,
+    and idle sessions are unloaded, least recently active first, when more than `max_sessions` are loaded.
+
+    Args:
+        max_concurrent_turns (int): Number of turns running at the same time across sessions
+        max_queued_turns (int): Number of turns a session can queue before new ones are rejected
+        max_sessions (int): Number of sessions kept loaded
+    """
+    def __init__(
+        self,
+        max_concurrent_turns: int = settings.SESSION_MAX_CONCURRENT_TURNS,
+        max_queued_turns: int = settings.SESSION_MAX_QUEUED_TURNS,
+        max_sessions: int = settings.SESSION_MAX_LOADED,
+    ):
+        self.max_queued_turns = max_queued_turns
+        self.max_sessions = max_sessions
+
+        self.sessions: OrderedDict[str, Session] = OrderedDict() # Least recently active first
+        self._turn_slots = asyncio.Semaphore(max_concurrent_turns)
+        self._spare_agent: Optional[Agent] = None
+        self._loading: dict[str, asyncio.Task] = {} # Conversations being resumed, shared by the clients attaching meanwhile
+
+    async def prepare(self):
+        """Compile the graph and create a new conversation ahead of time, the next new session starts instantly."""
+        if self._spare_agent is None:
+            self._spare_agent = await create_agent()
+
+    async def open_session(self, memory_id: Optional[str] = None) -> Session:
+        """
+        Attach a client to the session of a conversation, loading it if needed.
+
+        The session stays loaded until each client that opened it called `close_session`.
+
+        Args:
+            memory_id (str): Conversation to resume, a new conversation is created if not provided
+
+        Raises:
+            ValueError: If the conversation does not exist
+        """
+        if memory_id in self.sessions:
+            session = self.sessions[memory_id]
+        elif memory_id is None:
+            agent, self._spare_agent = self._spare_agent, None
+            if agent is None:
+                agent = await create_agent()
+            session = self.sessions[agent.memory.directory] = Session(agent)
+        else:
+            loading = self._loading.get(memory_id)
+            if loading is None:
+                loading = self._loading[memory_id] = asyncio.create_task(self._resume_session(memory_id))
+                loading.add_done_callback(lambda _: self._loading.pop(memory_id, None))
+            session = await asyncio.shield(loading) # Loaded for the other clients even if this one leaves
+
+        session.clients += 1
+        self.sessions.move_to_end(session.memory_id)
+        self._unload_idle_sessions()
+        return session
+
+    def close_session(self, session: Session):
+        """Detach a client from a session opened with `open_session`."""
+        session.clients -= 1
+        self._unload_idle_sessions()
+
+    async def _resume_session(self, memory_id: str) -> Session:
+        if not get_registry().contains(memory_id):
+            raise ValueError(f"Conversation {memory_id} does not exist")
+        agent = await create_agent(await to_pixeltable_thread(Memory, memory_id))
+        session = self.sessions.setdefault(agent.memory.directory, Session(agent))
+        return session
+
+    def _unload_idle_sessions(self):
+        idle = [memory_id for memory_id, session in self.sessions.items() if session.idle]
+        for memory_id in idle[:max(0, len(self.sessions) - self.max_sessions)]:
+            del self.sessions[memory_id] # Queued records keep a reference to the Memory until they are written
+            logger.info(f"Unloaded idle session {memory_id}")
+
+    async def chat(self, session: Session, user_message: str, stream_tokens: bool = False) -> AsyncIterator[dict]:
+        """
+        Run a turn of a session, see `Agent.chat`.
+
+        Raises:
+            RuntimeError: If the session already has `max_queued_turns` turns queued
+        """
+        if session.queued_turns >= self.max_queued_turns:
+            raise RuntimeError(f"Conversation {session.memory_id} already has {session.queued_turns} messages queued")
+
+        session.queued_turns += 1
+        try:
+            async with session.turn_lock, self._turn_slots:
+                if session.memory_id in self.sessions:
+                    self.sessions.move_to_end(session.memory_id)
+
+                async for chunk in session.agent.chat(user_message, stream_tokens=stream_tokens):
+                    yield chunk
+        finally:
+            session.queued_turns -= 1
+            self._unload_idle_sessions() # Its clients may have left during the turn
+
+    async def close(self):
+        """Wait for the background summaries, write the queued records of every session and delete the unused new conversation."""
+        await asyncio.gather(*(session.agent.wait_for_summary() for session in self.sessions.values()), return_exceptions=True)
+        await asyncio.to_thread(get_memory_writer().flush)
+        if self._spare_agent is not None:
+            await to_pixeltable_thread(self._spare_agent.reset_memory)
+            self._spare_agent = None
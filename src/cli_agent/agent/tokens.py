@@ -0,0 +1,25 @@
+from functools import lru_cache
+
+from loguru import logger
+
+logger = logger.bind(name="Token Counting")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the tokenizer once. tiktoken downloads it on first use, so it can be unavailable offline."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Could not load the tokenizer, token counts will be estimated: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of a text, or estimate them at 4 characters per token without the tokenizer."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
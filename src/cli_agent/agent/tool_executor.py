@@ -0,0 +1,152 @@
+import asyncio
+import contextvars
+import functools
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Optional, Sequence, Union
+
+from loguru import logger
+from langchain_core.tools import BaseTool, StructuredTool, ToolException, tool as as_tool
+
+from cli_agent.config import get_settings
+
+logger = logger.bind(name="Tool Executor")
+
+
+class ToolExecutor:
+    """
+    Execution layer of the agent tools.
+
+    Synchronous tools run in a bounded thread pool instead of the default executor, so they never block
+    the event loop and can't take every thread of the process. The calls of each tool are limited to
+    a number of concurrent calls and time out, a timed out call is returned to the model as a tool error.
+
+    Args:
+        max_workers (int): Threads running the synchronous tools
+        max_concurrency (int): Concurrent calls of each tool
+        timeout (float): Seconds before a call is abandoned
+        concurrency_limits (dict[str, int]): Concurrent calls of specific tools, by tool name
+        timeouts (dict[str, float]): Timeouts of specific tools, by tool name
+    """
+    def __init__(
+        self,
+        max_workers: int,
+        max_concurrency: int,
+        timeout: float,
+        concurrency_limits: Optional[dict[str, int]] = None,
+        timeouts: Optional[dict[str, float]] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.concurrency_limits = concurrency_limits or {}
+        self.timeouts = timeouts or {}
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
+        # Semaphores are bound to the event loop they are first used in, one set per loop
+        self._semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]] = weakref.WeakKeyDictionary()
+
+    def _semaphore(self, tool_name: str) -> asyncio.Semaphore:
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        if tool_name not in semaphores:
+            semaphores[tool_name] = asyncio.Semaphore(self.concurrency_limits.get(tool_name, self.max_concurrency))
+        return semaphores[tool_name]
+
+    def wrap(self, tool: Union[BaseTool, Callable, dict[str, Any]]) -> Union[BaseTool, dict[str, Any]]:
+        """
+        Get a copy of the tool running through the executor.
+
+        Args:
+            tool (BaseTool | Callable | dict): Tool as accepted by the agent, provider tool schemas are returned as is
+
+        Returns:
+            The wrapped tool
+        """
+        if isinstance(tool, dict):
+            return tool
+        if not isinstance(tool, BaseTool):
+            tool = as_tool(tool)
+        if not isinstance(tool, StructuredTool):
+            logger.warning(f"Tool {tool.name} is not a structured tool, it runs without limits")
+            return tool
+
+        name = tool.name
+        timeout = self.timeouts.get(name, self.timeout)
+        target = tool.coroutine or tool.func
+
+        @functools.wraps(target) # Keeps the signature, so injected arguments like the callbacks are still passed
+        async def run(*args, **kwargs):
+            async with self._semaphore(name):
+                if tool.coroutine is not None:
+                    call = tool.coroutine(*args, **kwargs)
+                else:
+                    # The thread runs in a copy of the context so the tracing spans nest under the tool call
+                    context = contextvars.copy_context()
+                    call = asyncio.get_running_loop().run_in_executor(
+                        self._pool, functools.partial(context.run, tool.func, *args, **kwargs)
+                    )
+                try:
+                    return await asyncio.wait_for(call, timeout)
+                except asyncio.TimeoutError:
+                    # A thread can't be interrupted, its result is discarded when it finishes
+                    raise ToolException(f"Tool {name} timed out after {timeout:g}s")
+
+        return tool.model_copy(update={"coroutine": run, "handle_tool_error": tool.handle_tool_error or True})
+
+    def wrap_tools(self, tools: Sequence[Union[BaseTool, Callable, dict[str, Any]]]) -> list:
+        return [self.wrap(tool) for tool in tools]
+
+
+class OrderedToolUpdates:
+    """
+    Reorder the tool updates of a model step into the order of its tool calls.
+
+    The tool calls of a step run concurrently and their updates are streamed as they finish. An update
+    is released once the updates of every call before it are released, so the output is deterministic
+    while the results of the first calls are still shown without waiting for the slowest call.
+    """
+    def __init__(self):
+        self._expected: deque[str] = deque()
+        self._pending: dict[str, dict] = {}
+
+    def expect(self, tool_calls: list[dict]):
+        """Register the tool calls of a model step."""
+        self._expected.extend(tool_call["id"] for tool_call in tool_calls if tool_call.get("id"))
+
+    def add(self, update: dict) -> list[dict]:
+        """
+        Add the update of a finished tool call.
+
+        Returns:
+            The updates that can be streamed, in tool calls order
+        """
+        messages = update["tools"].get("messages") or []
+        tool_call_id = getattr(messages[0], "tool_call_id", None) if messages else None
+        if tool_call_id not in self._expected:
+            return [update] # Not a call of the step, like a tool answering without message
+
+        self._pending[tool_call_id] = update
+        released = []
+        while self._expected and self._expected[0] in self._pending:
+            released.append(self._pending.pop(self._expected.popleft()))
+        return released
+
+    def flush(self) -> list[dict]:
+        """Release the remaining updates, in tool calls order, when the step ends without some of them."""
+        released = [self._pending.pop(tool_call_id) for tool_call_id in self._expected if tool_call_id in self._pending]
+        self._expected.clear()
+        return released
+
+
+@lru_cache(maxsize=1)
+def get_tool_executor() -> ToolExecutor:
+    """Get the tool executor shared by every agent."""
+    settings = get_settings()
+    return ToolExecutor(
+        max_workers=settings.TOOL_THREAD_POOL_SIZE,
+        max_concurrency=settings.TOOL_MAX_CONCURRENCY,
+        timeout=settings.TOOL_TIMEOUT,
+        concurrency_limits=settings.TOOL_CONCURRENCY_LIMITS,
+        timeouts=settings.TOOL_TIMEOUTS,
+    )
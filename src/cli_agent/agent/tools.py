@@ -1,19 +1,17 @@
 from typing import Any, Literal, List, Callable
 
-from tavily import TavilyClient
-
-tavily_client = TavilyClient()
+from cli_agent.agent.search import get_search
 
 
 # Search tool to use to do research
-def internet_search(
+async def internet_search(
     query: str,
     max_results: int = 5,
     topic: Literal["general", "news", "finance"] = "general",
     include_raw_content: bool = False,
 ):
     """Run a web search"""
-    return tavily_client.search(
+    return await get_search().search(
         query,
         max_results=max_results,
         include_raw_content=include_raw_content,
@@ -21,4 +19,29 @@ def internet_search(
     )
 
 
-TOOLS: List[Callable[..., Any]] = [internet_search]
\ No newline at end of file
+async def ingest_knowledge(urls: List[str]):
+    """Add web pages (http or https URLs) to the knowledge base, unchanged pages are skipped"""
+    from cli_agent.agent.ingestion import IngestionPipeline
+
+    # Local files are only ingested by the user with /ingest, a fetched page must not make the agent read them
+    rejected = [url for url in urls if not url.startswith(("http://", "https://"))]
+    if rejected:
+        return f"Only web pages can be ingested, not: {', '.join(rejected)}"
+
+    stats = await IngestionPipeline().run(urls)
+    return stats.summary()
+
+
+async def search_knowledge(query: str, max_results: int = 5):
+    """Search the knowledge base for the passages most relevant to a query, with their source"""
+    from cli_agent.agent.knowledge import get_knowledge_base
+    from cli_agent.agent.memory import to_pixeltable_thread
+
+    def search():
+        return get_knowledge_base().search(query, k=max_results)
+
+    chunks = await to_pixeltable_thread(search)
+    return [chunk.model_dump(exclude={"chunk_index"}) for chunk in chunks]
+
+
+TOOLS: List[Callable[..., Any]] = [internet_search, ingest_knowledge, search_knowledge]
@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterable, Optional, TextIO
+from dotenv import load_dotenv
+load_dotenv()
+
+from loguru import logger
+from pydantic import BaseModel
+
+from cli_agent.config import get_settings
+
+if TYPE_CHECKING:
+    from cli_agent.agent.main_agent import Agent
+    from cli_agent.agent.memory import Memory
+
+logger = logger.bind(name="Batch Runner")
+settings = get_settings()
+
+AgentFactory = Callable[[Optional["Memory"]], Awaitable["Agent"]]
+
+
+class BatchItem(BaseModel):
+    """One prompt of a batch file."""
+    id: str
+    prompt: str
+
+
+def read_items(lines: Iterable[str]) -> list[BatchItem]:
+    """
+    Parse the prompts of a JSONL batch.
+
+    Each line is either an object with a `prompt` and an optional `id`, or a JSON string. Items without
+    an ID are identified by their line number so a rerun of the same file can skip them.
+    """
+    items = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        data = json.loads(line)
+        if isinstance(data, str):
+            data = {"prompt": data}
+        items.append(BatchItem(id=str(data.get("id", line_number)), prompt=data["prompt"]))
+
+    return items
+
+
+def completed_ids(output_path: Path) -> set[str]:
+    """Get the IDs of the items that already succeeded in a previous run writing to the same output."""
+    if not output_path.exists():
+        return set()
+
+    done = set()
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue # Last line cut short by a crash
+            if result.get("status") == "ok":
+                done.add(result["id"])
+
+    return done
+
+
+def drop_partial_line(output_path: Path):
+    """Remove the last line of a previous run's output if a crash cut it short, the results appended next start on their own line."""
+    if not output_path.exists():
+        return
+
+    with open(output_path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline != -1:
+                f.truncate(start + newline + 1)
+                return
+            end = start
+        f.truncate(0)
+
+
+class BatchRunner:
+    """
+    Run batch items through `Agent.chat` with bounded concurrency.
+
+    Results are appended to the output as soon as each item finishes, so a crashed run can be resumed by
+    running it again, the items that already succeeded are skipped. With `shared_memory`, every item is
+    a turn of the same agent and the items run one at a time, in order, like a user sending them.
+
+    Args:
+        concurrency (int): Maximum number of items processed at the same time, 1 with `shared_memory`
+        shared_memory (bool): Run every item in one conversation instead of a new conversation per item
+        agent_factory (AgentFactory): Coroutine creating an agent for a Memory, or for a new one if None. Defaults to `sessions.create_agent`
+    """
+    def __init__(
+        self,
+        concurrency: int = settings.BATCH_CONCURRENCY,
+        shared_memory: bool = False,
+        agent_factory: Optional[AgentFactory] = None,
+    ):
+        if shared_memory and concurrency > 1:
+            logger.warning("Items of a shared conversation run one at a time, the concurrency is ignored")
+            concurrency = 1
+        self.concurrency = concurrency
+        self.shared_memory = shared_memory
+        if agent_factory is None:
+            from cli_agent.agent.sessions import create_agent as agent_factory
+        self.agent_factory = agent_factory
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._setup_lock = asyncio.Lock() # The first setup compiles the graph, the following ones reuse it
+        self._shared_agent: Optional["Agent"] = None
+
+    async def run(self, items: list[BatchItem], output: TextIO) -> dict[str, int]:
+        """Process the items and write one JSON result per line to the output."""
+        counts = {"ok": 0, "error": 0}
+
+        async def process(item: BatchItem):
+            async with self._semaphore:
+                result = await self._run_item(item)
+            counts[result["status"]] += 1
+
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            try:
+                os.fsync(output.fileno()) # A finished item must survive a crash of the run
+            except (OSError, ValueError):
+                pass # Not a file, e.g. stdout piped to another process
+            logger.info(f"Item {item.id} finished with status '{result['status']}' in {result['elapsed']:.2f}s")
+
+        await asyncio.gather(*(process(item) for item in items))
+        return counts
+
+    async def _get_agent(self) -> "Agent":
+        async with self._setup_lock:
+            if self._shared_agent is not None:
+                return self._shared_agent
+            agent = await self.agent_factory(None)
+            if self.shared_memory:
+                self._shared_agent = agent
+        return agent
+
+    async def _run_item(self, item: BatchItem) -> dict[str, Any]:
+        start = time.perf_counter()
+        result = {
+            "id": item.id,
+            "prompt": item.prompt,
+            "started_at": datetime.now().astimezone().isoformat(),
+            "memory_id": None,
+            "response": None,
+            "tool_calls": [],
+            "first_token_latency": None,
+        }
+
+        try:
+            agent = await self._get_agent()
+            result["memory_id"] = agent.memory.directory
+
+            async for chunk in agent.chat(item.prompt, stream_tokens=True):
+                if chunk.get("token") and result["first_token_latency"] is None:
+                    result["first_token_latency"] = round(time.perf_counter() - start, 3)
+                elif chunk.get("agent"):
+                    agent_message = chunk["agent"]["messages"][0]
+                    if agent_message.tool_calls:
+                        result["tool_calls"] += [tool_call["name"] for tool_call in agent_message.tool_calls]
+                    else:
+                        result["response"] = agent_message.content
+
+            await agent.wait_for_summary()
+        except Exception as e:
+            result["error"] = str(e)
+
+        if result["response"] is None and "error" not in result:
+            result["error"] = "The agent did not respond, see the logs for details"
+        result["status"] = "error" if "error" in result else "ok"
+        result["elapsed"] = round(time.perf_counter() - start, 3)
+        return result
+
+
+async def run_batch(
+    input_file: TextIO,
+    output_path: Optional[Path],
+    concurrency: int = settings.BATCH_CONCURRENCY,
+    shared_memory: bool = False,
+) -> dict[str, int]:
+    """
+    Run a JSONL batch of prompts.
+
+    Args:
+        input_file (TextIO): JSONL prompts, see `read_items`
+        output_path (Path): JSONL file the results are appended to, written to stdout if not provided
+        concurrency (int): Maximum number of prompts processed at the same time
+        shared_memory (bool): Run every prompt in one conversation instead of a new conversation each
+
+    Returns:
+        Number of items per status, with the number of items skipped because they already succeeded.
+    """
+    from cli_agent.agent.memory import get_memory_writer
+    from cli_agent.agent.mcp_manager import get_mcp_manager
+    from cli_agent.agent.search import close_search
+
+    items = read_items(input_file)
+    done = completed_ids(output_path) if output_path is not None else set()
+    pending = [item for item in items if item.id not in done]
+    logger.info(f"Running {len(pending)} item(s), {len(items) - len(pending)} already done")
+
+    if output_path is not None:
+        drop_partial_line(output_path)
+    output = open(output_path, "a") if output_path is not None else sys.stdout
+    try:
+        counts = await BatchRunner(concurrency=concurrency, shared_memory=shared_memory).run(pending, output)
+    finally:
+        if output_path is not None:
+            output.close()
+        get_memory_writer().flush()
+        await close_search()
+        try:
+            await get_mcp_manager(settings.MCP_CONFIG).close()
+        except Exception:
+            pass
+
+    counts["skipped"] = len(items) - len(pending)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through the agent without the interactive CLI.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of prompts, read from stdin if '-' or not provided")
+    parser.add_argument("-o", "--output", help="JSONL file the results are appended to, reruns skip the items that already succeeded")
+    parser.add_argument("-c", "--concurrency", type=int, default=settings.BATCH_CONCURRENCY, help="Maximum number of prompts processed at the same time")
+    parser.add_argument("--shared-memory", action="store_true", help="Run every prompt in one conversation instead of a new conversation each")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the model, even if LLM_CACHE_ENABLED is set")
+    args = parser.parse_args()
+    if args.no_cache:
+        settings.LLM_CACHE_ENABLED = False
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, "r")
+    with input_file:
+        counts = asyncio.run(
+            run_batch(
+                input_file,
+                output_path=Path(args.output) if args.output else None,
+                concurrency=args.concurrency,
+                shared_memory=args.shared_memory,
+            )
+        )
+    logger.info(f"Batch finished: {counts['ok']} succeeded, {counts['error']} failed, {counts['skipped']} skipped")
+    if settings.LLM_CACHE_ENABLED:
+        from cli_agent.agent.llm_cache import get_response_cache
+
+        cache_stats = get_response_cache().stats()
+        logger.info(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate)")
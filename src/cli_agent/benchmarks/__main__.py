@@ -0,0 +1,311 @@
+"""
+Offline benchmarks of the per-turn overhead of the agent.
+
+The model is replaced by `ScriptedChatModel` and the MCP servers by a local stub server, so the
+measurements only include the work done by the agent itself: memory, files state, history listing,
+graph execution and rendering. Results are written as JSON lines, one line per measurement:
+
+    uv run python -m cli_agent.benchmarks --turns 10 100 1000 10000 --output results.jsonl
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from importlib.metadata import version
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, TextIO
+from dotenv import load_dotenv
+load_dotenv()
+
+from loguru import logger
+
+from cli_agent.config import get_settings
+
+if TYPE_CHECKING:
+    from cli_agent.benchmarks.fakes import ScriptedChatModel
+
+logger = logger.bind(name="Benchmarks")
+settings = get_settings()
+
+WORDS = ["agent", "memory", "pixeltable", "stream", "tool", "search", "context", "summary", "file", "state"]
+
+
+def random_text(n_words: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(n_words))
+
+
+class BenchmarkReporter:
+    """Write the run metadata and one JSON line of statistics per measurement."""
+    def __init__(self, output: TextIO):
+        self.output = output
+
+    def write(self, record: dict[str, Any]):
+        self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+
+    def write_metadata(self, args: argparse.Namespace):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+
+        self.write({
+            "type": "run",
+            "timestamp": datetime.now().astimezone().isoformat(),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pixeltable": version("pixeltable"),
+            "args": vars(args),
+        })
+
+    def report(self, benchmark: str, params: dict[str, Any], durations: list[float]):
+        durations_ms = sorted(duration * 1000 for duration in durations)
+        percentiles = statistics.quantiles(durations_ms, n=100, method="inclusive") if len(durations_ms) > 1 else durations_ms * 99
+        self.write({
+            "type": "result",
+            "benchmark": benchmark,
+            "params": params,
+            "unit": "ms",
+            "count": len(durations_ms),
+            "mean": round(statistics.fmean(durations_ms), 4),
+            "p50": round(percentiles[49], 4),
+            "p95": round(percentiles[94], 4),
+            "min": round(durations_ms[0], 4),
+            "max": round(durations_ms[-1], 4),
+        })
+        logger.info(f"{benchmark} {params}: p50 {percentiles[49]:.3f}ms, p95 {percentiles[94]:.3f}ms")
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> list[float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+async def ameasure(fn: Callable[[], Awaitable[Any]], repeat: int) -> list[float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def seed_conversation(n_turns: int, words_per_message: int):
+    """Create a conversation of `n_turns` user/assistant pairs, written through the memory writer."""
+    from cli_agent.agent.memory import Memory, MemoryRecord
+
+    memory = Memory(str(uuid.uuid4()))
+    start = datetime.now() - timedelta(seconds=2 * n_turns)
+    for i in range(2 * n_turns):
+        memory.insert_memory(
+            MemoryRecord(
+                message_id=str(uuid.uuid4()),
+                role="user" if i % 2 == 0 else "assistant",
+                content=random_text(words_per_message),
+                timestamp=start + timedelta(seconds=i),
+            )
+        )
+    memory.flush()
+    return memory
+
+
+async def bench_conversation(reporter: BenchmarkReporter, n_turns: int, args: argparse.Namespace, model: "ScriptedChatModel", mcp_config: str):
+    """Measure the memory, history and turn overhead on a conversation of `n_turns` turns."""
+    from rich.console import Console
+
+    from cli_agent.agent.main_agent import Agent
+    from cli_agent.agent.memory import Memory, MemoryRecord
+    from cli_agent.agent.prompts import INSTRUCTIONS
+    from cli_agent.agent.tools import TOOLS
+    from cli_agent.benchmarks.fakes import ScriptedChatModel
+    from cli_agent.utils import ConversationReplay, get_chat_history
+
+    params = {"turns": n_turns}
+    start = time.perf_counter()
+    memory = seed_conversation(n_turns, args.words_per_message)
+    reporter.report("seed_conversation", params, [time.perf_counter() - start])
+
+    try:
+        # A new Memory object on the same conversation starts with cold caches
+        reporter.report("memory_open", params, measure(lambda: Memory(memory.directory), 1))
+        agent = Agent(
+            model_name=model, # The same instance for every conversation so the compiled graph is shared
+            tools=TOOLS,
+            system_prompt=INSTRUCTIONS,
+            mcp_servers_config=mcp_config,
+            memory=Memory(memory.directory),
+            summary_model=ScriptedChatModel(response="Summary of the conversation."),
+        )
+        await agent.setup()
+
+        reporter.report("build_chat_history_cold", params, measure(lambda: agent._build_chat_history("Hello"), 1))
+        reporter.report("build_chat_history", params, measure(lambda: agent._build_chat_history("Hello"), args.repeat))
+
+        def insert():
+            memory.insert_memory(
+                MemoryRecord(message_id=str(uuid.uuid4()), role="user", content=random_text(args.words_per_message), timestamp=datetime.now())
+            )
+        reporter.report("insert_memory", params, measure(insert, args.repeat))
+        reporter.report("memory_flush", {**params, "records": args.repeat}, measure(memory.flush, 1))
+
+        reporter.report("get_chat_history", params, measure(lambda: get_chat_history(limit=settings.HISTORY_PAGE_SIZE), args.repeat))
+
+        console = Console(file=io.StringIO(), force_terminal=True, width=100)
+        def resume_replay():
+            replay = ConversationReplay(memory.directory, console)
+            replay.load_older()
+            replay.render()
+        reporter.report("resume_replay", params, measure(resume_replay, args.repeat))
+
+        # Full turns with an instant model calling a stub MCP tool, the rolling summary is measured apart
+        async def chat_turn():
+            async for _ in agent.chat("Add two numbers", stream_tokens=True):
+                pass
+        async def summary_update():
+            await agent.wait_for_summary()
+        summary_durations = []
+        turn_durations = []
+        for _ in range(args.repeat):
+            turn_durations += await ameasure(chat_turn, 1)
+            summary_durations += await ameasure(summary_update, 1)
+        reporter.report("chat_turn", params, turn_durations)
+        reporter.report("summary_update", params, summary_durations)
+    finally:
+        memory.reset_current_memory()
+
+
+async def bench_files_state(reporter: BenchmarkReporter, n_files: int, args: argparse.Namespace):
+    """Measure saving and restoring a files state of `n_files` files."""
+    from cli_agent.agent.memory import Memory
+
+    params = {"files": n_files, "file_size": args.file_size}
+    memory = Memory(str(uuid.uuid4()))
+    files = {
+        f"/notes/file_{i}.md": "".join(random.choices(string.ascii_letters + " \n", k=args.file_size))
+        for i in range(n_files)
+    }
+
+    try:
+        def save_all():
+            memory.save_files(files)
+            memory.flush()
+        reporter.report("files_save_all", params, measure(save_all, 1))
+
+        def save_one_changed():
+            path = random.choice(list(files))
+            memory.save_files({path: files[path] + random_text(5)})
+            memory.flush()
+        reporter.report("files_save_one_changed", params, measure(save_one_changed, args.repeat))
+
+        reporter.report("files_restore", params, measure(lambda: Memory(memory.directory).load_file_manifest(), max(1, args.repeat // 5)))
+
+        def read_one_cold():
+            Memory(memory.directory).read_file(random.choice(list(files)))
+        reporter.report("files_read_one_cold", params, measure(read_one_cold, max(1, args.repeat // 5)))
+    finally:
+        memory.reset_current_memory()
+
+
+def bench_streaming_render(reporter: BenchmarkReporter, n_tokens: int, args: argparse.Namespace):
+    """Measure rendering a streamed Markdown response of `n_tokens` tokens."""
+    from rich.console import Console
+
+    from cli_agent.streaming import MarkdownStream
+
+    paragraphs = [random_text(40) for _ in range(max(1, n_tokens // 40))]
+    tokens = [f" {word}" for word in "\n\n".join(paragraphs).split(" ")][:n_tokens]
+
+    def render():
+        stream = MarkdownStream(Console(file=io.StringIO(), force_terminal=True, width=100), refresh_rate=settings.STREAM_REFRESH_RATE)
+        for token in tokens:
+            stream.update(token)
+        stream.stop()
+    reporter.report("streaming_render", {"tokens": n_tokens}, measure(render, max(1, args.repeat // 5)))
+
+
+def isolate_stores(workdir: Path):
+    """
+    Keep the benchmark conversations out of the user's ones, Pixeltable and the stores are moved to `workdir`.
+
+    Pixeltable reads its home when it is initialized, so this runs before it is imported. Its Postgres
+    server outlives the process, so the same directory is reused by the runs, each deletes what it creates.
+    """
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir) # The stub MCP config
+    os.environ["PIXELTABLE_HOME"] = str(workdir / "pixeltable")
+    settings.REGISTRY_PATH = str(workdir / "conversation_registry.sqlite")
+    settings.SEARCH_INDEX_PATH = str(workdir / "message_search.sqlite")
+    settings.LLM_CACHE_PATH = str(workdir / "llm_cache.sqlite")
+    if settings.TRACE_EXPORT_PATH:
+        settings.TRACE_EXPORT_PATH = str(workdir / "traces.jsonl")
+
+
+async def main(args: argparse.Namespace, output: TextIO):
+    import pixeltable as pxt
+
+    from cli_agent.agent.mcp_manager import get_mcp_manager
+    from cli_agent.agent.memory import get_memory_writer, to_pixeltable_thread
+    from cli_agent.benchmarks.fakes import ScriptedChatModel, write_stub_mcp_config
+
+    reporter = BenchmarkReporter(output)
+    reporter.write_metadata(args)
+    random.seed(args.seed)
+
+    await to_pixeltable_thread(pxt.init)
+    mcp_config = str(write_stub_mcp_config(Path("stub_mcp_config.json")))
+    model = ScriptedChatModel(response=random_text(args.words_per_message), tool_name="add", tool_args={"a": 1, "b": 2})
+
+    try:
+        for n_turns in args.turns:
+            await bench_conversation(reporter, n_turns, args, model, mcp_config)
+        for n_files in args.files:
+            await bench_files_state(reporter, n_files, args)
+        for n_tokens in args.tokens:
+            bench_streaming_render(reporter, n_tokens, args)
+    finally:
+        get_memory_writer().flush()
+        await get_mcp_manager(mcp_config).close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the per-turn overhead of the agent with a fake model and a stub MCP server.")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Conversation lengths, in user/assistant turns")
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 100, 1000], help="Number of files in the files state")
+    parser.add_argument("--file-size", type=int, default=2000, help="Size of each file, in characters")
+    parser.add_argument("--tokens", type=int, nargs="+", default=[100, 1000, 10000], help="Length of the rendered responses, in tokens")
+    parser.add_argument("--words-per-message", type=int, default=60, help="Length of the seeded messages")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of measurements per benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the generated contents")
+    parser.add_argument("--workdir", help="Directory of the Pixeltable home and the stores, reused by the runs, cli_agent_bench in the temporary directory if not provided")
+    parser.add_argument("-o", "--output", help="JSONL file the results are written to, stdout if not provided")
+    args = parser.parse_args()
+
+    if args.output:
+        output = open(args.output, "w")
+    else:
+        # Pixeltable prints its progress, like "Inserted N rows", on stdout: it goes to stderr, stdout only gets the results
+        output = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    isolate_stores(Path(args.workdir or Path(tempfile.gettempdir()) / "cli_agent_bench").resolve())
+    try:
+        asyncio.run(main(args, output))
+    finally:
+        output.close()
@@ -0,0 +1,83 @@
+import json
+import re
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+STUB_MCP_SERVER_PATH = Path(__file__).parent / "stub_mcp_server.py"
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model answering instantly from a script, so the agent can be measured without the model latency.
+
+    When `tool_name` is set, every user message is first answered with a call to that tool and the tool
+    result with `response`. Responses are streamed word by word like a real model.
+    """
+    response: str = "Done."
+    tool_name: Optional[str] = None
+    tool_args: dict[str, Any] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+    def _next_message(self, messages: list[BaseMessage]) -> AIMessage:
+        if self.tool_name is not None and not isinstance(messages[-1], ToolMessage):
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": self.tool_name, "args": self.tool_args, "id": f"call_{uuid.uuid4().hex}"}],
+            )
+        return AIMessage(content=self.response)
+
+    def _chunks(self, messages: list[BaseMessage]) -> Iterator[ChatGenerationChunk]:
+        message = self._next_message(messages)
+        if message.tool_calls:
+            tool_call = message.tool_calls[0]
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[{"name": tool_call["name"], "args": json.dumps(tool_call["args"]), "id": tool_call["id"], "index": 0}],
+                )
+            )
+            return
+
+        for token in re.findall(r"\s*\S+", message.content):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    def _stream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for chunk in self._chunks(messages):
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for chunk in self._chunks(messages):
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+
+def write_stub_mcp_config(path: Path) -> Path:
+    """Write an MCP config running the local stub server with the current interpreter."""
+    config = {
+        "stub": {
+            "command": sys.executable,
+            "args": [str(STUB_MCP_SERVER_PATH)],
+            "transport": "stdio",
+        }
+    }
+    with open(path, "w") as f:
+        json.dump(config, f, indent=2)
+    return path
@@ -0,0 +1,19 @@
+from mcp.server.fastmcp import FastMCP
+
+mcp = FastMCP("stub", log_level="WARNING")
+
+
+@mcp.tool()
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+@mcp.tool()
+def echo(text: str) -> str:
+    """Return the text unchanged."""
+    return text
+
+
+if __name__ == "__main__":
+    mcp.run(transport="stdio")
@@ -1,22 +1,36 @@
+from cli_agent.profiling import profiler # First, the import time budget covers the imports of this module
+
+import argparse
 import asyncio
+import importlib
+import signal
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional
 from dotenv import load_dotenv
 load_dotenv()
 
-import cutie
+from loguru import logger
 from rich.console import Console
 from rich.panel import Panel
-from rich.prompt import Prompt
 from rich.markdown import Markdown
 
 from cli_agent.config import get_settings
-from cli_agent.utils import get_chat_history, print_past_conversation, delete_conversation
-from cli_agent.agent.main_agent import Agent
-from cli_agent.agent.prompts import INSTRUCTIONS
-from cli_agent.agent.tools import TOOLS
-from cli_agent.agent.memory import Memory
+from cli_agent.terminal import TerminalInput
+from cli_agent.tracing import get_tracer
+
+# Pixeltable, DeepAgents, LangChain and MCP are imported after the welcome banner is drawn
+if TYPE_CHECKING:
+    from cli_agent.agent.main_agent import Agent
+    from cli_agent.agent.memory import Memory
+    from cli_agent.utils import ConversationReplay
 
 console = Console()
 settings = get_settings()
+terminal = TerminalInput(console)
 
 
 def welcome_message():
@@ -38,21 +52,102 @@ def help_message():
 **Commands:**
 - **/exit**: Exit the application
 - **/help**: Show this help message panel
-- **/resume**: Select past conversation history
+- **/resume**: Select past conversation history, or resume one directly with /resume [chat ID]
+- **/more** or **/history**: Show the earlier messages of the resumed conversation
+- **/search**: Search the messages of every conversation with /search [terms]
 - **/clear** or **/reset**: Clear the current chat history
 - **/new**: Start a new conversation
 - **/delete**: Delete a conversation with /delete [chat ID]
 - **/tools**: List all the tools and MCP servers of the agent
+- **/stats**: Show the p50 and p95 latency of each stage of the turns, the response cache hit rate and the search cache counters
+- **/ingest**: Add web pages, files or directories to the knowledge base with /ingest [URL or path] ...
 """
     console.print(Panel(Markdown(help_text), title="Help Panel", border_style="cyan"))
 
 
-async def clear(retained_memory: Memory = None):
+# Third-party modules imported by the agent, profiled one by one in import order
+AGENT_MODULES = [
+    "langchain_core.tools",
+    "langgraph.prebuilt",
+    "deepagents",
+    "langchain_openai",
+    "langchain_mcp_adapters.client",
+    "cli_agent.agent.main_agent",
+]
+
+
+def warm_up_pixeltable():
+    """Import and initialize Pixeltable, run on a background thread while the agent modules are imported."""
+    with profiler.stage("import pixeltable"):
+        import pixeltable as pxt
+        from cli_agent.agent.memory import get_memory_writer
+    # Pixeltable is only called on its own thread, this one waits for it
+    pixeltable_thread = get_memory_writer()
+    with profiler.stage("initialize pixeltable"):
+        pixeltable_thread.call(pxt.init)
+    with profiler.stage("open conversation registry"):
+        from cli_agent.agent.registry import get_registry, reconcile_conversations
+        pixeltable_thread.call(get_registry) # Imports the JSON registry of older versions on first use
+    # The catalog and the indexes are filled from the registered conversations on first use
+    with profiler.stage("open conversation catalog"):
+        from cli_agent.agent.catalog import get_catalog
+        pixeltable_thread.call(get_catalog)
+    if settings.RECALL_TOP_K > 0:
+        with profiler.stage("open semantic recall index"):
+            from cli_agent.agent.recall import get_recall_index
+            pixeltable_thread.call(get_recall_index)
+    with profiler.stage("open full-text search index"):
+        from cli_agent.agent.message_search import get_message_search_index
+        pixeltable_thread.call(get_message_search_index)
+    with profiler.stage("check conversation registry"):
+        # Picks up the conversations created or deleted without the registry, like by an older version
+        pixeltable_thread.call(reconcile_conversations)
+
+
+def import_agent_modules():
+    for module in AGENT_MODULES:
+        with profiler.stage(f"import {module}"):
+            importlib.import_module(module)
+
+
+async def create_agent(memory: "Memory" = None) -> "Agent":
+    """
+    Setup a new Agent, the compiled graph is shared with the other agents of the same configuration.
+
+    Args:
+        memory (Memory): Provide the existed Memory to resume past conversation, a new one is created otherwise
+
+    Returns:
+        New agent instance
+    """
+    from cli_agent.agent.main_agent import Agent
+    from cli_agent.agent.memory import Memory, to_pixeltable_thread
+    from cli_agent.agent.prompts import INSTRUCTIONS
+    from cli_agent.agent.tools import TOOLS
+
+    with profiler.stage("create memory"):
+        if memory is None:
+            memory = await to_pixeltable_thread(Memory, str(uuid.uuid4()))
+        agent = Agent(
+            model_name=settings.MODEL,
+            tools=TOOLS,
+            system_prompt=INSTRUCTIONS,
+            mcp_servers_config=settings.MCP_CONFIG,
+            memory=memory,
+        )
+    with profiler.stage("setup agent (MCP tools and graph)"):
+        await agent.setup()
+
+    return agent
+
+
+async def clear(retained_memory: "Memory" = None, idle_work: Optional["IdleWork"] = None):
     """
     Clear the current terminal screen and setup a new Agent.
     
     Args:
         retained_memory (Memory): Provide the existed Memory to recreate the agent and resume past conversation
+        idle_work (IdleWork): Background work providing the new conversation it prepared, when not resuming one
         
     Returns:
         New agent instance
@@ -60,167 +155,500 @@ async def clear(retained_memory: Memory = None):
     console.clear()
     welcome_message()
 
-    agent = Agent(
-    model_name=settings.MODEL,
-    tools=TOOLS,
-    system_prompt=INSTRUCTIONS,
-    mcp_servers_config=settings.MCP_CONFIG,
-    memory=retained_memory,
-    )
-    await agent.setup()
+    if retained_memory is None and idle_work is not None:
+        return await idle_work.new_agent()
+    return await create_agent(memory=retained_memory)
 
-    return agent
 
+async def resume_conversation(memory_id: str) -> tuple["Agent", "ConversationReplay"]:
+    """
+    Setup a new Agent on a past conversation and print its latest messages.
 
-async def stream_agent_interactions(agent: Agent, user_input: str):
-    """Stream real-time agent tool calls and responses."""
-    try:
-        async for chunk in agent.chat(user_input):
-            if chunk.get("agent"):
-                agent_message = chunk["agent"]["messages"][0]
-                tool_calls = agent_message.tool_calls
-
-                if tool_calls:
-                    console.print(f"\n[bold dark_red]Assistant[/bold dark_red]:")
-                    for tool_call in tool_calls:
-                        console.print(f"🔹 [cyan]Calling tool:[/cyan] [bold]{tool_call["name"]}[/bold]")
+    Returns:
+        New agent instance and the replay of the conversation, which shows older messages with /more
+    """
+    from cli_agent.agent.memory import Memory, to_pixeltable_thread
+    from cli_agent.utils import ConversationReplay
+
+    memory = await to_pixeltable_thread(Memory, memory_id)
+    agent = await clear(retained_memory=memory)
+    replay = ConversationReplay(memory_id, console)
+    await to_pixeltable_thread(replay.load_older)
+    replay.render()
+    console.print(f"[bold green]Resuming conversation...\n")
+    return agent, replay
+
+
+def idle_log_filter(record: dict) -> bool:
+    """Hide the info logs of the idle work, which would be printed in the middle of the line the user is typing."""
+    return not record["extra"].get("idle") or record["level"].no >= logger.level("WARNING").no
+
+
+class IdleWork:
+    """
+    Work done in the background while the user types, so the next command finds it done.
+
+    The queued memory records are written, the conversation of the next `/new` is created and set up,
+    and the first page of `/resume` is listed. Each idle period starts after the previous one finished,
+    and a failure is left to the command, which then does the work itself.
+    """
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._spare: Optional["Agent"] = None # Agent of an empty conversation, taken by the next /new
+        self._history_page: Optional[tuple] = None # First page of /resume, listed during the current idle period
+
+    def start(self):
+        """Start the work of a new idle period, when the prompt is shown."""
+        self._history_page = None
+        self._task = asyncio.create_task(self._run(self._task))
+
+    async def _run(self, previous: Optional[asyncio.Task]):
+        from cli_agent.agent.memory import Memory, get_memory_writer, to_pixeltable_thread
+        from cli_agent.utils import get_chat_history
+
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            with logger.contextualize(idle=True): # Not printed over the prompt, see idle_log_filter
+                await asyncio.to_thread(get_memory_writer().flush)
+                if self._spare is None:
+                    memory = await to_pixeltable_thread(Memory, str(uuid.uuid4()))
+                    self._spare = await create_agent(memory=memory)
+                self._history_page = await to_pixeltable_thread(get_chat_history, limit=settings.HISTORY_PAGE_SIZE)
+        except Exception:
+            pass # The command needing it does the work again and reports the error
+
+    async def new_agent(self) -> "Agent":
+        """Get the agent of a new conversation, the one prepared in the background if it is ready."""
+        if self._task is not None:
+            await asyncio.wait([self._task]) # Already done unless the user typed faster than the setup
+        agent, self._spare = self._spare, None
+        return agent if agent is not None else await create_agent()
+
+    async def history_page(self) -> tuple[list[str], list[str], Optional[tuple[datetime, str]]]:
+        """Get the first page of past conversations, without the empty one kept for /new."""
+        from cli_agent.agent.memory import to_pixeltable_thread
+        from cli_agent.utils import get_chat_history
+
+        if self._task is not None:
+            await asyncio.wait([self._task])
+        options, memory_ids, next_cursor = self._history_page or await to_pixeltable_thread(get_chat_history, limit=settings.HISTORY_PAGE_SIZE)
+        spare_id = self._spare.memory.directory if self._spare is not None else None
+        listed = [(option, memory_id) for option, memory_id in zip(options, memory_ids) if memory_id != spare_id]
+        return [option for option, _ in listed], [memory_id for _, memory_id in listed], next_cursor
+
+    async def close(self):
+        """Wait for the background work and delete the unused conversation."""
+        from cli_agent.agent.memory import to_pixeltable_thread
+
+        if self._task is not None:
+            await asyncio.wait([self._task])
+        if self._spare is not None:
+            await to_pixeltable_thread(self._spare.reset_memory)
+            self._spare = None
+
+
+async def search_message(terms: str):
+    """Display the conversations whose messages best match the search terms."""
+    from rich.markup import escape
+    from rich.table import Table
+    from cli_agent.agent.message_search import HIGHLIGHT_START, HIGHLIGHT_END
+    from cli_agent.agent.memory import get_memory_writer
+    from cli_agent.utils import search_conversations, format_elapsed_time
+
+    await asyncio.to_thread(get_memory_writer().flush) # Pending messages are indexed before the search is timed
+    start = time.perf_counter()
+    hits = await asyncio.to_thread(search_conversations, terms)
+    elapsed = time.perf_counter() - start
+    if not hits:
+        console.print(f"\u2514 [bold]No message matches, searched in {elapsed * 1000:.0f}ms.")
+        return
+
+    table = Table(title=f"{len(hits)} conversation(s) in {elapsed * 1000:.0f}ms", border_style="cyan")
+    table.add_column("Chat ID", no_wrap=True)
+    table.add_column("Modified", no_wrap=True)
+    table.add_column("Message")
+    now = datetime.now().astimezone()
+    for hit in hits:
+        role = "You" if hit.role == "user" else "Assistant"
+        snippet = escape(" ".join(hit.snippet.split()))
+        snippet = snippet.replace(HIGHLIGHT_START, "[bold gold1]").replace(HIGHLIGHT_END, "[/bold gold1]")
+        table.add_row(hit.memory_id, format_elapsed_time(now - hit.timestamp), f"[bold]{role}:[/bold] {snippet}")
+    console.print(table)
+    console.print("\u2514 [dim gray100]Resume a conversation with[/dim gray100]", end=" ")
+    console.print("/resume [chat ID]", markup=False, style="dim gray100")
+
+
+async def stream_agent_interactions(agent: "Agent", user_input: str, stream_tokens: bool = settings.STREAM_TOKENS):
+    """
+    Stream real-time agent tool calls and responses.
+
+    With `stream_tokens`, the response is rendered token by token and the time to the first visible
+    token is reported, otherwise each agent step is printed once it is finished. The turn is traced
+    as the root span of the agent spans, with the time spent rendering recorded as `cli.render`.
+    """
+    from cli_agent.streaming import MarkdownStream
+
+    tracer = get_tracer()
+    start = time.perf_counter()
+    first_token_latency = None
+    render_time = 0.0
+    response_stream = None # Rendering of the current agent step, a new one is started after each step
+
+    with tracer.span("cli.turn") as turn_span:
+        try:
+            async for chunk in agent.chat(user_input, stream_tokens=stream_tokens):
+                render_start = time.perf_counter()
+                if chunk.get("token"):
+                    if first_token_latency is None:
+                        first_token_latency = time.perf_counter() - start
+                    if response_stream is None:
+                        console.print(f"\n[bold dark_red]Assistant[/bold dark_red]:")
+                        response_stream = MarkdownStream(console, refresh_rate=settings.STREAM_REFRESH_RATE)
+                    response_stream.update(chunk["token"])
+
+                elif chunk.get("agent"):
+                    agent_message = chunk["agent"]["messages"][0]
+                    tool_calls = agent_message.tool_calls
+                    streamed = response_stream is not None
+                    if streamed:
+                        response_stream.stop()
+                        response_stream = None
+
+                    if tool_calls:
+                        if not streamed:
+                            console.print(f"\n[bold dark_red]Assistant[/bold dark_red]:")
+                        for tool_call in tool_calls:
+                            console.print(f"🔹 [cyan]Calling tool:[/cyan] [bold]{tool_call["name"]}[/bold]")
+                    
+                    if agent_message.content and not tool_calls and not streamed:
+                        console.print(f"\n[bold dark_red]Assistant[/bold dark_red]: {agent_message.content}\n")
                 
-                if agent_message.content and not tool_calls:
-                    console.print(f"\n[bold dark_red]Assistant[/bold dark_red]: {agent_message.content}\n")
-            
-            elif chunk.get("tools"):
-                if chunk["tools"]["messages"][0].name == "write_todos":
-                    console.print("\u2514 [bold]Updated to-do list")
-                    for task in chunk["tools"]["todos"]:
-                        status = task["status"]
-                        content = task["content"]
-                        console.print("⏳" if status == "pending" else "🔄" if status == "in_progress" else "✅", end=" ")
-                        console.print(content)
-                else:
-                    console.print(f"\u2514 [dim gray100]{chunk["tools"]["messages"][0].content}")
-    except Exception as e:
-        console.print(f"❌ [red]Encountered error: {e}")
+                elif chunk.get("tools"):
+                    if chunk["tools"]["messages"][0].name == "write_todos":
+                        console.print("\u2514 [bold]Updated to-do list")
+                        for task in chunk["tools"]["todos"]:
+                            status = task["status"]
+                            content = task["content"]
+                            console.print("⏳" if status == "pending" else "🔄" if status == "in_progress" else "✅", end=" ")
+                            console.print(content)
+                    else:
+                        console.print(f"\u2514 [dim gray100]{chunk["tools"]["messages"][0].content}")
+                render_time += time.perf_counter() - render_start
+        except Exception as e:
+            turn_span.error = f"{type(e).__name__}: {e}"
+            console.print(f"❌ [red]Encountered error: {e}")
+        finally:
+            if response_stream is not None:
+                response_stream.stop()
+
+        turn_span.set_attribute("render_ms", render_time * 1000)
+        tracer.observe("cli.render", render_time)
+
+    if first_token_latency is not None:
+        console.print(
+            f"[dim gray100]First token in {first_token_latency:.2f}s, "
+            f"response in {time.perf_counter() - start:.2f}s\n"
+        )
+
+
+def stats_message():
+    """Display the latency of each traced stage since the start of the session."""
+    from rich.table import Table
+
+    from cli_agent.agent.search import get_search
+
+    if settings.LLM_CACHE_ENABLED:
+        from cli_agent.agent.llm_cache import get_response_cache
+
+        cache_stats = get_response_cache().stats()
+        console.print(
+            f"\u2514 [bold]Response cache:[/bold] {cache_stats["hits"]} hits, {cache_stats["misses"]} misses "
+            f"({cache_stats["hit_rate"]:.0%} hit rate)"
+        )
+
+    if get_search.cache_info().currsize: # No search ran yet otherwise
+        search_stats = get_search().stats()
+        console.print(
+            f"\u2514 [bold]Search cache:[/bold] {search_stats["hits"]} hits, {search_stats["misses"]} misses, "
+            f"{search_stats["coalesced"]} coalesced, {search_stats["entries"]} entries"
+        )
+
+    if settings.ROUTER_TIERS:
+        from cli_agent.agent.router import get_model_router
+
+        router_table = Table(title="Model tiers", border_style="cyan")
+        for column in ["Tier", "Calls", "Escalated", "Errors", "Input tokens", "Output tokens", "p50 ms", "p95 ms"]:
+            router_table.add_column(column, justify="left" if column == "Tier" else "right")
+        for tier, tier_stats in get_model_router((*settings.ROUTER_TIERS, settings.MODEL)).metrics.stats().items():
+            router_table.add_row(
+                tier, *(str(tier_stats[key]) for key in ["calls", "escalations", "errors", "input_tokens", "output_tokens"]),
+                f"{tier_stats["p50"]:.1f}", f"{tier_stats["p95"]:.1f}",
+            )
+        console.print(router_table)
+
+    stats = get_tracer().stats()
+    if not stats:
+        console.print("\u2514 [bold]No turn traced yet.")
+        return
+
+    table = Table(title="Stage latency", border_style="cyan")
+    table.add_column("Stage")
+    table.add_column("Count", justify="right")
+    table.add_column("p50 ms", justify="right")
+    table.add_column("p95 ms", justify="right")
+    for stage, stage_stats in sorted(stats.items()):
+        table.add_row(stage, str(stage_stats["count"]), f"{stage_stats["p50"]:.1f}", f"{stage_stats["p95"]:.1f}")
+    console.print(table)
+
+
+def stop_on_hangup(task: asyncio.Task):
+    """Cancel the application when the terminal is closed or the process is terminated, its cleanup runs like on /exit."""
+    loop = asyncio.get_running_loop()
+    for name in ("SIGHUP", "SIGTERM"):
+        if hasattr(signal, name): # Not defined on Windows
+            try:
+                loop.add_signal_handler(getattr(signal, name), task.cancel)
+            except (NotImplementedError, RuntimeError):
+                pass # Not supported by the Windows event loops, nor outside of the main thread
 
 
 async def main():
+    profiler.imports_done()
     welcome_message()
-    agent = Agent(
-        model_name=settings.MODEL,
-        tools=TOOLS,
-        system_prompt=INSTRUCTIONS,
-        mcp_servers_config=settings.MCP_CONFIG,
-    )
-    await agent.setup()
 
-    while True:
-        try:
-            user_input = Prompt.ask("[bold cornflower_blue]You").strip()
+    pixeltable_warmup = threading.Thread(target=warm_up_pixeltable, name="pixeltable-warmup", daemon=True)
+    pixeltable_warmup.start()
+    import_agent_modules()
+
+    from cli_agent.agent.mcp_manager import get_mcp_manager
+    try:
+        get_mcp_manager(settings.MCP_CONFIG).connect() # Servers connect while waiting for Pixeltable
+    except Exception:
+        pass # Reported when the agent loads its MCP tools
+
+    with profiler.stage("wait for pixeltable warmup"):
+        await asyncio.to_thread(pixeltable_warmup.join)
+
+    from cli_agent.utils import get_chat_history, delete_conversation
+    from cli_agent.agent.registry import get_registry
+    from cli_agent.agent.memory import to_pixeltable_thread
+    from cli_agent.agent.search import close_search
+
+    agent = await create_agent()
+    replay = None # Replay of the resumed conversation, older messages are shown with /more
+    idle_work = IdleWork()
+    if profiler.enabled:
+        profiler.report(console)
+
+    # Ctrl-D, a crash or a closed terminal ends the loop too, the prepared conversation is deleted in any case
+    stop_on_hangup(asyncio.current_task())
+    try:
+        if not profiler.within_import_budget(settings.STARTUP_IMPORT_BUDGET) and profiler.enabled:
+            sys.exit(1) # A profiled startup fails, so scripted runs catch the import regressions
+        while True:
+            try:
+                idle_work.start() # The input is read on a thread, the loop works in the background meanwhile
+                user_input = (await terminal.ask("[bold cornflower_blue]You")).strip()
             
-            if user_input.lower() == "/exit":
-                console.print("\u2514 [bold]Catch you later!\n")
-                break
-
-            elif user_input.lower() == "/help":
-                help_message()
-                continue
-
-            elif user_input.lower() == "/resume":
-                try:
-                    options, memory_ids = get_chat_history()
-                    # chosen_option = Prompt.ask(
-                    #     "Please choose an option",
-                    #     choices=options,
-                    #     default=""
-                    # )
-                    console.print("\u2514 [bold]Resume a conversation or press 'Ctrl-C' to go back:")
-                    chosen_index = cutie.select(options)
-
-                    # After choosing an option
-                    chosen_option = memory_ids[chosen_index]
-                    
-                    agent = await clear(retained_memory=Memory(chosen_option))
+                if user_input.lower() == "/exit":
+                    console.print("\u2514 [bold]Catch you later!\n")
+                    break
 
-                    print_past_conversation(chosen_option, console)
-                    console.print(f"[bold green]Resuming conversation...\n")
+                elif user_input.lower() == "/help":
+                    help_message()
                     continue
-                except KeyboardInterrupt:
+
+                elif user_input.lower().startswith("/resume "):
+                    memory_id = user_input.split()[1] if len(user_input.split()) == 2 else ""
+                    await asyncio.to_thread(agent.memory.flush)
+                    if not get_registry().contains(memory_id):
+                        console.print("\u2514 [bold red1]Please use the correct command:[/bold red1]", end=" ")
+                        console.print("/resume [chat ID]", markup=False)
+                        continue
+
+                    agent, replay = await resume_conversation(memory_id)
                     continue
+
+                elif user_input.lower() == "/resume":
+                    await asyncio.to_thread(agent.memory.flush)
+                    try:
+                        options, memory_ids, next_cursor = await idle_work.history_page()
+                        # chosen_option = Prompt.ask(
+                        #     "Please choose an option",
+                        #     choices=options,
+                        #     default=""
+                        # )
+                        console.print("\u2514 [bold]Resume a conversation or press 'Ctrl-C' to go back:")
+                        while True:
+                            chosen_index = await terminal.select(options + (["Show older conversations..."] if next_cursor else []))
+                            if chosen_index < len(memory_ids):
+                                break
+
+                            # Fetch the next page and show it below the ones already loaded
+                            older_options, older_ids, next_cursor = await to_pixeltable_thread(
+                                get_chat_history,
+                                limit=settings.HISTORY_PAGE_SIZE,
+                                before=next_cursor
+                            )
+                            options += older_options
+                            memory_ids += older_ids
+
+                        # After choosing an option
+                        chosen_option = memory_ids[chosen_index]
+
+                        agent, replay = await resume_conversation(chosen_option)
+                        continue
+                    except KeyboardInterrupt:
+                        continue
             
-            elif user_input.lower() in ["/clear", "/reset"]:
-                agent.reset_memory()
-                agent = await clear()
-                continue
-
-            elif user_input.lower() == "/new":
-                agent = await clear()
-                continue
-
-            elif user_input.lower().startswith("/delete"):
-                if user_input.lower() == "/delete":
-                    console.print("\u2514 [bold red1]Please specify a chat ID to be deleted!")
+                elif user_input.lower() in ["/more", "/history"]:
+                    if replay is None or replay.memory_id != agent.memory.directory or not replay.has_more:
+                        console.print("\u2514 [bold]No earlier messages to show.")
+                        continue
+
+                    await to_pixeltable_thread(replay.load_newer) # Messages sent since resuming are shown again below the older ones
+                    await to_pixeltable_thread(replay.load_older)
+                    console.clear()
+                    welcome_message()
+                    replay.render()
                     continue
-                else:
-                    splitted_input = user_input.lower().split(" ")
 
-                    if splitted_input[0] != "/delete" or len(splitted_input) > 2:
-                        console.print("\u2514 [bold red1]Please use the correct command:[/bold red1]", end=" ")
-                        console.print("/delete [chat ID]", markup=False)
+                elif user_input.lower() in ["/clear", "/reset"]:
+                    await to_pixeltable_thread(agent.reset_memory)
+                    agent = await clear(idle_work=idle_work)
+                    continue
+
+                elif user_input.lower() == "/new":
+                    await asyncio.to_thread(agent.memory.flush)
+                    agent = await clear(idle_work=idle_work) # Usually set up while the user was typing
+                    continue
+
+                elif user_input.lower().startswith("/delete"):
+                    if user_input.lower() == "/delete":
+                        console.print("\u2514 [bold red1]Please specify a chat ID to be deleted!")
                         continue
                     else:
-                        memory_id = splitted_input[1]
-                        _, chat_ids = get_chat_history()
-                        if memory_id not in chat_ids:
-                            console.print("\u2514 [bold red1]Please specify a correct chat ID to be deleted!")
+                        splitted_input = user_input.lower().split(" ")
+
+                        if splitted_input[0] != "/delete" or len(splitted_input) > 2:
+                            console.print("\u2514 [bold red1]Please use the correct command:[/bold red1]", end=" ")
+                            console.print("/delete [chat ID]", markup=False)
                             continue
+                        else:
+                            memory_id = splitted_input[1]
+                            if not get_registry().contains(memory_id):
+                                console.print("\u2514 [bold red1]Please specify a correct chat ID to be deleted!")
+                                continue
 
-                        delete_conversation(agent, memory_id)
-                        console.print(f"\u2514 [bold green]Conversation {memory_id} deleted successfully.")
-
-                        # Handle case where user deletes the current chat or all chat history, we need to setup another memory table
-                        if agent.memory.directory == memory_id:
-                            console.print("\n[bold red]The current chat history was deleted. A new one will be created.\n")
-                            agent = Agent(
-                            model_name=settings.MODEL,
-                            tools=TOOLS,
-                            system_prompt=INSTRUCTIONS,
-                            mcp_servers_config=settings.MCP_CONFIG,
-                            )
-                            await agent.setup()
+                            await to_pixeltable_thread(delete_conversation, memory_id)
+                            console.print(f"\u2514 [bold green]Conversation {memory_id} deleted successfully.")
+
+                            # Handle case where user deletes the current chat or all chat history, we need to setup another memory table
+                            if agent.memory.directory == memory_id:
+                                console.print("\n[bold red]The current chat history was deleted. A new one will be created.\n")
+                                agent = await idle_work.new_agent()
+                            continue
+
+                elif user_input.lower().startswith("/search"):
+                    terms = user_input[len("/search"):].strip()
+                    if not user_input.lower().startswith("/search ") or not terms:
+                        console.print("\u2514 [bold red1]Please use the correct command:[/bold red1]", end=" ")
+                        console.print("/search [terms]", markup=False)
+                        continue
+
+                    await search_message(terms)
+                    continue
+
+                elif user_input.lower() == "/stats":
+                    stats_message()
+                    continue
+
+                elif user_input.lower().startswith("/ingest"):
+                    sources = user_input.split()[1:]
+                    if user_input.split()[0].lower() != "/ingest" or not sources:
+                        console.print("\u2514 [bold red]Usage:", end=" ")
+                        console.print("/ingest [URL or path] ...", markup=False)
                         continue
 
-            elif user_input.lower() == "/tools":
-                built_in_tools, tools, mcp_servers = agent.list_tools()
-                console.print("\u2514", end=" ")
-                if built_in_tools:
-                    console.print("[bold white]Built in tools:")
-                    for tool in built_in_tools:
-                        console.print(f"○ {tool}")
-                    console.print()
+                    from cli_agent.agent.ingestion import IngestionPipeline
+
+                    with console.status("[bold green]Ingesting...", spinner="dots"):
+                        ingestion_stats = await IngestionPipeline().run(sources)
+                    console.print(f"\u2514 [bold]{ingestion_stats.summary()}\n")
+                    continue
+
+                elif user_input.lower() == "/tools":
+                    built_in_tools, tools, mcp_servers = agent.list_tools()
+                    console.print("\u2514", end=" ")
+                    if built_in_tools:
+                        console.print("[bold white]Built in tools:")
+                        for tool in built_in_tools:
+                            console.print(f"○ {tool}")
+                        console.print()
                 
-                if tools:
-                    console.print("[bold white]Added tools:")
-                    for tool in tools:
-                        console.print(f"○ {tool}")
-                    console.print()
-
-                if mcp_servers:
-                    console.print("[bold white]MCP servers:")
-                    for server in mcp_servers:
-                        console.print(f"○ {server}")
-                    console.print()
-
-                continue
+                    if tools:
+                        console.print("[bold white]Added tools:")
+                        for tool in tools:
+                            console.print(f"○ {tool}")
+                        console.print()
+
+                    if mcp_servers:
+                        console.print("[bold white]MCP servers:")
+                        for server in mcp_servers:
+                            console.print(f"○ {server}")
+                        console.print()
+
+                    continue
             
-            if not user_input: # User types nothing or types only whitespaces then enters
-                continue
+                if not user_input: # User types nothing or types only whitespaces then enters
+                    continue
             
-            await stream_agent_interactions(agent, user_input)
-        except KeyboardInterrupt:
-            console.print("\n\u2514 [bold gold1]Please use '/exit' to quit!")
+                await stream_agent_interactions(agent, user_input, stream_tokens=settings.STREAM_TOKENS)
+            except KeyboardInterrupt:
+                await asyncio.to_thread(agent.memory.flush)
+                console.print("\n\u2514 [bold gold1]Please use '/exit' to quit!")
+    finally:
+        await asyncio.to_thread(agent.memory.flush)
+        try:
+            await idle_work.close()
+        except Exception as e:
+            logger.warning(f"Could not delete the prepared conversation: {e}")
+        await close_search()
+        try:
+            await get_mcp_manager(settings.MCP_CONFIG).close()
+        except Exception:
+            pass
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A helpful AI agent living in the CLI.")
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Print each agent step once it is finished instead of streaming the response tokens",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the model, even if LLM_CACHE_ENABLED is set",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="Print how long each import and initialization stage of the startup takes, and fail if the imports exceed STARTUP_IMPORT_BUDGET",
+    )
+    args = parser.parse_args()
+    profiler.enabled = args.startup_profile
+    if args.no_stream:
+        settings.STREAM_TOKENS = False
+    if args.no_cache:
+        settings.LLM_CACHE_ENABLED = False
+
+    logger.remove()
+    logger.add(sys.stderr, filter=idle_log_filter)
+
     try:
         asyncio.run(main())
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, EOFError, asyncio.CancelledError): # Ctrl-C or Ctrl-D at a prompt, or a closed terminal
         pass
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Thin client of the agent daemon (`daemon.py`).
+
+Only the standard library is imported so the client starts in a few tens of milliseconds, everything
+heavy lives in the daemon process.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+from typing import Any, Iterator, Optional
+
+# Same default as settings.DAEMON_SOCKET, the settings are not loaded to keep the startup fast
+DEFAULT_SOCKET = os.environ.get("DAEMON_SOCKET", ".cache/agent.sock")
+
+TODO_ICONS = {"pending": "⏳", "in_progress": "🔄", "completed": "✅"}
+
+
+class DaemonClient:
+    """Connection to the agent daemon, see `AgentDaemon` for the protocol."""
+    def __init__(self, socket_path: str):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._file = self._socket.makefile("rw", encoding="utf-8")
+
+    def request(self, request: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        """Send a request and yield its events until the last one."""
+        self._file.write(json.dumps(request, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+        while line := self._file.readline():
+            event = json.loads(line)
+            yield event
+            if event["type"] in ("attached", "done", "error"):
+                return
+        raise ConnectionError("The daemon closed the connection")
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+
+def print_events(events: Iterator[dict[str, Any]]) -> Optional[dict[str, Any]]:
+    """Print the events of a chat request as they arrive. Returns the last event."""
+    streaming = False
+    event = None
+    for event in events:
+        if event["type"] == "token":
+            if not streaming:
+                print("\nAssistant: ", end="")
+                streaming = True
+            print(event["text"], end="", flush=True)
+
+        elif event["type"] == "tool_call":
+            if streaming:
+                print()
+                streaming = False
+            print(f"🔹 Calling tool: {event['name']}")
+
+        elif event["type"] == "response":
+            if not streaming:
+                print(f"\nAssistant: {event['content']}")
+            streaming = False
+
+        elif event["type"] == "todos":
+            print("└ Updated to-do list")
+            for task in event["todos"]:
+                print(TODO_ICONS.get(task["status"], "⏳"), task["content"])
+
+        elif event["type"] == "tool_result":
+            print(f"└ {event['content']}")
+
+        elif event["type"] == "error":
+            print(f"\n❌ Encountered error: {event['message']}", file=sys.stderr)
+
+        elif event["type"] == "done" and event.get("first_token_latency") is not None:
+            print(f"\nFirst token in {event['first_token_latency']:.2f}s, response in {event['elapsed']:.2f}s\n")
+
+    return event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat with the agent running in the daemon.")
+    parser.add_argument("message", nargs="?", help="Send a single message and exit instead of starting a chat loop")
+    parser.add_argument("-r", "--resume", metavar="CHAT_ID", help="Attach to an existing conversation")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Path of the daemon's Unix socket")
+    parser.add_argument("--stop", action="store_true", help="Stop the daemon")
+    args = parser.parse_args()
+
+    try:
+        client = DaemonClient(args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.exit(f"The daemon is not running, start it with `uv run src/cli_agent/daemon.py` (socket: {args.socket})")
+
+    try:
+        if args.stop:
+            list(client.request({"type": "shutdown"}))
+            return
+
+        attached = list(client.request({"type": "attach", "memory_id": args.resume}))[-1]
+        if attached["type"] == "error":
+            sys.exit(f"❌ {attached['message']}")
+        for message in attached["history"]:
+            print(f"{'You' if message['role'] == 'user' else 'Assistant'}: {message['content']}\n")
+
+        if args.message:
+            print_events(client.request({"type": "chat", "message": args.message}))
+            return
+
+        print(f"Attached to conversation {attached['memory_id']}, type '/exit' to quit")
+        while True:
+            try:
+                user_input = input("You: ").strip()
+            except EOFError:
+                break
+            if user_input.lower() == "/exit":
+                break
+            if user_input:
+                print_events(client.request({"type": "chat", "message": user_input}))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -7,18 +8,92 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", extra="ignore", env_file_encoding="utf-8")
     TAVILY_API_KEY: str
 
+    # --- STARTUP ---
+    STARTUP_IMPORT_BUDGET: float = 1.0 # Seconds the imports before the welcome banner may take, 0 to disable the check
+
     # --- MODEL NAME ---
     MODEL: str = "openai:gpt-5-nano-2025-08-07"
 
+    # --- MODEL ROUTER ---
+    ROUTER_TIERS: list[str] = [] # Cheaper models tried before MODEL, the cheapest first. Empty to always use MODEL
+    ROUTER_LONG_PROMPT_TOKENS: int = 400 # A longer user message is routed as the most complex
+    ROUTER_DEEP_STEPS: int = 4 # Tool loop steps after which a turn is routed as the most complex
+    ROUTER_HOLDBACK_CHARS: int = 80 # Streamed characters checked before release while a stronger tier is left
+
     # --- MODEL PROVIDERS ---
     OPENAI_API_KEY: str
     ANTHROPIC_API_KEY: str
 
     # --- MEMORY CONFIGURATION ---
-    MEMORY_SIZE: int = 20
+    MEMORY_TOKEN_BUDGET: int = 8000
+    SUMMARY_MODEL: str = "openai:gpt-5-nano-2025-08-07"
+    MEMORY_CACHE_SIZE: int = 200
+    FILES_CACHE_SIZE: int = 64 # Contents of the agent's files kept in memory, the others are read when a tool opens them
+    HISTORY_PAGE_SIZE: int = 20
+    RESUME_EXCHANGES: int = 5 # Latest user and assistant message pairs shown on resume, /more shows as many older ones
+    REGISTRY_PATH: str = ".cache/conversation_registry.sqlite" # Saved conversations, replaces conversation_history.json
+
+    # --- EMBEDDINGS ---
+    # Sentence Transformers model id of the recall and knowledge indexes, e.g. sentence-transformers/all-MiniLM-L6-v2,
+    # installed with the recall extra. If empty, a local hashing embedding only matches messages sharing words (lexical recall)
+    EMBEDDING_MODEL: str = ""
+
+    # --- SEMANTIC RECALL ---
+    RECALL_TOP_K: int = 3 # Relevant past messages added to the context window, 0 to disable the recall index
+    RECALL_SCOPE: Literal["conversation", "all"] = "conversation" # "all" also recalls the messages of the other conversations
+    RECALL_MIN_SCORE: float = 0.2
+    RECALL_TIMEOUT_MS: int = 200 # Recall is skipped for the turn when the search takes longer
+
+    # --- KNOWLEDGE INGESTION ---
+    INGEST_CHUNK_SIZE: int = 1500 # Characters
+    INGEST_CHUNK_OVERLAP: int = 200
+    INGEST_BATCH_SIZE: int = 256 # Chunks embedded and inserted at once
+    INGEST_FETCH_CONCURRENCY: int = 8
+
+    # --- STREAMING ---
+    STREAM_TOKENS: bool = True
+    STREAM_REFRESH_RATE: float = 10
+
+    # --- BATCH MODE ---
+    BATCH_CONCURRENCY: int = 4
+
+    # --- SESSIONS ---
+    SESSION_MAX_CONCURRENT_TURNS: int = 4
+    SESSION_MAX_QUEUED_TURNS: int = 8
+    SESSION_MAX_LOADED: int = 32
+
+    # --- DAEMON ---
+    DAEMON_SOCKET: str = ".cache/agent.sock" # Also read by client.py, which doesn't load the settings to start fast
+
+    # --- TOOLS ---
+    TOOL_THREAD_POOL_SIZE: int = 8 # Threads running the synchronous tools
+    TOOL_MAX_CONCURRENCY: int = 4 # Concurrent calls of each tool
+    TOOL_TIMEOUT: float = 120.0
+    TOOL_CONCURRENCY_LIMITS: dict[str, int] = {} # Per tool name, e.g. TOOL_CONCURRENCY_LIMITS='{"internet_search": 2}'
+    TOOL_TIMEOUTS: dict[str, float] = {} # Per tool name
+
+    # --- TRACING ---
+    TRACING_ENABLED: bool = True
+    TRACE_EXPORT_PATH: str = "" # Opt-in, OTLP JSON file the traces are appended to, one trace per line, e.g. .cache/traces.jsonl
+    TRACE_EXPORT_MAX_BYTES: int = 10_000_000 # The export file is rotated to <path>.1 past this size
+
+    # --- SEARCH CACHE ---
+    SEARCH_CACHE_TTL: int = 3600
+    SEARCH_CACHE_SIZE: int = 256
+
+    # --- LLM RESPONSE CACHE ---
+    LLM_CACHE_ENABLED: bool = False # Opt-in, identical model calls are answered from the cache
+    LLM_CACHE_PATH: str = ".cache/llm_cache.sqlite"
+    LLM_CACHE_TTL: int = 86400
+    LLM_CACHE_SIZE: int = 1000
+
+    # --- FULL-TEXT SEARCH ---
+    SEARCH_INDEX_PATH: str = ".cache/message_search.sqlite"
+    SEARCH_RESULTS: int = 10 # Conversations listed by /search
 
     # --- MCP Servers ---
     MCP_CONFIG: str
+    MCP_TIMEOUT: float = 30.0
 
     # --- PIXELTABLE SETTINGS ---
     PIXELTABLE_HOME: str
@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+from loguru import logger
+
+from cli_agent.config import get_settings
+
+if TYPE_CHECKING:
+    from cli_agent.agent.sessions import Session, SessionManager
+
+logger = logger.bind(name="Agent Daemon")
+settings = get_settings()
+
+HISTORY_PREVIEW_SIZE = 10 # Messages sent back when attaching to an existing conversation
+
+
+def chunk_to_events(chunk: dict[str, Any]) -> list[dict[str, Any]]:
+    """Convert a chunk streamed by `Agent.chat` to the JSON events sent to the clients."""
+    if chunk.get("token"):
+        return [{"type": "token", "text": chunk["token"]}]
+
+    if chunk.get("agent"):
+        agent_message = chunk["agent"]["messages"][0]
+        if agent_message.tool_calls:
+            return [{"type": "tool_call", "name": tool_call["name"]} for tool_call in agent_message.tool_calls]
+        return [{"type": "response", "content": agent_message.content}]
+
+    if chunk.get("tools"):
+        tool_message = chunk["tools"]["messages"][0]
+        if tool_message.name == "write_todos":
+            return [{"type": "todos", "todos": chunk["tools"]["todos"]}]
+        return [{"type": "tool_result", "name": tool_message.name, "content": str(tool_message.content)}]
+
+    return []
+
+
+class AgentDaemon:
+    """
+    Long-running process keeping Pixeltable, the MCP sessions and the compiled graph warm for thin clients.
+
+    Clients connect to a Unix socket and exchange one JSON object per line. A client first sends
+    `{"type": "attach", "memory_id": ...}` (a new conversation if no ID) and then
+    `{"type": "chat", "message": ...}` requests, each answered by a stream of events ending with a
+    `done` or `error` event. Several clients can attach to different conversations at the same time,
+    the conversations are driven by a `SessionManager`.
+
+    Args:
+        socket_path (Path): Path of the Unix socket to listen on
+        session_manager (SessionManager): Sessions of the clients, a new manager is created on warmup if not provided
+    """
+    def __init__(self, socket_path: Path, session_manager: Optional["SessionManager"] = None):
+        self.socket_path = socket_path
+        self.session_manager = session_manager
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stopped = asyncio.Event()
+
+    async def warm_up(self):
+        """Initialize Pixeltable, connect the MCP servers and compile the graph before accepting clients."""
+        import pixeltable as pxt
+        from cli_agent.agent.mcp_manager import get_mcp_manager
+        from cli_agent.agent.memory import to_pixeltable_thread
+        from cli_agent.agent.registry import reconcile_conversations
+        from cli_agent.agent.sessions import SessionManager
+
+        start = time.perf_counter()
+        await to_pixeltable_thread(pxt.init)
+        await to_pixeltable_thread(reconcile_conversations) # Also opens the catalog and the indexes
+        try:
+            get_mcp_manager(settings.MCP_CONFIG).connect()
+        except Exception:
+            pass # Reported when the agent loads its MCP tools
+
+        self.session_manager = self.session_manager or SessionManager()
+        await self.session_manager.prepare()
+        logger.info(f"Daemon warmed up in {time.perf_counter() - start:.2f}s")
+
+    async def serve(self):
+        await self.warm_up()
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self.socket_path.unlink(missing_ok=True) # Left behind by a daemon that did not exit cleanly
+        self._server = await asyncio.start_unix_server(self._handle_client, path=str(self.socket_path), limit=2**24)
+        os.chmod(self.socket_path, 0o600) # Only the user running the daemon can talk to it
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopped.set)
+
+        logger.info(f"Listening on {self.socket_path}")
+        async with self._server:
+            await self._stopped.wait()
+        await self.close()
+
+    async def close(self):
+        from cli_agent.agent.mcp_manager import get_mcp_manager
+        from cli_agent.agent.search import close_search
+
+        self.socket_path.unlink(missing_ok=True)
+        await self.session_manager.close()
+        await close_search()
+        try:
+            await get_mcp_manager(settings.MCP_CONFIG).close()
+        except Exception:
+            pass
+        logger.info("Daemon stopped")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        from cli_agent.agent.memory import CHAT_ROLES
+
+        session = None
+
+        async def send(event: dict[str, Any]):
+            writer.write((json.dumps(event, ensure_ascii=False) + "\n").encode())
+            await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                try:
+                    if request["type"] == "attach":
+                        previous, session = session, await self.session_manager.open_session(request.get("memory_id"))
+                        if previous is not None:
+                            self.session_manager.close_session(previous)
+                        history = []
+                        if request.get("memory_id"):
+                            history = await asyncio.to_thread(session.agent.memory.get_latest_memory, HISTORY_PREVIEW_SIZE)
+                        await send({
+                            "type": "attached",
+                            "memory_id": session.memory_id,
+                            "history": [{"role": record.role, "content": record.content} for record in history if record.role in CHAT_ROLES],
+                        })
+
+                    elif request["type"] == "chat":
+                        if session is None:
+                            raise ValueError("Attach to a conversation before chatting")
+                        await self._chat(session, request["message"], send)
+
+                    elif request["type"] == "shutdown":
+                        await send({"type": "done"})
+                        self._stopped.set()
+
+                    else:
+                        raise ValueError(f"Unknown request type '{request['type']}'")
+                except (ValueError, KeyError, RuntimeError) as e:
+                    await send({"type": "error", "message": str(e)})
+                except Exception as e:
+                    # A failed turn (Pixeltable, network or model API error) ends the request, not the connection.
+                    # If the client is the one gone, sending fails and the connection is closed below
+                    logger.exception(f"Request '{request.get('type')}' failed")
+                    await send({"type": "error", "message": f"{type(e).__name__}: {e}"})
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logger.warning(f"Client disconnected: {e}")
+        finally:
+            if session is not None:
+                self.session_manager.close_session(session)
+            writer.close()
+
+    async def _chat(self, session: "Session", message: str, send):
+        """Stream one turn to the client. Turns of the same conversation from several clients are queued."""
+        start = time.perf_counter()
+        first_token_latency = None
+
+        async for chunk in self.session_manager.chat(session, message, stream_tokens=True):
+            if chunk.get("token") and first_token_latency is None:
+                first_token_latency = time.perf_counter() - start
+            for event in chunk_to_events(chunk):
+                await send(event)
+
+        await send({
+            "type": "done",
+            "first_token_latency": first_token_latency,
+            "elapsed": time.perf_counter() - start,
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the agent warm in the background for `client.py` to connect to.")
+    parser.add_argument("--socket", default=settings.DAEMON_SOCKET, help="Path of the Unix socket to listen on")
+    args = parser.parse_args()
+
+    asyncio.run(AgentDaemon(Path(args.socket)).serve())
@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+from dotenv import load_dotenv
+load_dotenv()
+
+from loguru import logger
+
+from cli_agent.config import get_settings
+
+logger = logger.bind(name="Knowledge Ingestion")
+settings = get_settings()
+
+
+async def ingest(sources: list[str], **pipeline_options):
+    """
+    Ingest web pages, text files and directories into the knowledge base.
+
+    Args:
+        sources (list[str]): URLs, files or directories
+        pipeline_options: Options of `IngestionPipeline`
+    """
+    import pixeltable as pxt
+    from cli_agent.agent.ingestion import IngestionPipeline
+    from cli_agent.agent.memory import to_pixeltable_thread
+
+    await to_pixeltable_thread(pxt.init)
+    return await IngestionPipeline(**pipeline_options).run(sources)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest web pages and local files into the knowledge base searched by the agent.")
+    parser.add_argument("sources", nargs="+", help="URLs, text files or directories of text files")
+    parser.add_argument("-c", "--concurrency", type=int, default=settings.INGEST_FETCH_CONCURRENCY, help="Maximum number of documents fetched at the same time")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE, help="Number of chunks embedded and inserted at once")
+    parser.add_argument("--chunk-size", type=int, default=settings.INGEST_CHUNK_SIZE, help="Maximum size of a chunk, in characters")
+    parser.add_argument("--chunk-overlap", type=int, default=settings.INGEST_CHUNK_OVERLAP, help="Characters shared by consecutive chunks")
+    args = parser.parse_args()
+
+    stats = asyncio.run(
+        ingest(
+            args.sources,
+            fetch_concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+        )
+    )
+    if stats.failed:
+        raise SystemExit(1)
@@ -0,0 +1,76 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
+
+from loguru import logger
+
+# Imported by the CLI before anything else, so the time of its own imports is measured
+if TYPE_CHECKING:
+    from rich.console import Console
+
+logger = logger.bind(name="Startup Profiler")
+
+
+class StartupProfiler:
+    """Record how long each import and initialization stage of the CLI startup takes."""
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.import_time: Optional[float] = None # Seconds spent importing before the welcome banner
+        self._start = time.perf_counter()
+        self._stages: list[tuple[str, str, float, float]] = [] # Name, thread, start offset, duration
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self._stages.append((name, threading.current_thread().name, start - self._start, end - start))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def imports_done(self):
+        """Record the time spent importing, everything the welcome banner waits for."""
+        self.import_time = self.elapsed()
+        with self._lock:
+            self._stages.append(("import cli", threading.current_thread().name, 0.0, self.import_time))
+
+    def within_import_budget(self, budget: float) -> bool:
+        """
+        Check the imports before the welcome banner against a budget, warning when it is exceeded.
+
+        Args:
+            budget (float): Seconds the imports may take, 0 to disable the check
+        """
+        if budget <= 0 or self.import_time is None or self.import_time <= budget:
+            return True
+        logger.warning(
+            f"The CLI imports took {self.import_time:.3f}s before the welcome banner, over the {budget:.3f}s "
+            "STARTUP_IMPORT_BUDGET. A heavy module is probably imported at module level instead of on first use"
+        )
+        return False
+
+    def report(self, console: "Console"):
+        """Print the stages in the order they started. Stages from different threads overlap."""
+        from rich.table import Table
+
+        table = Table(title=f"Startup profile - ready in {self.elapsed():.3f}s", title_justify="left")
+        table.add_column("Stage")
+        table.add_column("Thread", style="dim")
+        table.add_column("Start (s)", justify="right")
+        table.add_column("Duration (s)", justify="right")
+
+        with self._lock:
+            stages = sorted(self._stages, key=lambda stage: stage[2])
+        for name, thread, start, duration in stages:
+            table.add_row(name, thread, f"{start:.3f}", f"{duration:.3f}")
+
+        console.print(table)
+
+
+profiler = StartupProfiler()
@@ -0,0 +1,96 @@
+import time
+from typing import Optional
+
+from rich.console import Console, RenderableType
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.padding import Padding
+
+
+class MarkdownStream:
+    """
+    Render a Markdown response token by token in a Rich Live region.
+
+    Completed blocks (the text before a blank line outside of a code fence) are printed once above the
+    live region and never rendered again, only the block being written is re-rendered. The live region
+    is refreshed at most `refresh_rate` times per second, so the rendering cost of a token does not grow
+    with the length of the response.
+
+    Args:
+        console (Console): Console to render to
+        refresh_rate (float): Maximum number of live region refreshes per second
+    """
+    def __init__(self, console: Console, refresh_rate: float = 10):
+        self.console = console
+        self.min_interval = 1 / refresh_rate
+        self.refreshes = 0
+
+        self._live: Optional[Live] = None
+        self._pending = "" # Text of the block being written
+        self._scan_pos = 0 # Start of the first line of the pending text that was not scanned yet
+        self._in_fence = False
+        self._blocks = 0 # Number of blocks already printed
+        self._last_refresh = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._live is not None
+
+    def start(self):
+        self._live = Live(console=self.console, auto_refresh=False, vertical_overflow="visible")
+        self._live.start()
+
+    def update(self, text: str):
+        """Append streamed text and refresh the live region if the last refresh is old enough."""
+        if self._live is None:
+            self.start()
+
+        self._pending += text
+        self._commit_completed_blocks()
+
+        now = time.perf_counter()
+        if now - self._last_refresh >= self.min_interval:
+            self._refresh(now)
+
+    def stop(self):
+        """Render the rest of the text and leave it on the screen."""
+        if self._live is None:
+            return
+
+        self._refresh(time.perf_counter())
+        self._live.stop()
+        self._live = None
+
+    def _commit_completed_blocks(self):
+        """Print the blocks ended by a blank line, scanning each complete line only once."""
+        boundary = None
+        while True:
+            line_end = self._pending.find("\n", self._scan_pos)
+            if line_end == -1:
+                break
+
+            line = self._pending[self._scan_pos:line_end].strip()
+            if line.startswith(("```", "~~~")):
+                self._in_fence = not self._in_fence
+            elif not line and not self._in_fence:
+                boundary = line_end + 1
+            self._scan_pos = line_end + 1
+
+        if boundary is None:
+            return
+
+        block = self._pending[:boundary].strip()
+        self._pending = self._pending[boundary:]
+        self._scan_pos -= boundary
+        if block:
+            self._live.console.print(self._render(block)) # Printed above the live region
+            self._blocks += 1
+
+    def _render(self, text: str) -> RenderableType:
+        markdown = Markdown(text)
+        return Padding(markdown, (1, 0, 0, 0)) if self._blocks else markdown
+
+    def _refresh(self, now: float):
+        self._live.update(self._render(self._pending.strip()) if self._pending.strip() else "", refresh=True)
+        self._last_refresh = now
+        self.refreshes += 1
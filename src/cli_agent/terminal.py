@@ -0,0 +1,107 @@
+import asyncio
+import signal
+import threading
+from typing import Any, Callable, Optional
+
+from rich.console import Console
+from rich.prompt import Prompt
+
+
+class TerminalInput:
+    """
+    Read the user's input without blocking the event loop.
+
+    `Prompt.ask` and `cutie.select` block until the user answers, so each read runs on its own daemon
+    thread while the loop keeps running the background tasks: memory writes, summaries, MCP connections
+    and prefetching. Ctrl-C at a prompt raises `KeyboardInterrupt` in the awaiting coroutine like a
+    blocking prompt would, and the line the user goes on typing is returned by the next `ask`.
+
+    Args:
+        console (Console): Console the prompts are printed on
+    """
+    def __init__(self, console: Console):
+        self.console = console
+        self._pending: Optional[asyncio.Future] = None # Prompt interrupted before the user pressed enter
+        self._interrupt: Optional[asyncio.Future] = None
+
+    async def ask(self, prompt: str) -> str:
+        """Ask for a line of input with `Prompt.ask`."""
+        if self._pending is None:
+            self._pending = self._start(Prompt.ask, prompt, console=self.console)
+        else:
+            self.console.print(f"{prompt}: ", end="") # The interrupted read is still waiting for its line
+        line = await self._wait(self._pending)
+        self._pending = None
+        return line
+
+    async def select(self, options: list[str]) -> int:
+        """Let the user pick an option with `cutie.select`, which raises `KeyboardInterrupt` itself on Ctrl-C."""
+        import cutie
+
+        if self._pending is not None:
+            raise RuntimeError("A prompt is still reading the terminal")
+        return await self._wait(self._start(cutie.select, options))
+
+    def interrupt(self) -> bool:
+        """
+        Interrupt the read being awaited, like Ctrl-C does.
+
+        Returns:
+            Whether a read was being awaited
+        """
+        if self._interrupt is None or self._interrupt.done():
+            return False
+        self._interrupt.set_result(None)
+        return True
+
+    def _start(self, read: Callable, *args: Any, **kwargs: Any) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result: Any, error: Optional[BaseException]):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def run():
+            try:
+                result, error = read(*args, **kwargs), None
+            except BaseException as e:
+                result, error = None, e
+            try:
+                loop.call_soon_threadsafe(resolve, result, error)
+            except RuntimeError:
+                pass # The loop is closed, the application exited while the user was typing
+
+        # A daemon thread never keeps the application alive while it waits for the terminal
+        threading.Thread(target=run, name="terminal-input", daemon=True).start()
+        return future
+
+    async def _wait(self, read: asyncio.Future) -> Any:
+        """Wait for a read, or raise `KeyboardInterrupt` when the user presses Ctrl-C first."""
+        loop = asyncio.get_running_loop()
+        self._interrupt = loop.create_future()
+        # Ctrl-C goes to the main thread, running the loop, instead of the reading thread
+        previous_handler = signal.getsignal(signal.SIGINT)
+        try:
+            loop.add_signal_handler(signal.SIGINT, self.interrupt)
+            handled = True
+        except (NotImplementedError, RuntimeError, ValueError):
+            handled = False # Not supported by the Windows event loops, nor outside of the main thread
+
+        try:
+            await asyncio.wait([read, self._interrupt], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if handled:
+                loop.remove_signal_handler(signal.SIGINT)
+                if previous_handler is not None:
+                    signal.signal(signal.SIGINT, previous_handler) # Ctrl-C during a turn keeps its usual behavior
+            interrupted = self._interrupt.done()
+            self._interrupt = None
+
+        if not read.done() and interrupted:
+            raise KeyboardInterrupt
+        return read.result()
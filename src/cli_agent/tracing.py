@@ -0,0 +1,215 @@
+import functools
+import inspect
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from loguru import logger
+
+from cli_agent.config import get_settings
+
+logger = logger.bind(name="Tracing")
+
+STAGE_HISTORY_SIZE = 1000 # Durations kept per stage for the percentiles
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation of a trace, with its attributes."""
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.end_ns: Optional[int] = None
+        self.duration: Optional[float] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        self.duration = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1, # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """
+    Span-based timing of the agent turns.
+
+    Spans nest through a context variable, so a span started inside another one (including in tasks
+    and `asyncio.to_thread` calls started from it) becomes its child. The durations of every stage are
+    kept for `stats`, and each finished trace is appended to `export_path` as one OTLP JSON line
+    (an `ExportTraceServiceRequest`), which OpenTelemetry tools can load without a collector. Past
+    `max_export_bytes` the file is renamed to `<export_path>.1`, replacing the previous one, so the
+    export never keeps more than twice that size.
+
+    Args:
+        enabled (bool): Record spans, the tracing methods are no-ops otherwise
+        export_path (Path): JSON lines file the traces are appended to, not exported if not provided
+        max_export_bytes (int): Size of the export file after which it is rotated, never rotated if 0
+        service_name (str): Service name of the exported resource
+    """
+    def __init__(self, enabled: bool = True, export_path: Optional[Path] = None, max_export_bytes: int = 0, service_name: str = "cli-agent"):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.max_export_bytes = max_export_bytes
+        self.service_name = service_name
+
+        self._stages: dict[str, deque[float]] = {}
+        self._traces: dict[str, list[Span]] = {} # Finished spans of the traces whose root is still running
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        """Start a span without making it current, for spans started and ended by callbacks."""
+        span = Span(name, parent=parent if parent is not None else _current_span.get(), attributes=attributes)
+        if span.parent_id is None and self.enabled:
+            with self._lock:
+                self._traces[span.trace_id] = []
+        return span
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.end(error)
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._stages.setdefault(span.name, deque(maxlen=STAGE_HISTORY_SIZE)).append(span.duration)
+            if span.parent_id is None:
+                trace = self._traces.pop(span.trace_id, []) + [span]
+            elif span.trace_id in self._traces:
+                self._traces[span.trace_id].append(span)
+                return
+            else:
+                trace = [span] # Ended after its root, e.g. in a task outliving the turn, exported on its own
+
+        self._export(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time the enclosed block as a child of the current span."""
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                pass # An async generator closed from another context, like on garbage collection
+
+    def observe(self, stage: str, seconds: float):
+        """Record the duration of a stage that is not a single span, like the time to the first token."""
+        if self.enabled:
+            with self._lock:
+                self._stages.setdefault(stage, deque(maxlen=STAGE_HISTORY_SIZE)).append(seconds)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Get the number of calls, p50 and p95 in milliseconds of every stage recorded in this process."""
+        with self._lock:
+            stages = {stage: sorted(durations) for stage, durations in self._stages.items()}
+
+        stats = {}
+        for stage, durations in stages.items():
+            durations_ms = [duration * 1000 for duration in durations]
+            percentiles = statistics.quantiles(durations_ms, n=100, method="inclusive") if len(durations_ms) > 1 else durations_ms * 99
+            stats[stage] = {"count": len(durations_ms), "p50": percentiles[49], "p95": percentiles[94]}
+        return stats
+
+    def _export(self, spans: list[Span]):
+        if self.export_path is None:
+            return
+
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": _otlp_value(self.service_name)}]},
+                "scopeSpans": [{
+                    "scope": {"name": "cli_agent"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+        try:
+            self.export_path.parent.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                if self.max_export_bytes and self.export_path.exists() and self.export_path.stat().st_size >= self.max_export_bytes:
+                    self.export_path.replace(self.export_path.with_name(self.export_path.name + ".1"))
+                with open(self.export_path, "a") as f:
+                    f.write(json.dumps(request) + "\n")
+        except IOError as e:
+            logger.error(f"Could not export trace to {self.export_path}: {e}")
+
+
+def traced(name: str) -> Callable:
+    """Decorator timing every call of a function or coroutine function as a span."""
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with get_tracer().span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+@lru_cache(maxsize=1)
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer."""
+    settings = get_settings()
+    return Tracer(
+        enabled=settings.TRACING_ENABLED,
+        export_path=Path(settings.TRACE_EXPORT_PATH) if settings.TRACE_EXPORT_PATH else None,
+        max_export_bytes=settings.TRACE_EXPORT_MAX_BYTES,
+    )
@@ -1,93 +1,166 @@
-import json
 from datetime import datetime, timedelta
 from typing import Optional
 
 import pixeltable as pxt
-from rich.console import Console
+from rich.console import Console, Group
+from rich.markdown import Markdown
+from rich.segment import Segment, Segments
+from rich.text import Text
 
-from cli_agent.agent.main_agent import Agent
-from cli_agent.agent.memory import logger
+from cli_agent.config import get_settings
+from cli_agent.agent.catalog import get_catalog
+from cli_agent.agent.memory import get_memory_writer, on_pixeltable_thread
+from cli_agent.agent.message_search import SearchHit, get_message_search_index
+from cli_agent.agent.registry import remove_conversation
 
+settings = get_settings()
 
-def get_chat_history() -> Optional[tuple[list[str], list[str]]]:
-    if not pxt.list_dirs():
-        return [], []
 
-    ids_with_timestamp = {} # Key: memory directory. Value: Latest message's timestamp
-    
-    for dir in pxt.list_dirs():
-        memory_table = pxt.get_table(f"{dir}.memory")
-        if memory_table.collect():
-            latest_msg_timestamp = memory_table.collect()[-1]["timestamp"]
-            ids_with_timestamp[dir] = latest_msg_timestamp
-        
-        # Handle newly created table with no messages
-        else:
-            creation_time = memory_table.history()["created_at"][0]
-            local_timestamp = creation_time.to_pydatetime().astimezone()
-            ids_with_timestamp[dir] = local_timestamp
-
-    sorted_ids = list(reversed(sorted(ids_with_timestamp.keys(), key=ids_with_timestamp.get)))
+@on_pixeltable_thread
+def get_chat_history(
+    limit: Optional[int] = None,
+    before: Optional[tuple[datetime, str]] = None
+) -> tuple[list[str], list[str], Optional[tuple[datetime, str]]]:
+    """
+    List past conversations from the conversation catalog, most recently modified first.
+
+    The catalog is synced with the Pixeltable directories when the CLI starts, then kept current by the
+    memory writer and `delete_conversation`, so listing a page is a single query.
+
+    Args:
+        limit (int): Page size, all conversations are returned if not provided
+        before (tuple[datetime, str]): Cursor returned by the previous call to fetch the next page
+
+    Returns:
+        Display options, memory IDs and the cursor of the next page (None if this is the last page).
+    """
+    get_memory_writer().flush() # Make sure the catalog is up to date with the queued records
+    conversations = get_catalog().list_conversations(limit=limit, before=before)
 
     latest_user_msgs = [] # Only display the latest user message and last modified time
-    for dir in sorted_ids:
-        memory_table = pxt.get_table(f"{dir}.memory")
-
-        if memory_table.collect():
-            latest_timestamp = memory_table.collect()[-1]["timestamp"]
-            for record in reversed(memory_table.collect()):
-                if record["role"] == "user":
-                    time_string = format_elapsed_time(
-                        elapsed_timedelta=(datetime.now().astimezone() - latest_timestamp)
-                    )
-                    latest_user_msgs.append(f"{dir} - Modified {time_string} - {record["content"]}")
-                    break
-
-        # Handle newly created table with no messages
-        else:
-            creation_time = memory_table.history()["created_at"][0]
-            local_timestamp = creation_time.to_pydatetime().astimezone()
-            time_string = format_elapsed_time(
-                elapsed_timedelta=datetime.now().astimezone() - local_timestamp
-            )
-            latest_user_msgs.append(f"{dir} - Modified {time_string} - No prompt")
-
-    return latest_user_msgs, sorted_ids
-
-
-def print_past_conversation(memory_id: str, console: Console):
-    """Print user prompts and final agent responses of the resumed conversation."""
-    memory_table = pxt.get_table(f"{memory_id}.memory")
-    for record in memory_table.collect():
-        if record["role"] == "user":
-            console.print(f"[bold cornflower_blue]You[/bold cornflower_blue]: {record["content"]}")
-        elif record["role"] == "assistant":
-            console.print(f"\n[bold dark_red]Assistant[/bold dark_red]: {record["content"]}\n")
-
-
-def delete_conversation(agent: Agent, memory_id: str):
+    for conversation in conversations:
+        time_string = format_elapsed_time(
+            elapsed_timedelta=datetime.now().astimezone() - conversation.last_modified
+        )
+        latest_user_msgs.append(
+            f"{conversation.memory_id} - Modified {time_string} - {conversation.latest_prompt or "No prompt"}"
+        )
+
+    next_cursor = None
+    if limit is not None and len(conversations) == limit:
+        next_cursor = (conversations[-1].last_modified, conversations[-1].memory_id)
+
+    return latest_user_msgs, [conversation.memory_id for conversation in conversations], next_cursor
+
+
+def search_conversations(terms: str, limit: int = settings.SEARCH_RESULTS) -> list[SearchHit]:
+    """
+    Full-text search of the messages of every conversation.
+
+    Only the SQLite index is queried: it follows the conversation registry, checked when the CLI starts,
+    and the queued records are only found once the memory writer has written them.
+
+    Args:
+        terms (str): Words the messages must all contain
+        limit (int): Maximum number of conversations returned
+
+    Returns:
+        Best matching message of each conversation, from the best to the worst match.
+    """
+    return get_message_search_index().search(terms, limit)
+
+
+class ConversationReplay:
+    """
+    Replay of a resumed conversation, from its latest messages back to older pages on demand.
+
+    Each page is one query for the `page_size` user and assistant messages older than the ones already
+    shown, so resuming takes the same time whatever the length of the conversation. Messages are
+    rendered once, assistant responses as Markdown, and the rendered lines are kept so showing the
+    conversation again with an older page doesn't render it again.
+
+    Args:
+        memory_id (str): Pixeltable directory of the conversation
+        console (Console): Console the messages are printed to
+        page_size (int): Messages fetched per page
+    """
+    def __init__(self, memory_id: str, console: Console, page_size: int = settings.RESUME_EXCHANGES * 2):
+        self.memory_id = memory_id
+        self.console = console
+        self.page_size = page_size
+        self.has_more = True
+
+        self._records: list[dict] = [] # Loaded messages, the oldest first
+        self._rendered: dict[tuple[str, int], list[Segment]] = {} # Rendered lines per message ID and console width
+
+    def load_older(self) -> int:
+        """
+        Fetch the page of messages preceding the ones already loaded.
+
+        Returns:
+            Number of messages fetched
+        """
+        before = self._records[0]["timestamp"] if self._records else None
+        page = self._query(before=before, limit=self.page_size + 1)
+        self.has_more = len(page) > self.page_size # One extra message tells whether there is an older page
+        page = page[:self.page_size]
+        self._records = page[::-1] + self._records
+        return len(page)
+
+    def load_newer(self) -> int:
+        """
+        Fetch the messages sent since the conversation was resumed.
+
+        Returns:
+            Number of messages fetched
+        """
+        if not self._records:
+            return self.load_older()
+        page = self._query(after=self._records[-1]["timestamp"])
+        self._records += page[::-1]
+        return len(page)
+
+    @on_pixeltable_thread
+    def _query(self, before: Optional[datetime] = None, after: Optional[datetime] = None, limit: Optional[int] = None) -> list[dict]:
+        """Get the user and assistant messages between two times, the newest first."""
+        get_memory_writer().flush()
+        memory_table = pxt.get_table(f"{self.memory_id}.memory")
+        condition = memory_table.role.isin(["user", "assistant"])
+        if before is not None:
+            condition = condition & (memory_table.timestamp < before)
+        if after is not None:
+            condition = condition & (memory_table.timestamp > after)
+        query = memory_table.where(condition).order_by(memory_table.timestamp, asc=False)
+        if limit is not None:
+            query = query.limit(limit)
+        return list(query.select(
+            memory_table.message_id, memory_table.role, memory_table.content, memory_table.timestamp
+        ).collect())
+
+    def render(self):
+        """Print the loaded messages, preceded by a hint when older ones are not loaded yet."""
+        if self.has_more:
+            self.console.print("[dim gray100]Earlier messages are hidden, type /more to show them.\n")
+        for record in self._records:
+            self.console.print(Segments(self._render_message(record)))
+
+    def _render_message(self, record: dict) -> list[Segment]:
+        key = (record["message_id"], self.console.width)
+        if key not in self._rendered:
+            if record["role"] == "user":
+                renderable = Text.assemble(("You", "bold cornflower_blue"), ": ", record["content"])
+            else:
+                renderable = Group(Text("\nAssistant:", style="bold dark_red"), Markdown(record["content"]), Text())
+            self._rendered[key] = list(self.console.render(renderable))
+        return self._rendered[key]
+
+
+@on_pixeltable_thread
+def delete_conversation(memory_id: str):
     """Delete a specific conversation."""
+    get_memory_writer().flush()
     pxt.drop_dir(memory_id, force=True)
-
-    # Remove from .cache file
-    cache_dir = agent.memory.cache_file_path
-    if not cache_dir.exists():
-        return
-
-    try:
-        with open(cache_dir, "r") as f:
-            data = json.load(f)
-        
-        json_key = "memory_tables"
-        if json_key in data and memory_id in data[json_key]:
-            data[json_key].remove(memory_id) # Remove the directory from list of directories
-
-            with open(cache_dir, "w") as f:
-                json.dump(data, f, indent=2) # Write back to file
-        else:
-            return
-    except (json.JSONDecodeError, IOError) as e:
-        logger.error(f"Could not update JSON file {cache_dir}: {e}")
+    remove_conversation(memory_id)
 
 
 def format_elapsed_time(elapsed_timedelta: timedelta) -> str:
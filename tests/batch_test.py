@@ -0,0 +1,95 @@
+import asyncio
+import io
+import itertools
+import json
+from types import SimpleNamespace
+
+from loguru import logger
+
+from cli_agent.batch import BatchRunner, completed_ids, drop_partial_line, read_items
+
+logger = logger.bind(name="Batch Runner Testing")
+
+
+class FakeAgent:
+    """Agent answering every prompt after a short delay, tracking how many chats run at the same time."""
+    running = 0
+    max_running = 0
+    conversation_ids = itertools.count()
+
+    def __init__(self, memory):
+        self.memory = memory or SimpleNamespace(directory=f"id_{next(FakeAgent.conversation_ids)}")
+
+    async def chat(self, user_message: str, stream_tokens: bool = False):
+        FakeAgent.running += 1
+        FakeAgent.max_running = max(FakeAgent.max_running, FakeAgent.running)
+        try:
+            await asyncio.sleep(0.02)
+            if user_message == "fail":
+                return
+            yield {"token": "Echo"}
+            yield {"agent": {"messages": [SimpleNamespace(content=f"Echo: {user_message}", tool_calls=[])]}}
+        finally:
+            FakeAgent.running -= 1
+
+    async def wait_for_summary(self):
+        pass
+
+
+async def fake_agent_factory(memory):
+    return FakeAgent(memory)
+
+
+def run(items, shared_memory=False, concurrency=2) -> list[dict]:
+    output = io.StringIO()
+    runner = BatchRunner(concurrency=concurrency, shared_memory=shared_memory, agent_factory=fake_agent_factory)
+    asyncio.run(runner.run(items, output))
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_items_run_with_bounded_concurrency():
+    FakeAgent.max_running = 0
+    items = read_items([json.dumps(f"prompt {i}") for i in range(10)] + ['{"id": "bad", "prompt": "fail"}'])
+
+    results = {result["id"]: result for result in run(items, concurrency=3)}
+
+    assert FakeAgent.max_running == 3
+    assert results["1"]["response"] == "Echo: prompt 0"
+    assert results["1"]["first_token_latency"] is not None
+    assert results["bad"]["status"] == "error"
+    assert len({result["memory_id"] for result in results.values()}) == len(items) # One conversation each
+
+
+def test_shared_memory_uses_one_conversation():
+    FakeAgent.max_running = 0
+    created = next(FakeAgent.conversation_ids)
+    results = run(read_items([json.dumps(f"prompt {i}") for i in range(5)]), shared_memory=True, concurrency=2)
+
+    assert len({result["memory_id"] for result in results}) == 1
+    assert next(FakeAgent.conversation_ids) == created + 2 # A single agent for every item
+    assert FakeAgent.max_running == 1 # The turns of the conversation never interleave
+    assert [result["response"] for result in results] == [f"Echo: prompt {i}" for i in range(5)]
+
+
+def test_only_failed_items_are_rerun(tmp_path):
+    output_path = tmp_path / "results.jsonl"
+    complete_lines = json.dumps({"id": "a", "status": "ok"}) + "\n" + json.dumps({"id": "b", "status": "error"}) + "\n"
+    output_path.write_text(complete_lines + '{"id": "c", "sta') # Cut short by a crash
+
+    assert completed_ids(output_path) == {"a"}
+
+    # The results of the rerun are appended after the last complete line
+    drop_partial_line(output_path)
+    assert output_path.read_text() == complete_lines
+    drop_partial_line(output_path)
+    assert output_path.read_text() == complete_lines
+
+    output_path.write_text('{"id": "a", "sta')
+    drop_partial_line(output_path)
+    assert output_path.read_text() == ""
+
+
+if __name__ == "__main__":
+    test_items_run_with_bounded_concurrency()
+    test_shared_memory_uses_one_conversation()
+    logger.info("Batch runner tests passed")
@@ -0,0 +1,72 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+from loguru import logger
+from deepagents import async_create_deep_agent
+
+from cli_agent.benchmarks.__main__ import BenchmarkReporter, isolate_stores, settings
+from cli_agent.benchmarks.fakes import ScriptedChatModel
+
+logger = logger.bind(name="Benchmarks Testing")
+
+
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+def test_scripted_model_calls_the_tool_then_streams_its_response():
+    async def main():
+        model = ScriptedChatModel(response="The sum is 3.", tool_name="add", tool_args={"a": 1, "b": 2})
+        graph = async_create_deep_agent(model=model, tools=[add], instructions="Benchmark")
+
+        tokens, updates = [], []
+        async for mode, chunk in graph.astream({"messages": [{"role": "user", "content": "1 + 2?"}]}, stream_mode=["updates", "messages"]):
+            if mode == "messages" and chunk[0].content and chunk[0].type == "AIMessageChunk":
+                tokens.append(chunk[0].content)
+            elif mode == "updates":
+                updates.append(chunk)
+        return tokens, updates
+
+    tokens, updates = asyncio.run(main())
+
+    assert "".join(tokens) == "The sum is 3."
+    assert updates[1]["tools"]["messages"][0].content == "3"
+    assert updates[-1]["agent"]["messages"][0].content == "The sum is 3."
+
+
+def test_reporter_writes_one_json_line_per_measurement():
+    output = io.StringIO()
+    BenchmarkReporter(output).report("insert_memory", {"turns": 10}, [0.001 * i for i in range(1, 101)])
+
+    result = json.loads(output.getvalue())
+    assert result["benchmark"] == "insert_memory"
+    assert result["count"] == 100
+    assert result["p50"] == 50.5
+    assert result["p95"] == 95.05
+
+
+def test_stores_are_moved_to_the_workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PIXELTABLE_HOME", "user_home")
+    for name in ["REGISTRY_PATH", "SEARCH_INDEX_PATH", "LLM_CACHE_PATH", "TRACE_EXPORT_PATH"]:
+        monkeypatch.setattr(settings, name, f"user_{name.lower()}")
+
+    isolate_stores(tmp_path / "bench")
+
+    paths = [os.environ["PIXELTABLE_HOME"], settings.REGISTRY_PATH, settings.SEARCH_INDEX_PATH, settings.LLM_CACHE_PATH, settings.TRACE_EXPORT_PATH]
+    assert all(os.path.dirname(path) == str(tmp_path / "bench") for path in paths)
+    assert os.getcwd() == str(tmp_path / "bench")
+
+
+if __name__ == "__main__":
+    test_scripted_model_calls_the_tool_then_streams_its_response()
+    test_reporter_writes_one_json_line_per_measurement()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_stores_are_moved_to_the_workdir(Path(tempfile.mkdtemp()), monkeypatch)
+    logger.info("Benchmarks tests passed")
@@ -0,0 +1,42 @@
+import uuid
+from datetime import datetime
+
+import pixeltable as pxt
+from loguru import logger
+
+from cli_agent.agent.catalog import ConversationCatalog
+
+logger = logger.bind(name="Conversation Catalog Testing")
+
+
+def test_pages_keep_conversations_modified_at_the_same_time():
+    pxt.init()
+
+    class TestCatalog(ConversationCatalog):
+        TABLE_PATH = f"catalog_test_{uuid.uuid4().hex}"
+
+    catalog = TestCatalog()
+    # Newer than the conversations already saved in the Pixeltable home, they are listed first
+    modified = datetime(2100, 1, 1).astimezone()
+    tied_ids = [f"id_tied_{i}" for i in range(5)]
+    catalog._table.insert([
+        {"memory_id": memory_id, "created_at": modified, "last_modified": modified, "latest_prompt": None, "message_count": 0}
+        for memory_id in tied_ids
+    ])
+
+    try:
+        listed, cursor = [], None
+        for _ in range(3):
+            page = catalog.list_conversations(limit=2, before=cursor)
+            listed += [entry.memory_id for entry in page]
+            cursor = (page[-1].last_modified, page[-1].memory_id)
+
+        assert listed[:5] == sorted(tied_ids, reverse=True)
+        assert len(listed) == len(set(listed))
+    finally:
+        pxt.drop_table(TestCatalog.TABLE_PATH, force=True)
+
+
+if __name__ == "__main__":
+    test_pages_keep_conversations_modified_at_the_same_time()
+    logger.info("Conversation catalog tests passed")
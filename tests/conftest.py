@@ -0,0 +1,22 @@
+import os
+import shutil
+import tempfile
+
+# The settings are read when the modules are imported, so the stores are moved out of the repository
+# before the tests are collected. Pixeltable keeps its home for the whole process and its Postgres
+# server outlives it, so the directory is shared by the runs instead of being a per-test `tmp_path`,
+# and only the SQLite stores and the traces are started afresh.
+TEST_HOME = os.path.join(tempfile.gettempdir(), "cli_agent_tests")
+
+
+def pytest_configure(config):
+    stores = os.path.join(TEST_HOME, "stores")
+    shutil.rmtree(stores, ignore_errors=True)
+    os.makedirs(stores)
+
+    os.environ["PIXELTABLE_HOME"] = os.path.join(TEST_HOME, "pixeltable")
+    os.environ["REGISTRY_PATH"] = os.path.join(stores, "conversation_registry.sqlite")
+    os.environ["SEARCH_INDEX_PATH"] = os.path.join(stores, "message_search.sqlite")
+    os.environ["LLM_CACHE_PATH"] = os.path.join(stores, "llm_cache.sqlite")
+    os.environ["TRACE_EXPORT_PATH"] = os.path.join(stores, "traces.jsonl")
+    os.environ["DAEMON_SOCKET"] = os.path.join(stores, "agent.sock")
@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+
+from loguru import logger
+
+from cli_agent.client import DaemonClient
+from cli_agent.daemon import AgentDaemon
+from cli_agent.agent.sessions import SessionManager
+
+logger = logger.bind(name="Agent Daemon Testing")
+
+
+class FakeAgent:
+    """Agent streaming a canned answer after calling a tool."""
+    def __init__(self):
+        self.memory = SimpleNamespace(directory="id_fake")
+
+    async def chat(self, user_message: str, stream_tokens: bool = False):
+        if user_message == "fail":
+            raise OSError("model API unreachable")
+        yield {"agent": {"messages": [SimpleNamespace(content="", tool_calls=[{"name": "internet_search"}])]}}
+        yield {"tools": {"messages": [SimpleNamespace(name="internet_search", content="results")]}}
+        for token in ["Echo: ", user_message]:
+            yield {"token": token}
+        yield {"agent": {"messages": [SimpleNamespace(content=f"Echo: {user_message}", tool_calls=[])]}}
+
+    async def wait_for_summary(self):
+        pass
+
+
+def test_client_streams_a_turn_from_the_daemon(tmp_path):
+    socket_path = tmp_path / "agent.sock"
+
+    def chat() -> tuple[list[dict], list[dict]]:
+        client = DaemonClient(str(socket_path))
+        attached = list(client.request({"type": "attach"}))
+        failed = list(client.request({"type": "chat", "message": "fail"}))
+        events = list(client.request({"type": "chat", "message": "hi"})) # The connection is still open
+        client.close()
+        return attached, failed, events
+
+    async def main():
+        session_manager = SessionManager()
+        session_manager._spare_agent = FakeAgent()
+        daemon = AgentDaemon(socket_path, session_manager)
+        server = await asyncio.start_unix_server(daemon._handle_client, path=str(socket_path))
+        async with server:
+            return await asyncio.to_thread(chat)
+
+    attached, failed, events = asyncio.run(main())
+
+    assert attached == [{"type": "attached", "memory_id": "id_fake", "history": []}]
+    assert failed == [{"type": "error", "message": "OSError: model API unreachable"}]
+    assert [event["type"] for event in events] == ["tool_call", "tool_result", "token", "token", "response", "done"]
+    assert "".join(event["text"] for event in events if event["type"] == "token") == "Echo: hi"
+    assert events[-1]["first_token_latency"] is not None
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_client_streams_a_turn_from_the_daemon(Path(tmp_dir))
+    logger.info("Agent daemon tests passed")
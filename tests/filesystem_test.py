@@ -0,0 +1,101 @@
+import asyncio
+import uuid
+
+import pixeltable as pxt
+import pytest
+from loguru import logger
+
+import cli_agent.agent.file_state as file_state
+from cli_agent.agent.filesystem import current_memory, edit_file, ls, read_file, write_file
+from cli_agent.agent.main_agent import Agent
+from cli_agent.agent.memory import Memory
+from cli_agent.benchmarks.fakes import ScriptedChatModel
+
+logger = logger.bind(name="Virtual Filesystem Testing")
+
+
+def test_file_tools_open_files_lazily():
+    pxt.init()
+    memory = Memory(f"filesystem_test_{uuid.uuid4().hex}")
+    token = current_memory.set(memory)
+    try:
+        assert write_file.invoke({"file_path": "/notes.md", "content": "first line\nsecond line"}) == "Updated file /notes.md"
+        write_file.invoke({"file_path": "/other.md", "content": "x" * 1000})
+        assert edit_file.invoke({"file_path": "/notes.md", "old_string": "second", "new_string": "last"}).startswith("Successfully replaced")
+        assert edit_file.invoke({"file_path": "/missing.md", "old_string": "a", "new_string": "b"}) == "Error: File '/missing.md' not found"
+        assert read_file.invoke({"file_path": "/notes.md", "offset": 1}) == "     2\tlast line"
+        assert sorted(ls.invoke({})) == ["/notes.md", "/other.md"]
+        memory.flush()
+
+        # A resumed conversation only loads the paths, then the contents of the files it opens
+        resumed = Memory(memory.directory)
+        assert set(resumed.load_file_manifest()) == {"/notes.md", "/other.md"}
+        assert len(resumed.file_state._contents) == 0
+        assert resumed.read_file("/notes.md") == "first line\nlast line"
+        assert len(resumed.file_state._contents) == 1
+        assert resumed.read_file("/missing.md") is None
+
+        resumed.save_files({"/notes.md": "first line\nlast line"}) # Unchanged, nothing is recorded
+        assert resumed.get_latest_memory(1)[0].role == "file_changes"
+        assert not [key for key in file_state._unwritten_blobs if key[0] == memory.directory]
+    finally:
+        current_memory.reset(token)
+        memory.reset_current_memory()
+
+
+def test_failed_write_keeps_the_file_contents(monkeypatch):
+    pxt.init()
+    memory = Memory(f"filesystem_test_{uuid.uuid4().hex}")
+    get_table = pxt.get_table
+
+    class FailingBlobsTable:
+        def __init__(self, table):
+            self.table = table
+
+        def __getattr__(self, name):
+            return getattr(self.table, name)
+
+        def insert(self, rows):
+            raise RuntimeError("insert failed")
+
+    def get_failing_table(path: str):
+        table = get_table(path)
+        return FailingBlobsTable(table) if path == memory.file_state._blobs_path else table
+
+    try:
+        with monkeypatch.context() as patch:
+            patch.setattr(file_state.pxt, "get_table", get_failing_table)
+            memory.save_files({"/notes.md": "kept"})
+            memory.flush() # The writer logs the error and drops the batch
+
+        # The content is still in memory, the manifest doesn't point at a content that is gone
+        assert [key for key in file_state._unwritten_blobs if key[0] == memory.directory]
+        memory.file_state._contents.clear()
+        assert memory.read_file("/notes.md") == "kept"
+    finally:
+        memory.reset_current_memory()
+
+
+def test_agent_turn_writes_through_file_tools():
+    pxt.init()
+    model = ScriptedChatModel(tool_name="write_file", tool_args={"file_path": "/answer.md", "content": "42"}, response="Written.")
+    agent = Agent(tools=[], system_prompt="You write files.", model_name=model, memory=Memory(f"filesystem_test_{uuid.uuid4().hex}"))
+
+    async def turn():
+        await agent.setup()
+        return [chunk async for chunk in agent.chat("Write the answer")]
+
+    try:
+        chunks = asyncio.run(turn())
+        assert chunks[-1]["agent"]["messages"][0].content == "Written."
+        assert agent.memory.read_file("/answer.md") == "42"
+    finally:
+        agent.reset_memory()
+
+
+if __name__ == "__main__":
+    test_file_tools_open_files_lazily()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_failed_write_keeps_the_file_contents(monkeypatch)
+    test_agent_turn_writes_through_file_tools()
+    logger.info("Virtual filesystem tests passed")
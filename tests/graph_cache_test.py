@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from loguru import logger
+
+import cli_agent.agent.main_agent as main_agent
+from cli_agent.agent.main_agent import Agent
+from cli_agent.benchmarks.fakes import ScriptedChatModel
+
+logger = logger.bind(name="Graph Cache Testing")
+
+
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+def multiply(a: int, b: int) -> int:
+    """Multiply two numbers."""
+    return a * b
+
+
+def test_agents_of_the_same_config_share_one_graph(monkeypatch):
+    monkeypatch.setattr(main_agent, "_compiled_agents", {})
+    monkeypatch.setattr(main_agent.settings, "ROUTER_TIERS", [])
+    monkeypatch.setattr(main_agent.settings, "LLM_CACHE_ENABLED", False)
+    compiled = []
+    create_deep_agent = main_agent.async_create_deep_agent
+
+    def count_compilations(**kwargs):
+        compiled.append(kwargs["model"])
+        return create_deep_agent(**kwargs)
+    monkeypatch.setattr(main_agent, "async_create_deep_agent", count_compilations)
+
+    model, other_model = ScriptedChatModel(response="Done."), ScriptedChatModel(response="Done.")
+
+    def graph_of(tools: list, model_name) -> object:
+        agent = Agent(tools=tools, system_prompt="You add numbers.", model_name=model_name, memory=SimpleNamespace(directory="id_graph_test"))
+        asyncio.run(agent.setup())
+        return agent.main_agent
+
+    graph = graph_of([add], model)
+    assert graph_of([add], model) is graph
+    assert len(compiled) == 1
+
+    # A different tool set or model compiles a new graph, which is then shared too
+    with_multiply = graph_of([add, multiply], model)
+    assert with_multiply is not graph and graph_of([add, multiply], model) is with_multiply
+    assert graph_of([add], other_model) is not graph
+    assert len(compiled) == 3
+
+    # So do different router tiers in front of the same model name
+    graph = graph_of([add], "openai:gpt-5-mini")
+    monkeypatch.setattr(main_agent.settings, "ROUTER_TIERS", ["openai:gpt-5-nano"])
+    assert graph_of([add], "openai:gpt-5-mini") is not graph
+    assert len(compiled) == 5
+
+
+if __name__ == "__main__":
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_agents_of_the_same_config_share_one_graph(monkeypatch)
+    logger.info("Graph cache tests passed")
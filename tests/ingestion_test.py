@@ -0,0 +1,142 @@
+import asyncio
+import uuid
+from pathlib import Path
+
+import pixeltable as pxt
+import pytest
+from loguru import logger
+
+import cli_agent.agent.ingestion as ingestion
+from cli_agent.agent.ingestion import IngestionPipeline, chunk_text, expand_sources, extract_text
+from cli_agent.agent.knowledge import KnowledgeBase
+from cli_agent.agent.tools import ingest_knowledge
+
+logger = logger.bind(name="Knowledge Ingestion Testing")
+
+
+def test_extract_text_skips_page_chrome():
+    html = """
+    <html><head><title>Release notes</title><style>p { color: red; }</style></head>
+    <body><nav>Home | Docs</nav><h1>Version 2.0</h1><p>Adds the &amp; operator.</p>
+    <script>track();</script><p>Fixes   the parser.</p><footer>Copyright</footer></body></html>
+    """
+    title, text = extract_text(html, is_html=True)
+
+    assert title == "Release notes"
+    assert text == "Version 2.0\n\nAdds the & operator.\n\nFixes the parser."
+
+
+def test_chunk_text_respects_size_and_overlap():
+    paragraphs = [" ".join(f"word{paragraph}_{index}" for index in range(30)) for paragraph in range(6)]
+    chunks = chunk_text("\n\n".join(paragraphs), chunk_size=500, overlap=100)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert all(paragraph in "\n\n".join(chunks) for paragraph in paragraphs)
+    # The end of a chunk starts the next one
+    assert all(previous.split()[-1] in chunk for previous, chunk in zip(chunks, chunks[1:]))
+
+    long_chunks = chunk_text("x" * 1200, chunk_size=500, overlap=0)
+    assert [len(chunk) for chunk in long_chunks] == [500, 500, 200]
+
+
+def test_pipeline_skips_unchanged_sources(tmp_path):
+    pxt.init()
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "pixeltable.md").write_text("# Pixeltable\n\nPixeltable computes embedding indexes on insert.")
+    (tmp_path / "docs" / "release.html").write_text("<title>Release</title><p>The release is planned for Friday.</p>")
+    (tmp_path / "docs" / "image.png").write_bytes(b"\x89PNG")
+    assert len(expand_sources([str(tmp_path / "docs")])) == 2
+
+    knowledge_base = KnowledgeBase(table_prefix=f"knowledge_test_{uuid.uuid4().hex}")
+    try:
+        pipeline = IngestionPipeline(knowledge_base, batch_size=1, chunk_size=200, chunk_overlap=20)
+        stats = asyncio.run(pipeline.run([str(tmp_path / "docs"), str(tmp_path / "missing.txt")]))
+        assert (stats.documents, stats.unchanged, stats.failed, stats.chunks) == (2, 0, 1, 2)
+        assert stats.chunks_per_second > 0
+
+        results = knowledge_base.search("When is the release planned?", k=1)
+        assert results[0].title == "Release"
+        assert results[0].content == "The release is planned for Friday."
+
+        # Only the changed file is ingested again, its old chunk is replaced
+        (tmp_path / "docs" / "release.html").write_text("<title>Release</title><p>The release moved to Monday.</p>")
+        stats = asyncio.run(pipeline.run([str(tmp_path / "docs")]))
+        assert (stats.documents, stats.unchanged, stats.chunks) == (1, 1, 1)
+        contents = [chunk.content for chunk in knowledge_base.search("release", k=5)]
+        assert "The release moved to Monday." in contents
+        assert "The release is planned for Friday." not in contents
+    finally:
+        pxt.drop_table(knowledge_base.chunks_path, force=True)
+        pxt.drop_table(knowledge_base.sources_path, force=True)
+
+
+def test_chunks_shared_by_sources_survive_a_change_of_one(tmp_path):
+    pxt.init()
+    shared = "Pixeltable stores the embeddings next to the data."
+    (tmp_path / "a.txt").write_text(shared)
+    (tmp_path / "b.txt").write_text(shared)
+
+    knowledge_base = KnowledgeBase(table_prefix=f"knowledge_test_{uuid.uuid4().hex}")
+    try:
+        pipeline = IngestionPipeline(knowledge_base, chunk_size=200, chunk_overlap=20)
+        asyncio.run(pipeline.run([str(tmp_path / "a.txt")]))
+        asyncio.run(pipeline.run([str(tmp_path / "b.txt")]))
+        (tmp_path / "a.txt").write_text("A different note.")
+        asyncio.run(pipeline.run([str(tmp_path / "a.txt")]))
+
+        results = knowledge_base.search("Where are the embeddings stored?", k=5)
+        assert [(Path(chunk.source).name, chunk.content) for chunk in results if chunk.content == shared] == [("b.txt", shared)]
+    finally:
+        pxt.drop_table(knowledge_base.chunks_path, force=True)
+        pxt.drop_table(knowledge_base.sources_path, force=True)
+
+
+class FakeKnowledgeBase:
+    """Knowledge base keeping the written documents in a list."""
+    def __init__(self):
+        self.documents = []
+
+    def content_hashes(self, sources: list[str]) -> dict[str, str]:
+        return {}
+
+    def write(self, documents: list) -> int:
+        self.documents.extend(documents)
+        return 0
+
+
+def test_bad_document_does_not_stop_the_run(tmp_path, monkeypatch):
+    def extract_text(content: str, is_html: bool) -> tuple[str, str]:
+        if content == "malformed":
+            raise ValueError("unreadable markup")
+        return "", content
+    monkeypatch.setattr(ingestion, "extract_text", extract_text)
+    for name in ["a.txt", "b.txt", "c.txt"]:
+        (tmp_path / name).write_text(f"Notes of {name}")
+    (tmp_path / "b.txt").write_text("malformed")
+
+    knowledge_base = FakeKnowledgeBase()
+    stats = asyncio.run(IngestionPipeline(knowledge_base, chunk_size=200, chunk_overlap=20).run([str(tmp_path)]))
+
+    assert (stats.documents, stats.failed) == (2, 1)
+    assert sorted(Path(document.source).name for document in knowledge_base.documents) == ["a.txt", "c.txt"]
+
+
+def test_agent_tool_only_ingests_web_pages():
+    result = asyncio.run(ingest_knowledge(["~/.ssh", "/", "https://example.com"]))
+    assert result == "Only web pages can be ingested, not: ~/.ssh, /"
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_extract_text_skips_page_chrome()
+    test_chunk_text_respects_size_and_overlap()
+    with tempfile.TemporaryDirectory() as directory:
+        test_pipeline_skips_unchanged_sources(Path(directory))
+    with tempfile.TemporaryDirectory() as directory:
+        test_chunks_shared_by_sources_survive_a_change_of_one(Path(directory))
+    with tempfile.TemporaryDirectory() as directory, pytest.MonkeyPatch.context() as monkeypatch:
+        test_bad_document_does_not_stop_the_run(Path(directory), monkeypatch)
+    test_agent_tool_only_ingests_web_pages()
+    logger.info("Knowledge ingestion tests passed")
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from loguru import logger
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration
+
+from cli_agent.agent.llm_cache import ResponseCache, files_state_hash, normalize_messages
+from cli_agent.benchmarks.fakes import ScriptedChatModel
+
+logger = logger.bind(name="LLM Cache Testing")
+
+
+class CountingChatModel(ScriptedChatModel):
+    calls: int = 0
+
+    def _next_message(self, messages):
+        self.calls += 1
+        return super()._next_message(messages)
+
+
+def test_normalized_messages_ignore_ids():
+    def conversation(tool_call_id: str, message_id: str) -> str:
+        return dumps([
+            HumanMessage(content="Add 1 and 2 "),
+            AIMessage(content="", id=message_id, tool_calls=[{"name": "add", "args": {"a": 1, "b": 2}, "id": tool_call_id}]),
+            ToolMessage(content="3", tool_call_id=tool_call_id),
+        ])
+
+    assert normalize_messages(conversation("call_a", "run-1")) == normalize_messages(conversation("call_b", "run-2"))
+    assert normalize_messages(conversation("call_a", "run-1")) != normalize_messages(dumps([HumanMessage(content="Add 1 and 3")]))
+
+
+def test_identical_calls_are_served_from_the_cache(tmp_path):
+    cache = ResponseCache(tmp_path / "llm_cache.sqlite", ttl=60, max_entries=10)
+    model = CountingChatModel(response="Hello!", cache=cache)
+
+    first = asyncio.run(model.ainvoke("Hi"))
+    second = asyncio.run(model.ainvoke("Hi"))
+    files_state_hash.set("other files")
+    asyncio.run(model.ainvoke("Hi"))
+    files_state_hash.set("")
+
+    assert model.calls == 2
+    assert second.content == first.content == "Hello!"
+    assert second.id != first.id
+    assert cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+
+def test_expired_and_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path / "llm_cache.sqlite", ttl=60, max_entries=2)
+    generations = [ChatGeneration(message=AIMessage(content="answer"))]
+
+    for prompt in ["a", "b"]:
+        cache.update(dumps([HumanMessage(content=prompt)]), "model", generations)
+    assert cache.lookup(dumps([HumanMessage(content="a")]), "model") is not None
+    cache.update(dumps([HumanMessage(content="c")]), "model", generations)
+
+    assert len(cache) == 2
+    assert cache.lookup(dumps([HumanMessage(content="b")]), "model") is None
+
+    cache.ttl = 0.01
+    time.sleep(0.02)
+    assert cache.lookup(dumps([HumanMessage(content="a")]), "model") is None
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_normalized_messages_ignore_ids()
+    for test in [test_identical_calls_are_served_from_the_cache, test_expired_and_least_recently_used_entries_are_evicted]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test(Path(tmp_dir))
+    logger.info("LLM cache tests passed")
@@ -1,12 +1,107 @@
 import asyncio
 import json
+import sys
+import time
 
+import pytest
 from loguru import logger
 from langchain_mcp_adapters.client import MultiServerMCPClient
 
+from cli_agent.agent.mcp_manager import MCPSessionManager, get_mcp_manager
+from cli_agent.benchmarks.fakes import write_stub_mcp_config
+
 logger = logger.bind(name="MCP Testing")
 
 
+def write_config(tmp_path, servers: dict) -> str:
+    path = tmp_path / "mcp_config.json"
+    path.write_text(json.dumps(servers))
+    return str(path)
+
+
+def stub_server(tmp_path) -> dict:
+    """Config of the local stub MCP server, with the `add` and `echo` tools."""
+    return json.loads(write_stub_mcp_config(tmp_path / "stub.json").read_text())["stub"]
+
+
+def test_tool_schemas_are_cached_by_config(tmp_path):
+    stub = stub_server(tmp_path)
+    config_path = write_config(tmp_path, {"stub": stub})
+
+    async def main():
+        manager = MCPSessionManager(config_path, timeout=30, cache_dir=tmp_path)
+        tools = await manager.get_tools() # Nothing cached yet, waits for the server
+        assert sorted(tool.name for tool in tools) == ["add", "echo"]
+        assert json.loads(manager.cache_file_path.read_text())["config_hash"] == manager.config_hash
+        await manager.close()
+
+        # Same config: the tools come from the cache before the server finished connecting
+        manager = MCPSessionManager(config_path, timeout=30, cache_dir=tmp_path)
+        tools = await manager.get_tools()
+        assert not manager._ready["stub"].is_set()
+        assert sorted(tool.name for tool in tools) == ["add", "echo"]
+        assert await tools[0].ainvoke({"a": 1, "b": 2}) == "3" # Waits for the session
+        await manager.close()
+
+        # A changed config doesn't use the cached schemas, and replaces them
+        config_path_renamed = write_config(tmp_path, {"renamed": stub})
+        manager = MCPSessionManager(config_path_renamed, timeout=30, cache_dir=tmp_path)
+        assert manager._load_cached_schemas() is None
+        await manager.get_tools()
+        assert manager._ready["renamed"].is_set()
+        assert list(json.loads(manager.cache_file_path.read_text())["servers"]) == ["renamed"]
+        await manager.close()
+
+    asyncio.run(main())
+
+
+def test_slow_server_times_out_without_holding_back_the_others(tmp_path):
+    stub = stub_server(tmp_path)
+    hanging = {"command": sys.executable, "args": ["-c", "import time; time.sleep(60)"], "transport": "stdio"}
+    config_path = write_config(tmp_path, {"stub": stub, "hanging": hanging})
+
+    async def main():
+        manager = MCPSessionManager(config_path, timeout=3, cache_dir=tmp_path)
+        start = time.perf_counter()
+        tools = await manager.get_tools()
+        assert time.perf_counter() - start < 10
+        assert sorted(tool.name for tool in tools) == ["add", "echo"]
+        assert not manager.cache_file_path.exists() # A partial tool list is not cached
+
+        with pytest.raises(RuntimeError, match="did not connect within"):
+            await manager.get_session("hanging")
+        await asyncio.wait_for(manager.close(), timeout=10) # The connecting server is cancelled
+
+    asyncio.run(main())
+
+
+def test_one_session_is_shared_across_agents(tmp_path):
+    config_path = str(write_stub_mcp_config(tmp_path / "stub.json"))
+    assert get_mcp_manager(config_path) is get_mcp_manager(config_path)
+    manager = MCPSessionManager(config_path, timeout=30, cache_dir=tmp_path)
+
+    async def agent_turn() -> str:
+        tools = {tool.name: tool for tool in await manager.get_tools()} # What each Agent does on setup
+        return await tools["echo"].ainvoke({"text": "hello"})
+
+    async def main():
+        assert await agent_turn() == "hello"
+        session = await manager.get_session("stub")
+        assert await asyncio.gather(agent_turn(), agent_turn()) == ["hello", "hello"]
+        assert await manager.get_session("stub") is session
+        assert list(manager._tasks) == ["stub"] # The server was spawned once
+        await manager.close()
+
+    asyncio.run(main())
+
+    # A closed manager connects again on the next call, from another event loop
+    async def reopened():
+        assert await agent_turn() == "hello"
+        await manager.close()
+
+    asyncio.run(reopened())
+
+
 async def main():
     config_path = "../src/cli_agent/agent/mcp_servers/config.json"
     with open(config_path, "r") as f:
@@ -21,6 +116,15 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
-
+    import tempfile
+    from pathlib import Path
 
+    for test in [
+        test_tool_schemas_are_cached_by_config,
+        test_slow_server_times_out_without_holding_back_the_others,
+        test_one_session_is_shared_across_agents,
+    ]:
+        with tempfile.TemporaryDirectory() as directory:
+            test(Path(directory))
+    asyncio.run(main())
+    logger.info("MCP tests passed")
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pixeltable as pxt
+import pytest
+from loguru import logger
+
+from cli_agent.agent.memory import Memory, MemoryRecord, get_memory_writer, on_pixeltable_thread, to_pixeltable_thread
+
+logger = logger.bind(name="Memory Testing")
+
+
+def record(content: str, role: str = "user") -> MemoryRecord:
+    return MemoryRecord(message_id=str(uuid.uuid4()), role=role, content=content, timestamp=datetime.now())
+
+
+def test_pixeltable_is_only_called_on_its_thread():
+    writer = get_memory_writer()
+
+    @on_pixeltable_thread
+    def thread_name() -> str:
+        return threading.current_thread().name
+
+    @on_pixeltable_thread
+    def nested() -> str:
+        return thread_name() # Run right away instead of waiting for itself
+
+    async def session():
+        await to_pixeltable_thread(pxt.init) # The first query of the process may come from a coroutine
+        memory = await to_pixeltable_thread(Memory, f"memory_test_{uuid.uuid4().hex}")
+        try:
+            memory.insert_memory(record("hello"))
+            assert [r.content for r in await to_pixeltable_thread(memory.get_all_memory)] == ["hello"]
+            return thread_name(), await to_pixeltable_thread(nested)
+        finally:
+            await to_pixeltable_thread(memory.reset_current_memory) # Flushes the queue from the Pixeltable thread
+
+    assert asyncio.run(session()) == ("pixeltable", "pixeltable")
+
+    # A call cancelled before it started is dropped
+    gate = threading.Event()
+    blocking = writer.submit(gate.wait)
+    dropped = writer.submit(lambda: 1 / 0)
+    dropped.cancel()
+    gate.set()
+    assert blocking.result(timeout=5) and dropped.cancelled()
+
+
+def test_latest_records_come_from_a_bounded_cache(monkeypatch):
+    pxt.init()
+    memory = Memory(f"memory_test_{uuid.uuid4().hex}", cache_size=4)
+    start = datetime.now()
+    for i in range(6):
+        memory.insert_memory(MemoryRecord(message_id=str(uuid.uuid4()), role="user", content=f"message {i}", timestamp=start + timedelta(seconds=i)))
+    memory.flush()
+
+    queries = []
+    query_latest_memory = memory._query_latest_memory
+
+    def count_queries(n: int):
+        queries.append(n)
+        return query_latest_memory(n)
+    monkeypatch.setattr(memory, "_query_latest_memory", count_queries)
+
+    try:
+        # The first read fills the cache with the latest records only, the next ones don't query the table
+        assert [r.content for r in memory.get_latest_memory(3)] == ["message 3", "message 4", "message 5"]
+        assert [r.content for r in memory.get_latest_memory(4)] == ["message 2", "message 3", "message 4", "message 5"]
+        assert queries == [4] and len(memory._tail_cache) == 4
+
+        # Inserted records are appended to the cache and the oldest one is evicted
+        memory.insert_memory(MemoryRecord(message_id=str(uuid.uuid4()), role="assistant", content="answer", timestamp=start + timedelta(seconds=6)))
+        assert [r.content for r in memory.get_latest_memory(2)] == ["message 5", "answer"]
+        assert queries == [4] and memory._tail_cache[0].content == "message 3"
+
+        # More records than the cache holds are read from the table, the queued one included
+        assert [r.content for r in memory.get_latest_memory(10)] == [f"message {i}" for i in range(6)] + ["answer"]
+        assert queries == [4, 10]
+        assert memory.get_latest_memory(0) == []
+    finally:
+        memory.reset_current_memory()
+
+
+def test_reads_see_every_record_while_they_are_written():
+    pxt.init()
+    memory = Memory(f"memory_test_{uuid.uuid4().hex}")
+    written: list[str] = []
+    stop = threading.Event()
+
+    def insert():
+        for i in range(60):
+            content = f"message {i}"
+            memory.insert_memory(record(content))
+            written.append(content)
+            if i % 10 == 0:
+                memory.flush()
+        stop.set()
+
+    try:
+        writer = threading.Thread(target=insert)
+        writer.start()
+        while not stop.is_set():
+            expected = list(written) # Inserted before the read started
+            contents = [r.content for r in memory.get_all_memory()]
+            assert contents[:len(expected)] == expected
+        writer.join()
+        memory.flush()
+        assert [r.content for r in memory.get_all_memory()] == written
+    finally:
+        memory.reset_current_memory()
+
+
+def test_file_changes_of_two_memories_of_a_conversation_are_written_together():
+    pxt.init()
+    writer = get_memory_writer()
+    agent_memory = Memory(f"memory_test_{uuid.uuid4().hex}")
+    resumed = Memory(agent_memory.directory) # Like a conversation resumed while its agent still holds it
+    agent_memory.load_file_manifest()
+    resumed.load_file_manifest()
+
+    gate = threading.Event()
+    writer.submit(gate.wait) # Both changes are queued before the writer runs, it writes them with one of the Memory objects
+    agent_memory.save_files({"/a.md": "written by the agent"})
+    resumed.save_files({"/b.md": "written after resuming"})
+    gate.set()
+    agent_memory.flush()
+
+    try:
+        memory = Memory(agent_memory.directory)
+        assert memory.read_file("/a.md") == "written by the agent"
+        assert memory.read_file("/b.md") == "written after resuming"
+    finally:
+        memory.reset_current_memory()
+
+
+if __name__ == "__main__":
+    test_pixeltable_is_only_called_on_its_thread()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_latest_records_come_from_a_bounded_cache(monkeypatch)
+    test_reads_see_every_record_while_they_are_written()
+    test_file_changes_of_two_memories_of_a_conversation_are_written_together()
+    logger.info("Memory tests passed")
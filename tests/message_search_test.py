@@ -0,0 +1,77 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from loguru import logger
+
+import cli_agent.agent.message_search as message_search
+import cli_agent.utils as utils
+from cli_agent.agent.message_search import HIGHLIGHT_END, HIGHLIGHT_START, MessageSearchIndex, build_match_query
+
+logger = logger.bind(name="Message Search Testing")
+
+
+def test_build_match_query_quotes_terms():
+    assert build_match_query('release "date" OR fri') == '"release" "date" "OR" "fri"*'
+    assert build_match_query("  ?! ") == ""
+
+
+def test_search_ranks_conversations(tmp_path):
+    index = MessageSearchIndex(tmp_path / "message_search.sqlite")
+    now = datetime.now().astimezone()
+
+    def record(role: str, content: str, message_id: str = None):
+        return SimpleNamespace(message_id=message_id or str(uuid.uuid4()), role=role, content=content, timestamp=now - timedelta(minutes=1))
+
+    test_ids = {"id_release", "id_weather", "id_other"}
+
+    def search(terms: str, limit: int = 10) -> list[str]:
+        # Conversations already saved in the Pixeltable home are indexed too, only the test ones are checked
+        return [hit.memory_id for hit in index.search(terms, limit=limit) if hit.memory_id in test_ids]
+
+    try:
+        duplicate = record("assistant", "The release of the parser is planned for Friday")
+        index.add("id_release", [record("user", "When is the release planned?"), duplicate, record("summary", "release release")])
+        index.add("id_release", [duplicate]) # Already indexed, skipped
+        index.add("id_weather", [record("user", "The weather is hot, no release news today")])
+        index.add("id_other", [record("user", "Something unrelated")])
+
+        assert search("releases plan") == ["id_release"] # Stemmed terms, prefix on the last one
+        hit = next(hit for hit in index.search("releases plan", limit=10) if hit.memory_id == "id_release")
+        assert f"{HIGHLIGHT_START}release{HIGHLIGHT_END}" in hit.snippet
+
+        assert set(search("release")) == {"id_release", "id_weather"}
+        assert len(index.search("release", limit=1)) == 1
+
+        index.remove("id_release")
+        assert search("release") == ["id_weather"]
+    finally:
+        index.close()
+
+
+def test_search_only_queries_the_index(tmp_path, monkeypatch):
+    index = MessageSearchIndex(tmp_path / "message_search.sqlite") # Filled from the registry once, when opened
+    index.add("id_searched", [SimpleNamespace(message_id=str(uuid.uuid4()), role="user", content="Searched words", timestamp=datetime.now())])
+
+    def list_dirs():
+        raise AssertionError("Pixeltable queried during the search")
+    monkeypatch.setattr(message_search.pxt, "list_dirs", list_dirs)
+    monkeypatch.setattr(utils, "get_message_search_index", lambda: index)
+
+    try:
+        assert "id_searched" in [hit.memory_id for hit in utils.search_conversations("searched", limit=50)]
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_build_match_query_quotes_terms()
+    with tempfile.TemporaryDirectory() as directory:
+        test_search_ranks_conversations(Path(directory))
+    with tempfile.TemporaryDirectory() as directory, pytest.MonkeyPatch.context() as monkeypatch:
+        test_search_only_queries_the_index(Path(directory), monkeypatch)
+    logger.info("Message search tests passed")
@@ -0,0 +1,72 @@
+import io
+import json
+import subprocess
+import sys
+import threading
+
+from loguru import logger
+from rich.console import Console
+
+from cli_agent.profiling import StartupProfiler
+
+logger = logger.bind(name="Startup Profiler Testing")
+
+# Imported after the welcome banner is drawn, never by the module of the CLI itself
+HEAVY_MODULES = [
+    "pixeltable",
+    "deepagents",
+    "langchain_core",
+    "langchain_openai",
+    "langchain_mcp_adapters",
+    "httpx",
+    "numpy",
+    "cli_agent.agent.main_agent",
+]
+
+
+def test_profiler_reports_the_stages_and_checks_the_budget():
+    profiler = StartupProfiler(enabled=True)
+    with profiler.stage("import deepagents"):
+        pass
+
+    def warm_up():
+        with profiler.stage("initialize pixeltable"):
+            pass
+    thread = threading.Thread(target=warm_up, name="pixeltable-warmup")
+    thread.start()
+    thread.join()
+    profiler.imports_done()
+
+    console = Console(file=io.StringIO(), width=200)
+    profiler.report(console)
+    report = console.file.getvalue()
+    assert "import cli" in report and "import deepagents" in report
+    assert "initialize pixeltable" in report and "pixeltable-warmup" in report
+
+    warnings = []
+    sink = logger.add(warnings.append, level="WARNING")
+    try:
+        profiler.import_time = 0.8
+        assert profiler.within_import_budget(1.0)
+        assert profiler.within_import_budget(0) # Disabled
+        assert not warnings
+        assert not profiler.within_import_budget(0.5)
+        assert "over the 0.500s STARTUP_IMPORT_BUDGET" in warnings[0]
+    finally:
+        logger.remove(sink)
+
+
+def test_cli_defers_the_heavy_imports():
+    script = (
+        "import json, sys; import cli_agent.cli; "
+        f"print(json.dumps([module for module in {HEAVY_MODULES!r} if module in sys.modules]))"
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.splitlines()[-1]) == []
+
+
+if __name__ == "__main__":
+    test_profiler_reports_the_stages_and_checks_the_budget()
+    test_cli_defers_the_heavy_imports()
+    logger.info("Startup profiler tests passed")
@@ -0,0 +1,104 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pixeltable as pxt
+import pytest
+from loguru import logger
+
+import cli_agent.agent.main_agent as main_agent
+from cli_agent.agent.main_agent import Agent
+from cli_agent.agent.memory import get_memory_writer
+from cli_agent.agent.recall import RecallIndex, embedding_function, hash_embed
+
+logger = logger.bind(name="Semantic Recall Testing")
+
+
+def test_hash_embedding_is_closer_for_related_texts():
+    query = hash_embed("Which database did I pick for the embedding index?")
+    related = hash_embed("I picked Pixeltable as the database, it has an embedding index")
+    unrelated = hash_embed("The weather in Hanoi is hot and humid today")
+
+    assert np.isclose(np.linalg.norm(query), 1.0)
+    assert float(query @ related) > 0.2
+    assert float(query @ related) > float(query @ unrelated)
+    assert np.array_equal(query, hash_embed("Which database did I pick for the embedding index?"))
+
+
+def test_embedding_model_needs_the_recall_extra():
+    try:
+        import sentence_transformers # noqa: F401
+    except ImportError:
+        with pytest.raises(ImportError, match="--extra recall"):
+            embedding_function("sentence-transformers/all-MiniLM-L6-v2")
+    else:
+        assert embedding_function("sentence-transformers/all-MiniLM-L6-v2") is not None
+
+
+def test_search_finds_relevant_messages_offline():
+    pxt.init()
+    index = RecallIndex(table_path=f"recall_test_{uuid.uuid4().hex}")
+    now = datetime.now().astimezone()
+
+    def record(role: str, content: str, minutes_ago: int):
+        return SimpleNamespace(message_id=str(uuid.uuid4()), role=role, content=content, timestamp=now - timedelta(minutes=minutes_ago))
+
+    try:
+        index.add("id_current", [
+            record("user", "Remember that the release is planned for Friday", 30),
+            record("summary", "The release is planned for Friday", 25),
+            record("user", "When is the release planned?", 1),
+        ])
+        index.add("id_other", [record("assistant", "The weather in Hanoi is hot", 60)])
+
+        # Conversations already saved in the Pixeltable home are indexed too, the searches are scoped to the test ones
+        results = index.search(
+            "When is the release planned?", k=2, min_score=0.2, memory_id="id_current", exclude=("id_current", now - timedelta(minutes=5))
+        )
+        assert [result.content for result in results] == ["Remember that the release is planned for Friday"]
+
+        assert {result.memory_id for result in index.search("release", k=5, memory_id="id_other")} == {"id_other"}
+
+        index.remove("id_current")
+        assert index.search("release", k=5, memory_id="id_current") == []
+    finally:
+        pxt.drop_table(index.table_path, force=True)
+
+
+def test_slow_recall_is_abandoned_without_holding_back_the_next_turns(monkeypatch):
+    monkeypatch.setattr(main_agent.settings, "RECALL_TIMEOUT_MS", 50)
+    searches = []
+    release = threading.Event()
+
+    def recall(query: str, k: int, **kwargs):
+        searches.append(query)
+        release.wait(5)
+        return []
+
+    agent = Agent(tools=[], system_prompt="system", memory=SimpleNamespace(directory="id_recall_test", recall=recall))
+    writer = get_memory_writer()
+
+    # Still queued behind other Pixeltable work when its budget is spent, the search never runs
+    busy = threading.Event()
+    writer.submit(busy.wait, 5)
+    assert agent._recall("queued", []) == []
+    busy.set()
+
+    # Running past its budget, the next turns skip recall until it finished
+    assert agent._recall("slow", []) == []
+    assert agent._recall("skipped", []) == []
+    release.set()
+    main_agent._recall_search.result(timeout=5)
+    assert agent._recall("next", []) == []
+    assert searches == ["slow", "next"]
+
+
+if __name__ == "__main__":
+    test_hash_embedding_is_closer_for_related_texts()
+    test_embedding_model_needs_the_recall_extra()
+    test_search_finds_relevant_messages_offline()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_slow_recall_is_abandoned_without_holding_back_the_next_turns(monkeypatch)
+    logger.info("Semantic recall tests passed")
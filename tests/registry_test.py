@@ -0,0 +1,116 @@
+import json
+import subprocess
+import sys
+
+import pixeltable as pxt
+import pytest
+from loguru import logger
+
+import cli_agent.agent.registry as registry_module
+from cli_agent.agent.registry import ConversationRegistry, reconcile_conversations, remove_conversation
+
+logger = logger.bind(name="Conversation Registry Testing")
+
+
+def test_migrates_json_once(tmp_path):
+    json_path = tmp_path / "conversation_history.json"
+    json_path.write_text(json.dumps({"memory_tables": ["id_first", "id_second"]}))
+
+    registry = ConversationRegistry(tmp_path / "registry.sqlite", legacy_json_path=json_path)
+    assert registry.list() == ["id_first", "id_second"]
+    assert not json_path.exists() and (tmp_path / "conversation_history.json.migrated").exists()
+
+    assert registry.register("id_third") and not registry.register("id_third")
+    assert registry.remove("id_first") and not registry.remove("id_first")
+    registry.close()
+
+    # A JSON file written again by an older version is not imported a second time
+    json_path.write_text(json.dumps({"memory_tables": ["id_first"]}))
+    registry = ConversationRegistry(tmp_path / "registry.sqlite", legacy_json_path=json_path)
+    assert registry.contains("id_third") and not registry.contains("id_first")
+    registry.close()
+
+
+def test_check_consistency_repairs_registry(tmp_path):
+    registry = ConversationRegistry(tmp_path / "registry.sqlite", legacy_json_path=None)
+    registry.register("id_deleted")
+    registry.register("id_kept")
+
+    report = registry.check_consistency({"id_kept", "id_created"})
+    assert (report.stale, report.unregistered) == (["id_deleted"], ["id_created"])
+    assert set(registry.list()) == {"id_kept", "id_created"}
+    assert registry.check_consistency({"id_kept", "id_created"}).consistent
+    registry.close()
+
+
+def test_conversation_registered_during_the_check_is_kept(tmp_path, monkeypatch):
+    registry = ConversationRegistry(tmp_path / "registry.sqlite", legacy_json_path=None)
+    registry.register("id_kept")
+
+    def list_dirs():
+        registry.register("id_new") # Created by another process right after its directory was listed
+        return ["id_kept"]
+    monkeypatch.setattr(pxt, "list_dirs", list_dirs)
+
+    assert registry.check_consistency().consistent
+    assert set(registry.list()) == {"id_kept", "id_new"}
+    registry.close()
+
+
+class FakeView:
+    """Catalog or index recording the conversations it holds."""
+    def __init__(self, memory_ids: set[str]):
+        self.memory_ids = set(memory_ids)
+
+    def backfill(self, memory_ids: list[str]):
+        self.memory_ids.update(memory_ids)
+
+    def remove(self, memory_id: str):
+        self.memory_ids.discard(memory_id)
+
+
+def test_catalog_and_indexes_follow_the_registry(tmp_path, monkeypatch):
+    registry = ConversationRegistry(tmp_path / "registry.sqlite", legacy_json_path=None)
+    registry.register("id_deleted")
+    registry.register("id_kept")
+    views = [FakeView({"id_deleted", "id_kept"}), FakeView({"id_deleted", "id_kept"})]
+    monkeypatch.setattr(registry_module, "get_registry", lambda: registry)
+    monkeypatch.setattr(registry_module, "_conversation_views", lambda: views)
+    monkeypatch.setattr(pxt, "list_dirs", lambda: ["id_kept", "id_created"])
+
+    report = reconcile_conversations()
+    assert (report.stale, report.unregistered) == (["id_deleted"], ["id_created"])
+    assert all(view.memory_ids == set(registry.list()) == {"id_kept", "id_created"} for view in views)
+
+    remove_conversation("id_kept")
+    assert all(view.memory_ids == set(registry.list()) == {"id_created"} for view in views)
+    registry.close()
+
+
+def test_concurrent_processes_keep_every_update(tmp_path):
+    path = tmp_path / "registry.sqlite"
+    script = (
+        "import sys; from pathlib import Path; from cli_agent.agent.registry import ConversationRegistry; "
+        "registry = ConversationRegistry(Path(sys.argv[1]), legacy_json_path=None); "
+        "[registry.register(f'id_{sys.argv[2]}_{n}') for n in range(50)]"
+    )
+    processes = [subprocess.Popen([sys.executable, "-c", script, str(path), str(worker)]) for worker in range(4)]
+    assert all(process.wait(timeout=120) == 0 for process in processes)
+
+    registry = ConversationRegistry(path, legacy_json_path=None)
+    assert len(registry.list()) == 200
+    registry.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    for test in [test_migrates_json_once, test_check_consistency_repairs_registry, test_concurrent_processes_keep_every_update]:
+        with tempfile.TemporaryDirectory() as directory:
+            test(Path(directory))
+    with tempfile.TemporaryDirectory() as directory, pytest.MonkeyPatch.context() as monkeypatch:
+        test_conversation_registered_during_the_check_is_kept(Path(directory), monkeypatch)
+    with tempfile.TemporaryDirectory() as directory, pytest.MonkeyPatch.context() as monkeypatch:
+        test_catalog_and_indexes_follow_the_registry(Path(directory), monkeypatch)
+    logger.info("Conversation registry tests passed")
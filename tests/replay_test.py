@@ -0,0 +1,64 @@
+import io
+import uuid
+from datetime import datetime, timedelta
+
+import pixeltable as pxt
+from loguru import logger
+from rich.console import Console
+
+from cli_agent.utils import ConversationReplay
+
+logger = logger.bind(name="Conversation Replay Testing")
+
+
+def test_replay_pages_from_latest_messages():
+    pxt.init()
+    directory = f"replay_test_{uuid.uuid4().hex}"
+    pxt.create_dir(directory)
+    memory_table = pxt.create_table(
+        f"{directory}.memory",
+        schema={"message_id": pxt.String, "role": pxt.String, "content": pxt.String, "timestamp": pxt.Timestamp, "tokens": pxt.Int},
+    )
+    start = datetime.now().astimezone() - timedelta(hours=1)
+
+    def rows(first: int, last: int):
+        return [
+            {
+                "message_id": str(uuid.uuid4()),
+                "role": "user" if index % 2 == 0 else "assistant",
+                "content": f"**message {index}**",
+                "timestamp": start + timedelta(seconds=index),
+            }
+            for index in range(first, last)
+        ]
+
+    try:
+        memory_table.insert(rows(0, 7) + [{**rows(7, 8)[0], "role": "summary"}])
+        output = io.StringIO()
+        replay = ConversationReplay(directory, Console(file=output, width=80), page_size=4)
+
+        assert replay.load_older() == 4 and replay.has_more
+        replay.render()
+        text = output.getvalue()
+        assert "/more" in text
+        assert "message 2" not in text and "message 3" in text and "message 6" in text
+        assert "**message 3**" not in text and "**message 4**" in text # Only assistant responses are rendered as Markdown
+
+        assert replay.load_older() == 3 and not replay.has_more
+        memory_table.insert(rows(8, 9))
+        assert replay.load_newer() == 1
+
+        output.truncate(0)
+        output.seek(0)
+        replay.render()
+        text = output.getvalue()
+        assert "/more" not in text
+        assert [f"message {index}" in text for index in range(9)] == [True] * 7 + [False, True] # Summaries are not replayed
+        assert text.index("message 0") < text.index("message 6") < text.index("message 8")
+    finally:
+        pxt.drop_dir(directory, force=True)
+
+
+if __name__ == "__main__":
+    test_replay_pages_from_latest_messages()
+    logger.info("Conversation replay tests passed")
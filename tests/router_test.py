@@ -0,0 +1,130 @@
+import asyncio
+import uuid
+
+import pixeltable as pxt
+import pytest
+from loguru import logger
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+from cli_agent.agent.main_agent import Agent
+from cli_agent.agent.memory import Memory
+from cli_agent.agent.router import ModelRouter, extract_features
+from cli_agent.benchmarks.fakes import ScriptedChatModel
+
+logger = logger.bind(name="Model Router Testing")
+
+
+class TierModel(ScriptedChatModel):
+    """Scripted tier counting its calls, raising instead of answering if `error` is set."""
+    calls: int = 0
+    error: bool = False
+
+    def _next_message(self, messages):
+        self.calls += 1
+        if self.error:
+            raise ConnectionError("tier unavailable")
+        message = super()._next_message(messages)
+        message.usage_metadata = {"input_tokens": 10, "output_tokens": 5, "total_tokens": 15}
+        return message
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+def router(*tiers: TierModel) -> ModelRouter:
+    return ModelRouter(tiers=list(tiers), tier_names=[f"tier{i}" for i in range(len(tiers))], holdback_chars=20)
+
+
+async def stream_text(model, messages) -> tuple[str, dict]:
+    text, metadata = "", {}
+    async for chunk in model.astream(messages):
+        text += chunk.text()
+        metadata.update(chunk.response_metadata)
+    return text, metadata
+
+
+def test_requests_are_routed_by_their_features():
+    model = router(TierModel(), TierModel(), TierModel())
+
+    assert model.select_tier([HumanMessage(content="Thanks!")]) == 0
+    assert model.select_tier([HumanMessage(content="Search the latest news on solar panels and write a report to a file")]) == 1
+    assert model.select_tier([HumanMessage(content="Research and compare sources. " + "Details of the task. " * 200)]) == 2
+
+    # Mid tool loop, a tool result is waiting
+    loop = [
+        HumanMessage(content="What is 1 + 2?"),
+        AIMessage(content="", tool_calls=[{"name": "add", "args": {"a": 1, "b": 2}, "id": "call_1"}]),
+        ToolMessage(content="3", tool_call_id="call_1"),
+    ]
+    features = extract_features(loop)
+    assert features.tool_likelihood == 1.0 and features.depth == 1
+    assert model.select_tier(loop) == 1
+
+
+def test_hedging_answers_are_escalated_before_being_streamed():
+    cheap = TierModel(response="I'm not sure, it could be Lyon or maybe Marseille.")
+    strong = TierModel(response="The capital of France is Paris.")
+    model = router(cheap, strong)
+
+    text, metadata = asyncio.run(stream_text(model, [HumanMessage(content="Capital of France?")]))
+    assert text == "The capital of France is Paris."
+    assert metadata["model_tier"] == "tier1"
+    assert (cheap.calls, strong.calls) == (1, 1)
+
+    stats = model.metrics.stats()
+    assert stats["tier0"]["escalations"] == 1 and stats["tier1"]["escalations"] == 0
+
+    # Accepted answers of the cheap tier are streamed as is
+    cheap.response = "Paris."
+    assert asyncio.run(stream_text(model, [HumanMessage(content="Capital of France?")]))[0] == "Paris."
+    assert strong.calls == 1
+
+
+def test_failed_calls_and_unknown_tools_are_escalated():
+    model = router(TierModel(error=True), TierModel(tool_name="unknown", tool_args={}), TierModel(tool_name="add", tool_args={"a": 1, "b": 2}))
+    bound = model.bind_tools([add])
+
+    message = asyncio.run(bound.ainvoke([HumanMessage(content="Hi")]))
+    assert message.tool_calls[0]["name"] == "add"
+    assert message.response_metadata["model_tier"] == "tier2"
+
+    stats = model.metrics.stats() # Shared with the tool-bound copy
+    assert [stats[tier]["escalations"] for tier in model.tier_names] == [1, 1, 0]
+    assert stats["tier0"]["errors"] == 1
+    assert stats["tier1"]["output_tokens"] == stats["tier2"]["output_tokens"] == 5 # Rejected outputs were paid for too
+
+    # The last tier has nothing to escalate to
+    with pytest.raises(ConnectionError):
+        router(TierModel(error=True)).invoke([HumanMessage(content="Hi")])
+
+
+def test_agent_turn_streams_only_the_accepted_tier():
+    pxt.init()
+    cheap = TierModel(response="Sorry, I can't add numbers without more context about them.")
+    strong = TierModel(response="The sum is 3.", tool_name="add", tool_args={"a": 1, "b": 2})
+    agent = Agent(tools=[add], system_prompt="You add numbers.", model_name=router(cheap, strong), memory=Memory(f"router_test_{uuid.uuid4().hex}"))
+
+    async def turn():
+        await agent.setup()
+        return [chunk async for chunk in agent.chat("Hello", stream_tokens=True)]
+
+    try:
+        chunks = asyncio.run(turn())
+        tokens = "".join(chunk["token"] for chunk in chunks if "token" in chunk)
+        assert tokens == "The sum is 3."
+        assert chunks[-1]["agent"]["messages"][0].content == "The sum is 3."
+        assert cheap.calls == 1 # Only the greeting went to the cheap tier, the tool result went to the strong one
+    finally:
+        agent.reset_memory()
+
+
+if __name__ == "__main__":
+    test_requests_are_routed_by_their_features()
+    test_hedging_answers_are_escalated_before_being_streamed()
+    test_failed_calls_and_unknown_tools_are_escalated()
+    test_agent_turn_streams_only_the_accepted_tier()
+    logger.info("Model router tests passed")
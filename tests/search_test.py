@@ -0,0 +1,142 @@
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from cli_agent.agent.search import CachedSearch, SearchCache
+
+logger = logger.bind(name="Search Cache Testing")
+
+
+class StubSearchBackend:
+    """Local search backend counting the requests that reach it."""
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, query: str, max_results: int, topic: str, include_raw_content: bool) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"query": query, "results": [{"title": f"{topic} result {i}"} for i in range(max_results)]}
+
+
+def test_repeated_queries_are_served_from_cache():
+    async def main():
+        backend = StubSearchBackend()
+        search = CachedSearch(backend, SearchCache(ttl=60, max_entries=10))
+
+        first = await search.search("LangGraph  streaming", max_results=2)
+        second = await search.search("langgraph streaming", max_results=2)
+        await search.search("langgraph streaming", max_results=3)
+
+        assert first == second
+        assert backend.calls == 2
+        assert search.stats() == {"hits": 1, "misses": 2, "coalesced": 0, "entries": 2}
+
+    asyncio.run(main())
+
+
+def test_inflight_requests_are_coalesced():
+    async def main():
+        backend = StubSearchBackend(delay=0.2)
+        search = CachedSearch(backend, SearchCache(ttl=60, max_entries=10))
+
+        results = await asyncio.gather(*(search.search("pixeltable", topic="news") for _ in range(5)))
+
+        assert backend.calls == 1
+        assert all(result == results[0] for result in results)
+        assert search.coalesced == 4
+
+    asyncio.run(main())
+
+
+def test_cancelled_caller_does_not_cancel_the_coalesced_ones():
+    async def main():
+        backend = StubSearchBackend(delay=0.1)
+        search = CachedSearch(backend, SearchCache(ttl=60, max_entries=10))
+
+        leader = asyncio.create_task(search.search("pixeltable"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(search.search("pixeltable"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        result = await follower
+        assert leader.cancelled()
+        assert result["query"] == "pixeltable"
+        assert backend.calls == 1
+
+        # The result of the call is cached even though its first caller left
+        await search.search("pixeltable")
+        assert search.hits == 1
+
+    asyncio.run(main())
+
+
+def test_expired_and_evicted_entries_are_refetched():
+    cache = SearchCache(ttl=60, max_entries=2)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    cache.get("a") # "b" becomes the least recently used entry
+    cache.put("c", {"n": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+
+    cache.ttl = 0
+    cache.put("d", {"n": 4})
+    time.sleep(0.01)
+    assert cache.get("d") is None
+
+
+def test_cache_is_persisted_on_disk(tmp_path):
+    async def main():
+        path = tmp_path / "search_cache.json"
+        backend = StubSearchBackend()
+
+        search = CachedSearch(backend, SearchCache(ttl=60, max_entries=10, path=path))
+        await search.search("deepagents")
+        await search.flush()
+        reloaded = CachedSearch(backend, SearchCache(ttl=60, max_entries=10, path=path))
+        await reloaded.search("deepagents")
+
+        assert backend.calls == 1
+        assert reloaded.hits == 1
+
+    asyncio.run(main())
+
+
+def test_saves_are_debounced(tmp_path):
+    async def main():
+        path = tmp_path / "search_cache.json"
+        cache = SearchCache(ttl=60, max_entries=10, path=path)
+        saves = []
+        save = cache.save
+        cache.save = lambda data=None: saves.append(len(data)) or save(data)
+        search = CachedSearch(StubSearchBackend(delay=0), cache, save_delay=0.1)
+
+        for i in range(5):
+            await search.search(f"query {i}")
+        assert not path.exists() # Nothing is written while the results are returned
+
+        await asyncio.sleep(0.2)
+        assert saves == [5]
+        await search.search("query 5")
+        await search.flush()
+        assert saves == [5, 6]
+        assert len(SearchCache(ttl=60, max_entries=10, path=path)) == 6
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    test_repeated_queries_are_served_from_cache()
+    test_inflight_requests_are_coalesced()
+    test_cancelled_caller_does_not_cancel_the_coalesced_ones()
+    test_expired_and_evicted_entries_are_refetched()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_cache_is_persisted_on_disk(Path(tmp_dir))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_saves_are_debounced(Path(tmp_dir))
+    logger.info("Search cache tests passed")
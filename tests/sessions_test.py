@@ -0,0 +1,153 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from loguru import logger
+
+import cli_agent.agent.sessions as sessions_module
+from cli_agent.agent.sessions import Session, SessionManager
+
+logger = logger.bind(name="Session Manager Testing")
+
+
+class FakeAgent:
+    """Agent recording when its turns start and how many turns run at the same time."""
+    started: list[str] = []
+    running = 0
+    max_running = 0
+
+    def __init__(self, memory_id: str):
+        self.memory = SimpleNamespace(directory=memory_id)
+        self.running = 0
+
+    async def chat(self, user_message: str, stream_tokens: bool = False):
+        FakeAgent.started.append(user_message)
+        FakeAgent.running += 1
+        FakeAgent.max_running = max(FakeAgent.max_running, FakeAgent.running)
+        self.running += 1
+        assert self.running == 1 # Turns of one session never overlap
+        try:
+            await asyncio.sleep(0.02)
+            yield {"token": user_message}
+        finally:
+            self.running -= 1
+            FakeAgent.running -= 1
+
+    async def wait_for_summary(self):
+        pass
+
+
+def add_sessions(manager: SessionManager, *memory_ids: str) -> list[Session]:
+    sessions = [Session(FakeAgent(memory_id)) for memory_id in memory_ids]
+    for session in sessions:
+        manager.sessions[session.memory_id] = session
+    return sessions
+
+
+async def run_turn(manager: SessionManager, session: Session, message: str) -> list[dict]:
+    return [chunk async for chunk in manager.chat(session, message)]
+
+
+def test_turns_are_limited_and_shared_fairly():
+    async def main():
+        FakeAgent.started, FakeAgent.max_running = [], 0
+        manager = SessionManager(max_concurrent_turns=1, max_queued_turns=5)
+        busy, quiet = add_sessions(manager, "busy", "quiet")
+
+        turns = [asyncio.create_task(run_turn(manager, busy, f"busy {i}")) for i in range(3)]
+        await asyncio.sleep(0) # The busy session queues all its turns first
+        turns.append(asyncio.create_task(run_turn(manager, quiet, "quiet 0")))
+        await asyncio.gather(*turns)
+
+        assert FakeAgent.max_running == 1
+        assert FakeAgent.started == ["busy 0", "quiet 0", "busy 1", "busy 2"]
+
+    asyncio.run(main())
+
+
+def test_queued_turns_are_capped():
+    async def main():
+        manager = SessionManager(max_concurrent_turns=1, max_queued_turns=2)
+        session, = add_sessions(manager, "session")
+
+        turns = [asyncio.create_task(run_turn(manager, session, str(i))) for i in range(3)]
+        results = await asyncio.gather(*turns, return_exceptions=True)
+
+        assert isinstance(results[2], RuntimeError)
+        assert session.idle
+
+    asyncio.run(main())
+
+
+def test_idle_sessions_are_unloaded_first():
+    manager = SessionManager(max_sessions=2)
+    oldest, busy, newest = add_sessions(manager, "oldest", "busy", "newest")
+    busy.queued_turns = 1
+
+    manager._unload_idle_sessions()
+
+    assert list(manager.sessions) == ["busy", "newest"]
+
+
+def test_sessions_stay_loaded_while_a_client_is_attached(monkeypatch):
+    loads = []
+
+    async def to_pixeltable_thread(fn, *args, **kwargs):
+        await asyncio.sleep(0.01) # Other clients attach while the conversation loads
+        return fn(*args, **kwargs)
+
+    async def create_agent(memory=None):
+        loads.append(memory.directory)
+        return FakeAgent(memory.directory)
+
+    monkeypatch.setattr(sessions_module, "to_pixeltable_thread", to_pixeltable_thread)
+    monkeypatch.setattr(sessions_module, "create_agent", create_agent)
+    monkeypatch.setattr(sessions_module, "get_registry", lambda: SimpleNamespace(contains=lambda memory_id: True))
+    monkeypatch.setattr(sessions_module, "Memory", lambda memory_id: SimpleNamespace(directory=memory_id))
+
+    async def main():
+        manager = SessionManager(max_sessions=1)
+        first, second = await asyncio.gather(manager.open_session("shared"), manager.open_session("shared"))
+        assert first is second and first.clients == 2 and loads == ["shared"]
+
+        other = await manager.open_session("other")
+        assert list(manager.sessions) == ["shared", "other"] # Over capacity, but both have clients
+
+        manager.close_session(first)
+        manager.close_session(first)
+        assert list(manager.sessions) == ["other"]
+
+        # The client left during its turn, the session is unloaded once the turn ends
+        await manager.open_session("shared")
+        turn = asyncio.create_task(run_turn(manager, other, "last"))
+        await asyncio.sleep(0)
+        manager.close_session(other)
+        assert "other" in manager.sessions
+        await turn
+        assert list(manager.sessions) == ["shared"]
+
+    asyncio.run(main())
+
+
+def test_unused_new_conversation_is_deleted_on_close(monkeypatch):
+    async def to_pixeltable_thread(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(sessions_module, "to_pixeltable_thread", to_pixeltable_thread)
+
+    deleted = []
+    manager = SessionManager()
+    manager._spare_agent = SimpleNamespace(reset_memory=lambda: deleted.append("spare"))
+    asyncio.run(manager.close())
+
+    assert deleted == ["spare"] and manager._spare_agent is None
+
+
+if __name__ == "__main__":
+    test_turns_are_limited_and_shared_fairly()
+    test_queued_turns_are_capped()
+    test_idle_sessions_are_unloaded_first()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_sessions_stay_loaded_while_a_client_is_attached(monkeypatch)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_unused_new_conversation_is_deleted_on_close(monkeypatch)
+    logger.info("Session manager tests passed")
@@ -0,0 +1,39 @@
+import io
+
+from loguru import logger
+from rich.console import Console
+
+from cli_agent.streaming import MarkdownStream
+
+logger = logger.bind(name="Streaming Testing")
+
+RESPONSE = "Intro paragraph.\n\n```python\nx = 1\n\ny = 2\n```\n\nClosing paragraph."
+
+
+def stream(text: str, refresh_rate: float) -> tuple[MarkdownStream, str]:
+    output = io.StringIO()
+    renderer = MarkdownStream(Console(file=output, width=80), refresh_rate=refresh_rate)
+    for token in text:
+        renderer.update(token)
+    renderer.stop()
+    return renderer, output.getvalue()
+
+
+def test_blocks_are_split_outside_code_fences():
+    renderer, output = stream(RESPONSE, refresh_rate=1000)
+
+    assert renderer._blocks == 2 # The blank line inside the code fence does not end a block
+    for text in ["Intro paragraph.", "x = 1", "y = 2", "Closing paragraph."]:
+        assert output.count(text) == 1
+
+
+def test_refreshes_are_rate_limited():
+    renderer, _ = stream(RESPONSE * 50, refresh_rate=1)
+
+    assert renderer.refreshes <= 3
+
+
+if __name__ == "__main__":
+    test_blocks_are_split_outside_code_fences()
+    test_refreshes_are_rate_limited()
+    logger.info("Streaming tests passed")
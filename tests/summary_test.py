@@ -0,0 +1,153 @@
+import asyncio
+import functools
+import json
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+from loguru import logger
+
+import cli_agent.agent.main_agent as main_agent
+from cli_agent.agent.main_agent import Agent
+from cli_agent.agent.memory import CHAT_ROLES, MemoryRecord
+
+logger = logger.bind(name="Summary Testing")
+
+START = datetime(2025, 1, 1).astimezone()
+
+
+class FakeMemory:
+    """Memory keeping its records in a list, one second apart."""
+    def __init__(self):
+        self.directory = "id_summary_test"
+        self.records: list[MemoryRecord] = []
+
+    def add(self, role: str, content: str, tokens: int) -> MemoryRecord:
+        record = MemoryRecord(
+            message_id=str(uuid.uuid4()),
+            role=role,
+            content=content,
+            timestamp=START + timedelta(seconds=len(self.records)),
+            tokens=tokens,
+        )
+        self.records.append(record)
+        return record
+
+    def insert_memory(self, record: MemoryRecord):
+        self.add(record.role, record.content, 10)
+
+    def get_latest_memory(self, n: int) -> list[MemoryRecord]:
+        return self.records[-n:]
+
+    def get_latest_summary(self) -> Optional[MemoryRecord]:
+        summaries = [record for record in self.records if record.role == "summary"]
+        return summaries[-1] if summaries else None
+
+    def get_memory_between(self, after: Optional[datetime], before: datetime, roles: list[str] = CHAT_ROLES) -> list[MemoryRecord]:
+        return [
+            record for record in self.records
+            if record.role in roles and record.timestamp < before and (after is None or record.timestamp > after)
+        ]
+
+
+class FakeSummaryModel:
+    """Summary model recording its prompts and answering with their number, waiting for `gate` if set."""
+    def __init__(self):
+        self.prompts: list[str] = []
+        self.gate: Optional[asyncio.Event] = None
+
+    async def ainvoke(self, prompt: str):
+        self.prompts.append(prompt)
+        if self.gate is not None:
+            await self.gate.wait()
+        return SimpleNamespace(content=f"summary {len(self.prompts)}")
+
+
+def create_agent(memory: FakeMemory, summary_model: FakeSummaryModel = None) -> Agent:
+    return Agent(tools=[], system_prompt="system", memory=memory, summary_model=summary_model)
+
+
+def add_turns(memory: FakeMemory, count: int, tokens: int = 100):
+    for _ in range(count):
+        turn = sum(record.role == "user" for record in memory.records)
+        memory.add("user", f"question {turn}", tokens)
+        memory.add("assistant", f"answer {turn}", tokens)
+
+
+def summary_of(memory: FakeMemory) -> tuple[str, datetime]:
+    data = json.loads(memory.get_latest_summary().content)
+    return data["summary"], datetime.fromisoformat(data["covered_until"])
+
+
+def test_context_window_fits_the_budget_and_starts_on_a_question():
+    memory = FakeMemory()
+    agent = create_agent(memory)
+    add_turns(memory, 5)
+    memory.add("tool", "not part of the chat", 1000)
+
+    # 350 tokens fit three messages, the answer without its question is dropped
+    window = agent._select_context_window(350, None)
+    assert [record.content for record in window] == ["question 4", "answer 4"]
+
+    window = agent._select_context_window(10_000, None)
+    assert len(window) == 10 and window[0].content == "question 0"
+
+    # The messages covered by the summary are left out, and the summary takes its share of the budget
+    memory.add("summary", json.dumps({"summary": "earlier", "covered_until": memory.records[3].timestamp.isoformat()}), 100)
+    window = agent._select_context_window(10_000, memory.get_latest_summary())
+    assert [record.content for record in window][:2] == ["question 2", "answer 2"] and len(window) == 6
+    window = agent._select_context_window(450, memory.get_latest_summary())
+    assert [record.content for record in window] == ["question 4", "answer 4"]
+
+
+def test_summary_folds_the_messages_out_of_the_window_incrementally(monkeypatch):
+    async def to_pixeltable_thread(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(main_agent, "to_pixeltable_thread", to_pixeltable_thread)
+
+    async def session():
+        memory, model = FakeMemory(), FakeSummaryModel()
+        agent = create_agent(memory, model)
+        agent._update_summary = functools.partial(agent._update_summary, token_budget=400) # Four messages fit
+        add_turns(memory, 3)
+
+        await agent._update_summary()
+        assert summary_of(memory) == ("summary 1", memory.records[1].timestamp)
+        assert "user: question 0\n\nassistant: answer 0" in model.prompts[-1] and "question 1" not in model.prompts[-1]
+
+        # Only the messages after the previous summary are sent with it
+        add_turns(memory, 1)
+        await agent._update_summary()
+        assert summary_of(memory) == ("summary 2", memory.records[5].timestamp)
+        prompt = model.prompts[-1]
+        assert "summary 1" in prompt and "question 0" not in prompt and "answer 2" in prompt and "question 3" not in prompt
+
+        # Turns ending while the summary runs are folded by one more pass of the same task
+        model.gate = asyncio.Event()
+        add_turns(memory, 1)
+        agent._schedule_summary()
+        task = agent._summary_task
+        await asyncio.sleep(0.01)
+        assert len(model.prompts) == 3
+        add_turns(memory, 2)
+        agent._schedule_summary()
+        agent._schedule_summary()
+        assert agent._summary_task is task
+        model.gate.set()
+        await task
+
+        assert len(model.prompts) == 4 and "answer 5" in model.prompts[-1]
+        text, covered_until = summary_of(memory)
+        window = agent._select_context_window(400, memory.get_latest_summary())
+        assert text == "summary 4" and window[0].timestamp > covered_until and window[0].content == "question 6"
+
+    asyncio.run(session())
+
+
+if __name__ == "__main__":
+    test_context_window_fits_the_budget_and_starts_on_a_question()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_summary_folds_the_messages_out_of_the_window_incrementally(monkeypatch)
+    logger.info("Summary tests passed")
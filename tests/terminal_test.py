@@ -0,0 +1,141 @@
+import asyncio
+import signal
+import threading
+from types import SimpleNamespace
+
+import pytest
+from loguru import logger
+from rich.console import Console
+
+import cli_agent.agent.memory as memory_module
+import cli_agent.cli as cli
+import cli_agent.terminal as terminal_module
+import cli_agent.utils as utils
+from cli_agent.terminal import TerminalInput
+
+logger = logger.bind(name="Terminal Input Testing")
+
+
+class ScriptedPrompt:
+    """Stand-in for `Prompt.ask`, answering once `answer` is called and counting the reads."""
+    def __init__(self):
+        self.reads = 0
+        self._answers: list[str] = []
+        self._ready = threading.Condition()
+
+    def ask(self, prompt: str, console=None) -> str:
+        with self._ready:
+            self.reads += 1
+            self._ready.wait_for(lambda: self._answers, timeout=5)
+            return self._answers.pop(0)
+
+    def answer(self, line: str):
+        with self._ready:
+            self._answers.append(line)
+            self._ready.notify_all()
+
+
+def patch_prompt(monkeypatch: pytest.MonkeyPatch) -> ScriptedPrompt:
+    scripted = ScriptedPrompt()
+    monkeypatch.setattr(terminal_module.Prompt, "ask", scripted.ask)
+    return scripted
+
+
+def test_background_work_runs_while_the_user_types(monkeypatch):
+    prompt = patch_prompt(monkeypatch)
+
+    async def session():
+        terminal = TerminalInput(Console())
+
+        async def background():
+            await asyncio.sleep(0.05) # Never resumed if the read blocked the loop
+            prompt.answer("hello")
+
+        task = asyncio.create_task(background())
+        line = await asyncio.wait_for(terminal.ask("You"), timeout=5)
+        await task
+        return line
+
+    assert asyncio.run(session()) == "hello"
+
+
+def test_ctrl_c_interrupts_the_prompt_and_keeps_the_line(monkeypatch):
+    prompt = patch_prompt(monkeypatch)
+
+    async def session():
+        terminal = TerminalInput(Console())
+        handler = signal.getsignal(signal.SIGINT)
+
+        asyncio.get_running_loop().call_later(0.05, signal.raise_signal, signal.SIGINT)
+        with pytest.raises(KeyboardInterrupt):
+            await asyncio.wait_for(terminal.ask("You"), timeout=5)
+        assert signal.getsignal(signal.SIGINT) is handler # Restored outside of the prompts
+
+        # The user goes on typing the same line, no second read is started
+        asyncio.get_running_loop().call_later(0.05, prompt.answer, "/exit")
+        return await asyncio.wait_for(terminal.ask("You"), timeout=5)
+
+    assert asyncio.run(session()) == "/exit"
+    assert prompt.reads == 1
+    assert not TerminalInput(Console()).interrupt() # Nothing to interrupt outside of a read
+
+
+def test_idle_work_prepares_the_next_conversation(monkeypatch):
+    created = []
+
+    async def create_agent(memory=None):
+        memory = memory or SimpleNamespace(directory=f"id_{len(created)}")
+        agent = SimpleNamespace(memory=memory, reset_memory=lambda: created.remove(agent))
+        created.append(agent)
+        return agent
+
+    def get_chat_history(limit=None, before=None):
+        ids = [agent.memory.directory for agent in reversed(created)] + ["id_past"]
+        return [f"{memory_id} - Modified now" for memory_id in ids], ids, None
+
+    monkeypatch.setattr(cli, "create_agent", create_agent)
+    monkeypatch.setattr(utils, "get_chat_history", get_chat_history)
+    monkeypatch.setattr(memory_module, "Memory", lambda memory_id: SimpleNamespace(directory=f"id_{memory_id}"))
+    monkeypatch.setattr(memory_module, "get_memory_writer", lambda: SimpleNamespace(flush=lambda: None))
+
+    async def to_pixeltable_thread(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(memory_module, "to_pixeltable_thread", to_pixeltable_thread)
+
+    async def session():
+        idle_work = cli.IdleWork()
+        idle_work.start()
+        options, memory_ids, _ = await idle_work.history_page()
+        assert len(created) == 1 and memory_ids == ["id_past"] # The prepared conversation is not listed
+
+        spare = created[0]
+        assert await idle_work.new_agent() is spare
+        idle_work.start()
+        await idle_work.history_page()
+        assert len(created) == 2 # The next one is prepared in the following idle period
+
+        await idle_work.close()
+        assert created == [spare] # The unused conversation is deleted
+
+    asyncio.run(session())
+
+
+def test_idle_logs_are_hidden_below_warnings():
+    def record(level: str, **extra) -> dict:
+        return {"extra": extra, "level": SimpleNamespace(no=logger.level(level).no)}
+
+    assert cli.idle_log_filter(record("INFO"))
+    assert not cli.idle_log_filter(record("INFO", idle=True))
+    assert cli.idle_log_filter(record("ERROR", idle=True))
+
+
+if __name__ == "__main__":
+    for test in [
+        test_background_work_runs_while_the_user_types,
+        test_ctrl_c_interrupts_the_prompt_and_keeps_the_line,
+        test_idle_work_prepares_the_next_conversation,
+    ]:
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test(monkeypatch)
+    test_idle_logs_are_hidden_below_warnings()
+    logger.info("Terminal input tests passed")
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from loguru import logger
+
+from cli_agent.agent.tool_executor import OrderedToolUpdates, ToolExecutor
+
+logger = logger.bind(name="Tool Executor Testing")
+
+
+def wait(seconds: float) -> str:
+    """Wait and return the time waited."""
+    time.sleep(seconds)
+    return f"waited {seconds}"
+
+
+def test_sync_tool_calls_run_concurrently_in_the_pool():
+    tool = ToolExecutor(max_workers=4, max_concurrency=4, timeout=5).wrap(wait)
+
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*[tool.ainvoke({"seconds": 0.2}) for _ in range(4)])
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(main())
+    assert results == ["waited 0.2"] * 4
+    assert elapsed < 0.6
+
+
+def test_tool_concurrency_limit():
+    tool = ToolExecutor(max_workers=4, max_concurrency=4, timeout=5, concurrency_limits={"wait": 1}).wrap(wait)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*[tool.ainvoke({"seconds": 0.1}) for _ in range(3)])
+        return time.perf_counter() - start
+
+    assert asyncio.run(main()) >= 0.3
+
+
+def test_timed_out_call_is_returned_as_a_tool_error():
+    tool = ToolExecutor(max_workers=1, max_concurrency=1, timeout=5, timeouts={"wait": 0.1}).wrap(wait)
+
+    assert asyncio.run(tool.ainvoke({"seconds": 0.5})) == "Tool wait timed out after 0.1s"
+
+
+def test_tool_updates_are_released_in_tool_calls_order():
+    def update(tool_call_id: str) -> dict:
+        return {"tools": {"messages": [SimpleNamespace(tool_call_id=tool_call_id)]}}
+
+    updates = OrderedToolUpdates()
+    updates.expect([{"name": "a", "id": "1"}, {"name": "b", "id": "2"}, {"name": "c", "id": "3"}])
+
+    second, third, first = update("2"), update("3"), update("1")
+    assert updates.add(second) == []
+    assert updates.add(first) == [first, second]
+    assert updates.flush() == []
+
+    updates.expect([{"name": "a", "id": "4"}, {"name": "b", "id": "5"}])
+    late = update("5")
+    assert updates.add(late) == []
+    assert updates.flush() == [late]
+    assert updates.add(third) == [third] # Not a call of the current step
+
+
+if __name__ == "__main__":
+    test_sync_tool_calls_run_concurrently_in_the_pool()
+    test_tool_concurrency_limit()
+    test_timed_out_call_is_returned_as_a_tool_error()
+    test_tool_updates_are_released_in_tool_calls_order()
+    logger.info("Tool executor tests passed")
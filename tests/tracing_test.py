@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from loguru import logger
+
+from cli_agent.tracing import Tracer
+
+logger = logger.bind(name="Tracing Testing")
+
+
+def test_spans_nest_and_export_one_otlp_line_per_trace(tmp_path):
+    export_path = tmp_path / "traces.jsonl"
+    tracer = Tracer(export_path=export_path)
+
+    def insert():
+        with tracer.span("memory.insert"):
+            pass
+
+    async def turn():
+        with tracer.span("turn", memory_id="id_test") as turn_span:
+            with tracer.span("llm.call", model="fake"):
+                pass
+            await asyncio.to_thread(insert) # The thread runs in a copy of the context
+            turn_span.set_attribute("llm.output_tokens", 3)
+    asyncio.run(turn())
+
+    lines = export_path.read_text().splitlines()
+    assert len(lines) == 1
+    spans = {span["name"]: span for span in json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+    assert set(spans) == {"turn", "llm.call", "memory.insert"}
+    assert "parentSpanId" not in spans["turn"]
+    assert spans["llm.call"]["parentSpanId"] == spans["turn"]["spanId"]
+    assert spans["memory.insert"]["parentSpanId"] == spans["turn"]["spanId"]
+    assert spans["llm.call"]["traceId"] == spans["turn"]["traceId"]
+    assert {"key": "llm.output_tokens", "value": {"intValue": "3"}} in spans["turn"]["attributes"]
+
+
+def test_span_ended_after_its_root_is_exported_alone(tmp_path):
+    export_path = tmp_path / "traces.jsonl"
+    tracer = Tracer(export_path=export_path)
+
+    with tracer.span("turn") as turn_span:
+        late_span = tracer.start_span("memory.update_summary")
+    tracer.end_span(late_span)
+
+    traces = [json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"] for line in export_path.read_text().splitlines()]
+    assert [[span["name"] for span in spans] for spans in traces] == [["turn"], ["memory.update_summary"]]
+    assert traces[1][0]["parentSpanId"] == turn_span.span_id
+
+
+def test_errors_are_recorded_on_the_span(tmp_path):
+    tracer = Tracer(export_path=tmp_path / "traces.jsonl")
+
+    try:
+        with tracer.span("tool.fail"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    span = json.loads((tmp_path / "traces.jsonl").read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert span["status"] == {"code": 2, "message": "RuntimeError: boom"}
+
+
+def test_stats_percentiles():
+    tracer = Tracer()
+    for i in range(1, 101):
+        tracer.observe("stage", i / 1000)
+
+    stats = tracer.stats()["stage"]
+    assert stats["count"] == 100
+    assert round(stats["p50"], 2) == 50.5
+    assert round(stats["p95"], 2) == 95.05
+
+
+def test_disabled_tracer_records_nothing(tmp_path):
+    tracer = Tracer(enabled=False, export_path=tmp_path / "traces.jsonl")
+    with tracer.span("turn"):
+        tracer.observe("stage", 1.0)
+
+    assert tracer.stats() == {}
+    assert not (tmp_path / "traces.jsonl").exists()
+
+
+def test_export_is_rotated_past_its_size(tmp_path):
+    export_path = tmp_path / "traces.jsonl"
+    tracer = Tracer(export_path=export_path, max_export_bytes=1)
+    for name in ["first", "second", "third"]:
+        with tracer.span(name):
+            pass
+
+    # Only the latest trace and the one before it are kept
+    assert json.loads(export_path.read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"] == "third"
+    rotated = tmp_path / "traces.jsonl.1"
+    assert json.loads(rotated.read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"] == "second"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["traces.jsonl", "traces.jsonl.1"]
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    for test in [
+        test_spans_nest_and_export_one_otlp_line_per_trace,
+        test_span_ended_after_its_root_is_exported_alone,
+        test_errors_are_recorded_on_the_span,
+    ]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test(Path(tmp_dir))
+    test_stats_percentiles()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_disabled_tracer_records_nothing(Path(tmp_dir))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_export_is_rotated_past_its_size(Path(tmp_dir))
+    logger.info("Tracing tests passed")